@@ -8,12 +8,31 @@ import pytz
 from django.core.management import call_command
 from py._path.local import LocalPath
 
+from wkz import configuration as cfg
 from wkz import models
 from wkz.demo import copy_demo_fit_files_to_track_dir, prepare_import_of_demo_activities
+from wkz.io import file_importer
+from wkz.io.auto_naming import add_location_to_names
 from wkz.io.file_importer import run_importer
+from wkz.tools.series import encode_series
 from workoutizer import settings as django_settings
 
 
+@pytest.fixture(autouse=True)
+def add_location_to_names_right_away(monkeypatch):
+    """
+    Adds the location to the names of imported activities right after the import, since there is no huey consumer
+    running the scheduled task in tests.
+    """
+
+    def _add_location_to_names(models):
+        while add_location_to_names(models):
+            pass
+
+    monkeypatch.setattr(cfg, "geocoding_min_delay", 0)
+    monkeypatch.setattr(file_importer, "schedule_adding_location_to_names", _add_location_to_names)
+
+
 @pytest.fixture
 def tracks_in_tmpdir(db, tmp_path):
     path = tmp_path / "test_traces"
@@ -54,8 +73,8 @@ def trace_file(db):
         path_to_file="some/path/to/file.gpx",
         file_name="file.gpx",
         md5sum="4c1185c55476269b442f424a9d80d964",
-        latitude_list="[49.47972273454071, 49.47972273454071]",
-        longitude_list="[8.47357001155615, 8.47357001155615]",
+        latitude_list=encode_series([49.47972273454071, 49.47972273454071]),
+        longitude_list=encode_series([8.47357001155615, 8.47357001155615]),
         calories=123,
     )
     trace.save()
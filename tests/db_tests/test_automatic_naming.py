@@ -1,4 +1,13 @@
+import datetime
+
+from django.forms.models import model_to_dict
+from django.utils import timezone
+from geopy.exc import GeocoderUnavailable
+from geopy.geocoders import Nominatim
+
+from wkz import configuration as cfg
 from wkz import models
+from wkz.forms import DATETIMEPICKER_FORMAT, EditActivityForm
 
 
 def test_automatic_naming_of_activity__gpx_with_coordinates(import_one_activity):
@@ -20,3 +29,108 @@ def test_automatic_naming_of_activity__fit_no_coordinates(import_one_activity):
 
     activity = models.Activity.objects.get()
     assert activity.name == "Noon Swimming"
+
+
+def test_automatic_naming_of_activity__location_added_later(import_one_activity, monkeypatch):
+    from wkz.io import file_importer
+    from wkz.io.auto_naming import add_location_to_names
+
+    monkeypatch.setattr(file_importer, "schedule_adding_location_to_names", lambda models: None)
+    import_one_activity("example.gpx")
+    import_one_activity("swim_no_coordinates.fit")
+
+    # activities are imported with a provisional name
+    assert set(models.Activity.objects.values_list("name", "location_pending")) == {
+        ("Evening Jogging", True),
+        ("Noon Swimming", False),
+    }
+
+    assert add_location_to_names(models) == 0
+    assert set(models.Activity.objects.values_list("name", "location_pending")) == {
+        ("Evening Jogging in Heidelberg", False),
+        ("Noon Swimming", False),
+    }
+
+
+def test_automatic_naming_of_activity__location_added_in_batches(import_one_activity, monkeypatch):
+    from wkz.io import file_importer
+    from wkz.io.auto_naming import add_location_to_names
+
+    monkeypatch.setattr(file_importer, "schedule_adding_location_to_names", lambda models: None)
+    import_one_activity("example.gpx")
+    import_one_activity("hike_with_coordinates_muggenbrunn.fit")
+    import_one_activity("run_with_coordinates.fit")
+    # names chosen by the user are kept
+    activity = models.Activity.objects.get(name="Noon Hiking")
+    data = {field: value for field, value in model_to_dict(activity).items() if value is not None}
+    data.update(name="My Hike", date=activity.date.strftime(DATETIMEPICKER_FORMAT))
+    form = EditActivityForm(data, instance=activity)
+    assert form.is_valid(), form.errors
+    form.save()
+
+    assert add_location_to_names(models, batch_size=1) == 1
+    assert add_location_to_names(models, batch_size=1) == 0
+    assert "My Hike" in models.Activity.objects.values_list("name", flat=True)
+    assert models.Activity.objects.filter(name__endswith=" in Heidelberg").count() == 2
+    assert not models.Activity.objects.filter(location_pending=True).exists()
+
+
+def test_automatic_naming_of_activity__geocoder_fails(import_one_activity, monkeypatch):
+    from wkz.io import file_importer
+    from wkz.io.auto_naming import add_location_to_names, get_next_location_retry
+
+    def reverse(self, *args, **kwargs):
+        raise GeocoderUnavailable("Network is unreachable")
+
+    located = Nominatim.reverse
+    monkeypatch.setattr(Nominatim, "reverse", reverse)
+    monkeypatch.setattr(file_importer, "schedule_adding_location_to_names", lambda models: None)
+    import_one_activity("example.gpx")
+    import_one_activity("run_with_coordinates.fit")
+
+    # the failing geocoder neither aborts the batch nor is the same batch retried over and over again
+    assert add_location_to_names(models, batch_size=1) == 1
+    assert add_location_to_names(models, batch_size=1) == 0
+    # the activities stay pending, but are only retried later
+    assert set(models.Activity.objects.values_list("name", "location_pending", "location_attempts")) == {
+        ("Evening Jogging", True, 1),
+        ("Early Morning Jogging", True, 1),
+    }
+    retry = get_next_location_retry(models)
+    assert retry > timezone.now() + datetime.timedelta(seconds=cfg.geocoding_retry_delay - 60)
+    # failed lookups are not cached
+    assert not models.GeocodeCache.objects.exists()
+
+    # the retry delay doubles with every failure
+    models.Activity.objects.update(location_retry=timezone.now())
+    assert add_location_to_names(models) == 0
+    assert get_next_location_retry(models) > retry + datetime.timedelta(seconds=cfg.geocoding_retry_delay - 60)
+
+    # once the geocoder is back, the location is added
+    monkeypatch.setattr(Nominatim, "reverse", located)
+    models.Activity.objects.update(location_retry=timezone.now())
+    assert add_location_to_names(models) == 0
+    assert set(models.Activity.objects.values_list("name", "location_pending")) == {
+        ("Evening Jogging in Heidelberg", False),
+        ("Early Morning Jogging in Heidelberg", False),
+    }
+
+
+def test_automatic_naming_of_activity__geocoder_fails_repeatedly(import_one_activity, monkeypatch):
+    from wkz.io import file_importer
+    from wkz.io.auto_naming import add_location_to_names, get_next_location_retry
+
+    def reverse(self, *args, **kwargs):
+        raise GeocoderUnavailable("Network is unreachable")
+
+    monkeypatch.setattr(Nominatim, "reverse", reverse)
+    monkeypatch.setattr(cfg, "geocoding_max_attempts", 2)
+    monkeypatch.setattr(file_importer, "schedule_adding_location_to_names", lambda models: None)
+    import_one_activity("example.gpx")
+
+    assert add_location_to_names(models) == 0
+    models.Activity.objects.update(location_retry=timezone.now())
+    assert add_location_to_names(models) == 0
+    # the activity keeps its provisional name after too many failures
+    assert models.Activity.objects.values_list("name", "location_pending").get() == ("Evening Jogging", False)
+    assert get_next_location_retry(models) is None
@@ -0,0 +1,56 @@
+from django.core.cache import cache
+
+from wkz import configuration as cfg
+from wkz import models
+from wkz.utils.award_ranking import get_cached_pks_of_activities_in_top_awards, get_pks_of_activities_in_top_awards
+
+
+def _get_pks_of_activities_in_top_awards_one_by_one(sport_slugs, rank_limit):
+    pks = set()
+    for sport in sport_slugs:
+        for bs in cfg.best_sections:
+            for distance in bs.distances:
+                sections = models.BestSection.objects.filter(
+                    activity__sport__slug=sport,
+                    activity__user=None,
+                    activity__evaluates_for_awards=True,
+                    kind=bs.kind,
+                    distance=distance,
+                ).order_by("-max_value", "pk")[:rank_limit]
+                pks |= {section.activity_id for section in sections}
+        activities = (
+            models.Activity.objects.filter(sport__slug=sport, user=None, evaluates_for_awards=True)
+            .exclude(trace_file__total_ascent=None)
+            .order_by("-trace_file__total_ascent", "pk")[:rank_limit]
+        )
+        pks |= {activity.pk for activity in activities}
+    return sorted(pks)
+
+
+def test_get_pks_of_activities_in_top_awards(import_demo_data, django_assert_num_queries):
+    sport_slugs = list(models.Sport.objects.values_list("slug", flat=True))
+    for rank_limit in [1, 2, 3]:
+        with django_assert_num_queries(2):
+            pks = get_pks_of_activities_in_top_awards(None, sport_slugs, rank_limit=rank_limit)
+        assert pks == _get_pks_of_activities_in_top_awards_one_by_one(sport_slugs, rank_limit)
+    assert len(get_pks_of_activities_in_top_awards(None, sport_slugs, rank_limit=1)) < len(pks)
+
+    # activities not evaluating for awards are not ranked
+    models.Activity.objects.filter(pk__in=pks).update(evaluates_for_awards=False)
+    assert set(get_pks_of_activities_in_top_awards(None, sport_slugs)).isdisjoint(pks)
+    assert get_pks_of_activities_in_top_awards(None, []) == []
+
+
+def test_get_cached_pks_of_activities_in_top_awards(import_demo_data, django_assert_num_queries):
+    cache.clear()
+    pks = get_cached_pks_of_activities_in_top_awards(None, "cycling")
+    assert pks == _get_pks_of_activities_in_top_awards_one_by_one(["cycling"], cfg.rank_limit)
+    with django_assert_num_queries(1):
+        assert get_cached_pks_of_activities_in_top_awards(None, "cycling") == pks
+
+    # editing an activity invalidates the cached rankings
+    activity = models.Activity.objects.get(pk=pks[0])
+    activity.evaluates_for_awards = False
+    activity.save()
+    assert pks[0] not in get_cached_pks_of_activities_in_top_awards(None, "cycling")
+    cache.clear()
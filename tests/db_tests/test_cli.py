@@ -1,5 +1,6 @@
 import os
 
+import pytest
 from click.testing import CliRunner
 from django.core.management import execute_from_command_line
 
@@ -53,7 +54,8 @@ def test_cli__check__not_initialized(db):
     assert isinstance(result.exception, cli.NotInitializedError)
 
 
-def test_cli__reimport(import_one_activity):
+@pytest.mark.parametrize("args", (["reimport"], ["reimport", "--workers", "2"]))
+def test_cli__reimport(import_one_activity, args):
     import_one_activity("cycling_bad_schandau.fit")
 
     assert models.Activity.objects.count() == 1
@@ -65,7 +67,7 @@ def test_cli__reimport(import_one_activity):
     assert activity.distance != orig_distance
 
     runner = CliRunner()
-    runner.invoke(wkz, ["reimport"])
+    runner.invoke(wkz, args)
 
     activity = models.Activity.objects.get()
     assert activity.distance == orig_distance
@@ -113,3 +115,14 @@ def test__check_for_update(monkeypatch):
     runner = CliRunner()
     output = runner.invoke(wkz, ["check-for-update"])
     assert output.stdout == f"Newer version available: {pypi_version}. You are running: {__version__}\n"
+
+
+def test_cli__reimport__profile(import_one_activity):
+    import_one_activity("cycling_bad_schandau.fit")
+
+    runner = CliRunner()
+    result = runner.invoke(wkz, ["reimport", "--profile"])
+
+    assert result.exit_code == 0
+    stages = [line.split()[0] for line in result.output.splitlines()[-8:]]
+    assert stages == ["stage", "discover", "hash", "parse", "sections", "name", "persist", "total"]
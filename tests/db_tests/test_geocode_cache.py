@@ -0,0 +1,133 @@
+import datetime
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from geopy.exc import GeocoderTimedOut
+
+from wkz import configuration as cfg
+from wkz import models
+from wkz.gis import geocode_cache
+from wkz.gis.geocode_cache import evict, get_cached_location_name, get_cell, get_start_coordinates, prewarm
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    lookups = []
+
+    def get_location_name(coordinate, **kwargs):
+        lookups.append(coordinate)
+        return f"Place {len(lookups)}"
+
+    monkeypatch.setattr(geocode_cache, "get_location_name", get_location_name)
+    return lookups
+
+
+def test_get_cell():
+    assert get_cell((49.47972, 8.47357)) == get_cell((49.48001, 8.47002))
+    assert get_cell((49.47972, 8.47357)) != get_cell((49.49972, 8.47357))
+    assert get_cell((-0.001, -0.001)) == get_cell((0.001, 0.001))
+    assert get_cell((49.47972, 8.47357)).startswith(f"{cfg.geocode_cache_cell_size}:")
+
+
+def test_get_cached_location_name(db, lookups):
+    assert get_cached_location_name(models.GeocodeCache, (49.47972, 8.47357)) == "Place 1"
+    # coordinates of the same cell are not looked up again
+    assert get_cached_location_name(models.GeocodeCache, (49.48001, 8.47002)) == "Place 1"
+    assert len(lookups) == 1
+    assert get_cached_location_name(models.GeocodeCache, (47.9, 7.9)) == "Place 2"
+    assert len(lookups) == 2
+    assert models.GeocodeCache.objects.count() == 2
+
+
+def test_get_cached_location_name__expired(db, lookups):
+    get_cached_location_name(models.GeocodeCache, (49.47972, 8.47357))
+    models.GeocodeCache.objects.update(created=timezone.now() - datetime.timedelta(days=cfg.geocode_cache_ttl_days + 1))
+
+    assert get_cached_location_name(models.GeocodeCache, (49.47972, 8.47357)) == "Place 2"
+    assert models.GeocodeCache.objects.get().name == "Place 2"
+
+
+def test_get_cached_location_name__without_nominatim(db, monkeypatch):
+    monkeypatch.setattr(geocode_cache, "get_location_name", lambda coordinate, **kwargs: None)
+    monkeypatch.setattr(cfg, "use_nominatim", True)
+    assert get_cached_location_name(models.GeocodeCache, (49.47972, 8.47357)) is None
+    # confirmed to have no name by nominatim
+    assert models.GeocodeCache.objects.get().name is None
+
+    models.GeocodeCache.objects.all().delete()
+    monkeypatch.setattr(cfg, "use_nominatim", False)
+    assert get_cached_location_name(models.GeocodeCache, (49.47972, 8.47357)) is None
+    assert models.GeocodeCache.objects.count() == 0
+
+
+def test_get_cached_location_names__nominatim_fails(db, monkeypatch):
+    lookups = []
+
+    def get_location_name(coordinate, use_nominatim, **kwargs):
+        lookups.append((coordinate, use_nominatim))
+        if coordinate == (49.0, 8.0):
+            raise GeocoderTimedOut("Service timed out")
+        # places of the GeoNames file are found without Nominatim
+        return "Offline Place" if coordinate == (47.0, 8.0) else None
+
+    monkeypatch.setattr(geocode_cache, "get_location_name", get_location_name)
+    monkeypatch.setattr(cfg, "use_nominatim", True)
+    names = geocode_cache.get_cached_location_names(models.GeocodeCache, [(49.0, 8.0), (48.0, 8.0), (47.0, 8.0)])
+
+    # nominatim is not queried again after it failed, cells which could not be resolved are missing
+    assert lookups == [((49.0, 8.0), True), ((48.0, 8.0), False), ((47.0, 8.0), False)]
+    assert names == {get_cell((47.0, 8.0)): "Offline Place"}
+    # only the resolved name is cached, failures are looked up again next time
+    assert list(models.GeocodeCache.objects.values_list("name", flat=True)) == ["Offline Place"]
+    assert get_cached_location_name(models.GeocodeCache, (49.0, 8.0)) is None
+    assert lookups[-1] == ((49.0, 8.0), True)
+
+
+def test_evict(db, lookups, monkeypatch):
+    monkeypatch.setattr(cfg, "geocode_cache_max_entries", 2)
+    get_cached_location_name(models.GeocodeCache, (49.0, 8.0))
+    get_cached_location_name(models.GeocodeCache, (48.0, 8.0))
+    # use the first entry again, such that the second one is the least recently used
+    get_cached_location_name(models.GeocodeCache, (49.0, 8.0))
+    get_cached_location_name(models.GeocodeCache, (47.0, 8.0))
+
+    assert set(models.GeocodeCache.objects.values_list("name", flat=True)) == {"Place 1", "Place 3"}
+
+    models.GeocodeCache.objects.filter(name="Place 1").update(
+        created=timezone.now() - datetime.timedelta(days=cfg.geocode_cache_ttl_days + 1)
+    )
+    assert evict(models.GeocodeCache) == 1
+    assert list(models.GeocodeCache.objects.values_list("name", flat=True)) == ["Place 3"]
+
+
+def test_prewarm(db, lookups, trace_file):
+    coordinates = list(get_start_coordinates(models.Traces))
+    assert coordinates == [(49.47972273454071, 8.47357001155615)]
+
+    assert prewarm(models.GeocodeCache, coordinates + [(49.4797, 8.4735), (47.9, 7.9)], min_delay=0) == 2
+    assert len(lookups) == 2
+    # all cells are cached already
+    assert prewarm(models.GeocodeCache, coordinates, min_delay=0) == 0
+    assert len(lookups) == 2
+
+
+def test_prewarm_geocode_cache_command(db, lookups, trace_file):
+    call_command("prewarm_geocode_cache", "--delay", "0", verbosity=0)
+
+    assert models.GeocodeCache.objects.get().name == "Place 1"
+
+
+def test_import_uses_geocode_cache(import_one_activity, monkeypatch):
+    import_one_activity("example.gpx")
+
+    entry = models.GeocodeCache.objects.get()
+    assert models.Activity.objects.get().name == f"Evening Jogging in {entry.name}"
+
+    # a second import of an activity starting at the same place does not geocode again
+    monkeypatch.setattr(geocode_cache, "get_location_name", lambda coordinate, **kwargs: pytest.fail("not cached"))
+    models.Activity.objects.all().delete()
+    models.Traces.objects.all().delete()
+    import_one_activity("example.gpx")
+
+    assert models.Activity.objects.get().name == f"Evening Jogging in {entry.name}"
@@ -1,14 +1,15 @@
 import datetime
-import json
 import shutil
 from pathlib import Path
 
+import pytest
 import pytz
 
-from wkz import models
+from wkz import configuration, models
 from wkz.best_sections.generic import activity_suitable_for_awards
 from wkz.demo import copy_demo_fit_files_to_track_dir
-from wkz.io.file_importer import run_importer
+from wkz.io import file_importer
+from wkz.io.file_importer import _get_md5sums_of_files, run_importer
 from wkz.tools.utils import calc_md5
 from workoutizer import settings as django_settings
 
@@ -37,25 +38,25 @@ def test_activity_data_in_db_after_import(import_one_activity):
     assert a.trace_file.aerobic_training_effect == 2.7
     assert a.trace_file.anaerobic_training_effect == 0.3
     # check lengths of list attributes
-    assert len(json.loads(a.trace_file.heart_rate_list)) == 1224
-    assert len(json.loads(a.trace_file.altitude_list)) == 1224
-    assert len(json.loads(a.trace_file.latitude_list)) == 1224
-    assert len(json.loads(a.trace_file.longitude_list)) == 1224
-    assert len(json.loads(a.trace_file.distance_list)) == 1224
-    assert len(json.loads(a.trace_file.cadence_list)) == 1224
-    assert len(json.loads(a.trace_file.temperature_list)) == 1224
-    assert len(json.loads(a.trace_file.speed_list)) == 1224
-    assert len(json.loads(a.trace_file.timestamps_list)) == 1224
+    assert len(a.trace_file.get_series("heart_rate_list")) == 1224
+    assert len(a.trace_file.get_series("altitude_list")) == 1224
+    assert len(a.trace_file.get_series("latitude_list")) == 1224
+    assert len(a.trace_file.get_series("longitude_list")) == 1224
+    assert len(a.trace_file.get_series("distance_list")) == 1224
+    assert len(a.trace_file.get_series("cadence_list")) == 1224
+    assert len(a.trace_file.get_series("temperature_list")) == 1224
+    assert len(a.trace_file.get_series("speed_list")) == 1224
+    assert len(a.trace_file.get_series("timestamps_list")) == 1224
     # sanity check to see if element in list attributes
-    assert 1.605 in json.loads(a.trace_file.speed_list)
-    assert 8.697221484035255 in json.loads(a.trace_file.longitude_list)
-    assert 49.40601873211563 in json.loads(a.trace_file.latitude_list)
-    assert 1.6 in json.loads(a.trace_file.distance_list)
-    assert 206.4 in json.loads(a.trace_file.altitude_list)
-    assert 99 in json.loads(a.trace_file.heart_rate_list)
-    assert 61 in json.loads(a.trace_file.cadence_list)
-    assert 31 in json.loads(a.trace_file.temperature_list)
-    assert 1568467325.0 in json.loads(a.trace_file.timestamps_list)
+    assert 1.605 in a.trace_file.get_series("speed_list")
+    assert 8.697221484035255 in a.trace_file.get_series("longitude_list")
+    assert 49.40601873211563 in a.trace_file.get_series("latitude_list")
+    assert 1.6 in a.trace_file.get_series("distance_list")
+    assert 206.4 in a.trace_file.get_series("altitude_list")
+    assert 99 in a.trace_file.get_series("heart_rate_list")
+    assert 61 in a.trace_file.get_series("cadence_list")
+    assert 31 in a.trace_file.get_series("temperature_list")
+    assert 1568467325.0 in a.trace_file.get_series("timestamps_list")
     # check laps
     laps = models.Lap.objects.filter(trace=a.trace_file)
     assert len(laps) == 7
@@ -265,6 +266,70 @@ def test_import_corrupted_fit_file(tracks_in_tmpdir, caplog):
     assert "Failed to parse fit file" in caplog.text
 
 
+def test_run_importer__invalidates_heatmap_tiles_once(tracks_in_tmpdir, monkeypatch, django_capture_on_commit_callbacks):
+    invalidations = []
+    monkeypatch.setattr(models, "invalidate_tiles", lambda cache_dir, *boxes: invalidations.append(boxes))
+    settings = models.get_settings()
+    copy_demo_fit_files_to_track_dir(
+        source_dir=django_settings.INITIAL_TRACE_DATA_DIR,
+        targe_dir=settings.path_to_trace_dir,
+        list_of_files_to_copy=["cycling_bad_schandau.fit", "hike_with_coordinates_muggenbrunn.fit"],
+    )
+
+    with django_capture_on_commit_callbacks(execute=True):
+        run_importer(models)
+    # the tiles of all imported activities are invalidated at once, after the import
+    assert len(invalidations) == 1
+    assert len(invalidations[0]) == 2
+
+    with django_capture_on_commit_callbacks(execute=True):
+        run_importer(models, reimporting=True)
+    assert len(invalidations) == 2
+    assert len(invalidations[1]) == 2
+
+
+def test_run_importer__import_runs(tracks_in_tmpdir, monkeypatch):
+    settings = models.get_settings()
+    copy_demo_fit_files_to_track_dir(
+        source_dir=django_settings.INITIAL_TRACE_DATA_DIR,
+        targe_dir=settings.path_to_trace_dir,
+        list_of_files_to_copy=["cycling_bad_schandau.fit", "hike_with_coordinates_muggenbrunn.fit"],
+    )
+    (Path(settings.path_to_trace_dir) / "faulty.fit").write_text("no valid fit file content")
+
+    profile = run_importer(models)
+
+    run = models.ImportRun.objects.get()
+    assert (run.number_of_files, run.number_of_imported, run.reimporting) == (3, 2, False)
+    assert run.duration == profile.duration
+    stages = {stage.name: (stage.items, stage.failures) for stage in run.stages.all()}
+    assert list(stages) == ["discover", "hash", "parse", "sections", "name", "persist"]
+    assert stages == {
+        "discover": (3, 0),
+        "hash": (3, 0),
+        "parse": (3, 1),
+        "sections": (2, 0),
+        "name": (2, 0),
+        "persist": (2, 0),
+    }
+    assert all(stage.wall_time >= 0 and stage.cpu_time >= 0 for stage in run.stages.all())
+
+    # runs without any new file are not stored
+    (Path(settings.path_to_trace_dir) / "faulty.fit").unlink()
+    run_importer(models)
+    assert models.ImportRun.objects.count() == 1
+
+    # only the latest runs are kept
+    monkeypatch.setattr(configuration, "import_runs_to_keep", 2)
+    run_importer(models, reimporting=True)
+    run_importer(models, reimporting=True)
+    assert models.ImportRun.objects.count() == 2
+    assert list(models.ImportRun.objects.values_list("reimporting", flat=True)) == [True, True]
+    assert models.ImportStage.objects.count() == 12
+    # only new or changed files are hashed, the md5sums of the other files are taken from the file index
+    assert models.ImportRun.objects.first().stages.get(name="hash").items == 0
+
+
 def test_run_importer__single_file(db, demo_data_dir, tmpdir, fit_file):
     assert models.Activity.objects.count() == 0
     settings = models.get_settings()
@@ -341,3 +406,112 @@ def test_import_files_with_upper_case_ending(db, demo_data_dir, tracks_in_tmpdir
     run_importer(models)
 
     assert models.Activity.objects.count() == 2
+
+
+def test_run_importer__parallel_parsing(db, demo_data_dir, tracks_in_tmpdir, fit_file, fit_file_a, gpx_file):
+    assert models.Activity.objects.count() == 0
+    settings = models.get_settings()
+
+    for file_name in [fit_file, fit_file_a, gpx_file]:
+        shutil.copy2(Path(demo_data_dir) / file_name, settings.path_to_trace_dir)
+
+    # parse files using two worker processes, while db writes are still happening in this process
+    run_importer(models, workers=2)
+    assert models.Activity.objects.count() == 3
+    assert models.Traces.objects.count() == 3
+    assert models.BestSection.objects.count() > 0
+    distances = {a.trace_file.file_name: a.distance for a in models.Activity.objects.all()}
+
+    # reimporting sequentially yields the same results
+    run_importer(models, reimporting=True)
+    assert models.Activity.objects.count() == 3
+    assert {a.trace_file.file_name: a.distance for a in models.Activity.objects.all()} == distances
+
+
+def test_get_md5sums_of_files__only_hashes_changed_files(db, demo_data_dir, tracks_in_tmpdir, monkeypatch):
+    settings = models.get_settings()
+    file_a = Path(settings.path_to_trace_dir) / "a.fit"
+    file_b = Path(settings.path_to_trace_dir) / "b.gpx"
+    shutil.copy(Path(demo_data_dir) / "cycling_bad_schandau.fit", file_a)
+    shutil.copy(Path(demo_data_dir) / "cycling_walchensee.gpx", file_b)
+
+    hashed_files = []
+
+    def counting_calc_md5(file):
+        hashed_files.append(file)
+        return calc_md5(file)
+
+    monkeypatch.setattr(file_importer, "calc_md5", counting_calc_md5)
+
+    # initially all files need to be hashed
+    md5sums, hashed = _get_md5sums_of_files([file_a, file_b], models.FileIndex)
+    assert hashed == 2
+    assert md5sums == {file_a: calc_md5(file_a), file_b: calc_md5(file_b)}
+    assert hashed_files == [file_a, file_b]
+    assert models.FileIndex.objects.count() == 2
+
+    # nothing changed, so no file is hashed again
+    hashed_files.clear()
+    assert _get_md5sums_of_files([file_a, file_b], models.FileIndex) == (md5sums, 0)
+    assert hashed_files == []
+
+    # modify one file, only this one gets hashed again
+    with open(file_b, "a") as f:
+        f.write("\n")
+    md5sums, hashed = _get_md5sums_of_files([file_a, file_b], models.FileIndex)
+    assert md5sums[file_b] == calc_md5(file_b)
+    assert hashed == 1
+    assert hashed_files == [file_b]
+    assert models.FileIndex.objects.get(path=str(file_b)).md5sum == calc_md5(file_b)
+
+    # entries of removed files are deleted from the index
+    file_a.unlink()
+    _get_md5sums_of_files([file_b], models.FileIndex)
+    assert list(models.FileIndex.objects.values_list("path", flat=True)) == [str(file_b)]
+
+
+def test_save_single_parsed_file_to_db__is_atomic(db, demo_data_dir, monkeypatch):
+    parsed_file = file_importer._parse_single_file(
+        Path(demo_data_dir) / "cycling_bad_schandau.fit", Path(demo_data_dir), md5sum="foo"
+    )
+    assert parsed_file.laps
+    assert parsed_file.best_sections
+
+    def failing_save(*args, **kwargs):
+        raise RuntimeError("failed to save best sections")
+
+    # a failure while saving the file must not leave a partially written activity behind
+    save_best_sections = file_importer._save_best_sections_to_model
+    monkeypatch.setattr(file_importer, "_save_best_sections_to_model", failing_save)
+    with pytest.raises(RuntimeError):
+        file_importer._save_single_parsed_file_to_db(parsed_file, models, False, False)
+    assert models.Traces.objects.count() == 0
+    assert models.Lap.objects.count() == 0
+    assert models.Activity.objects.count() == 0
+
+    monkeypatch.setattr(file_importer, "_save_best_sections_to_model", save_best_sections)
+    activity = file_importer._save_single_parsed_file_to_db(parsed_file, models, False, False)
+    assert activity.pk is not None
+    assert models.Lap.objects.filter(trace=activity.trace_file).count() == len(parsed_file.laps)
+    assert models.BestSection.objects.filter(activity=activity).count() == len(parsed_file.best_sections)
+
+
+def test_import_of_activities__simplified_polylines(import_one_activity):
+    import_one_activity("cycling_bad_schandau.fit")
+    trace = models.Activity.objects.get().trace_file
+
+    polylines = models.Polyline.objects.filter(trace=trace).order_by("tolerance")
+    assert [polyline.tolerance for polyline in polylines] == configuration.polyline_tolerances
+    number_of_points = [polyline.number_of_points for polyline in polylines]
+    assert len(trace.get_series("latitude_list")) > number_of_points[0] > number_of_points[1] > number_of_points[2]
+    for polyline in polylines:
+        longitudes, latitudes = polyline.get_coordinates()
+        assert len(longitudes) == len(latitudes) == polyline.number_of_points
+
+    # reimporting replaces the polylines
+    run_importer(models, reimporting=True)
+    assert models.Polyline.objects.filter(trace=trace).count() == len(configuration.polyline_tolerances)
+
+    # polylines get deleted together with their activity
+    models.Activity.objects.get().delete()
+    assert models.Polyline.objects.count() == 0
@@ -1,4 +1,9 @@
+import datetime
+
+import pytz
+
 from wkz import models
+from workoutizer import settings as django_settings
 
 
 def test_traces__creation_of_file_name(db):
@@ -27,3 +32,42 @@ def test_activity__with_default_unknown_sport(db):
     activity_2.save()
     assert activity_2.name == name
     assert activity_2.sport == activity_1.sport
+
+
+def test_daily_summary__maintained_on_save_and_delete(insert_sport, insert_activity):
+    tz = pytz.timezone(django_settings.TIME_ZONE)
+    day = datetime.date(2020, 7, 7)
+    activity_1 = insert_activity(date=tz.localize(datetime.datetime(2020, 7, 7, 8)))
+    activity_2 = insert_activity(
+        date=tz.localize(datetime.datetime(2020, 7, 7, 23)), duration=datetime.timedelta(hours=1)
+    )
+    summary = models.DailySummary.objects.get()
+    assert (summary.sport, summary.day, summary.count) == (activity_1.sport, day, 2)
+    assert summary.duration == datetime.timedelta(minutes=90)
+    assert summary.distance == 10.4
+
+    # moving an activity to another day and sport updates both the old and the new summary
+    other_sport = insert_sport(name="Jumping", icon="cat")
+    activity_2.date = tz.localize(datetime.datetime(2020, 7, 8, 1))
+    activity_2.sport = other_sport
+    activity_2.save()
+    assert models.DailySummary.objects.get(sport=activity_1.sport, day=day).count == 1
+    summary = models.DailySummary.objects.get(sport=other_sport)
+    assert (summary.day, summary.count, summary.duration) == (datetime.date(2020, 7, 8), 1, datetime.timedelta(hours=1))
+
+    # deleting the sport keeps its activity without sport
+    other_sport.delete()
+    assert models.DailySummary.objects.get(sport=None).count == 1
+
+    activity_1.delete()
+    activity_2.delete()
+    assert not models.DailySummary.objects.exists()
+
+
+def test_rebuild_daily_summaries(insert_activity):
+    insert_activity()
+    insert_activity()
+    expected = list(models.DailySummary.objects.values("user", "sport", "day", "count", "duration", "distance"))
+    models.DailySummary.objects.all().delete()
+    models.rebuild_daily_summaries()
+    assert list(models.DailySummary.objects.values("user", "sport", "day", "count", "duration", "distance")) == expected
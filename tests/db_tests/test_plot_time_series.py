@@ -0,0 +1,52 @@
+from wkz import configuration as cfg
+from wkz import models
+from wkz.plotting import plot_time_series as plotting
+
+
+def test_plot_time_series__cached(import_one_activity, monkeypatch):
+    import_one_activity("cycling_bad_schandau.fit")
+    activity = models.Activity.objects.get()
+    assert models.Lap.objects.filter(trace=activity.trace_file).exists()
+    plotting.clear_cached_time_series_plots()
+
+    calls = []
+
+    def _plot_time_series(activity):
+        calls.append(activity.pk)
+        return f"script {len(calls)}", "div", 3
+
+    monkeypatch.setattr(plotting, "_plot_time_series", _plot_time_series)
+
+    assert plotting.plot_time_series(activity) == ("script 1", "div", 3)
+    assert plotting.plot_time_series(models.Activity.objects.get()) == ("script 1", "div", 3)
+    assert len(calls) == 1
+
+    # editing the label of a lap invalidates the cached plots
+    lap = models.Lap.objects.filter(trace=activity.trace_file).first()
+    lap.label = "Uphill"
+    lap.save()
+    assert plotting.plot_time_series(models.Activity.objects.get()) == ("script 2", "div", 3)
+
+    # as does reimporting the trace
+    activity.trace_file.save()
+    activity = models.Activity.objects.get()
+    assert plotting.plot_time_series(activity) == ("script 3", "div", 3)
+    assert plotting.plot_time_series(activity) == ("script 3", "div", 3)
+
+    # least recently used plots get evicted
+    monkeypatch.setattr(cfg, "time_series_plot_cache_size", 1)
+    lap.label = "Downhill"
+    lap.save()
+    assert plotting.plot_time_series(activity) == ("script 4", "div", 3)
+    assert len(plotting._cached_plots) == 1
+    plotting.clear_cached_time_series_plots()
+
+
+def test_plot_time_series(import_one_activity):
+    import_one_activity("cycling_bad_schandau.fit")
+    plotting.clear_cached_time_series_plots()
+    script, div, number_of_plots = plotting.plot_time_series(models.Activity.objects.get())
+    assert "<script" in script
+    assert "<div" in div
+    assert number_of_plots > 0
+    plotting.clear_cached_time_series_plots()
@@ -0,0 +1,37 @@
+import datetime
+
+import pandas as pd
+from django.contrib.auth.models import User
+
+from wkz import models
+from wkz.plotting.plot_workload import _get_workload, plot_workload
+
+
+def test_get_workload(insert_activity, monkeypatch):
+    user = User.objects.create_user(username="runner", password="secret")
+    for day, hours in [(6, 1), (8, 2), (9, 0.5), (22, 1)]:
+        activity = insert_activity(date=datetime.datetime(2020, 7, day, 12, tzinfo=datetime.timezone.utc))
+        activity.user = user
+        activity.duration = datetime.timedelta(hours=hours)
+        activity.save()
+    # activities of other users are not part of the workload
+    insert_activity(date=datetime.datetime(2020, 7, 13, 12, tzinfo=datetime.timezone.utc))
+
+    monkeypatch.setattr("django.utils.timezone.localdate", lambda: datetime.date(2020, 7, 31))
+    df, aggregated_by = _get_workload(models.DailySummary.objects.filter(user=user))
+    assert aggregated_by == "Weeks"
+    assert df["x_axis"].tolist() == [datetime.date(2020, 7, day) for day in [6, 13, 20]]
+    assert df["x_axis_formatted"].tolist()[0] == "2020-07-06 - 2020-07-12"
+    assert df["duration"].tolist() == [pd.Timedelta(hours=3.5), pd.Timedelta(0), pd.Timedelta(hours=1)]
+    assert df["distance"].round(1).tolist() == [15.6, 0, 5.2]
+
+    # longer time spans are aggregated by month
+    monkeypatch.setattr("django.utils.timezone.localdate", lambda: datetime.date(2021, 7, 31))
+    df, aggregated_by = _get_workload(models.DailySummary.objects.filter(user=user))
+    assert aggregated_by == "Months"
+    assert df["x_axis_formatted"].tolist() == ["July 2020"]
+    assert df["duration"].tolist() == [pd.Timedelta(hours=4.5)]
+
+    script, div, aggregated_by = plot_workload(models.DailySummary.objects.filter(user=user))
+    assert "<script" in script
+    assert aggregated_by == "Months"
@@ -0,0 +1,135 @@
+import datetime
+
+import pytest
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.test import RequestFactory
+from django.utils import timezone
+
+from wkz import models
+from wkz.utils.tile_metrics import TileEvaluator, TileMetricCalculator, get_tile_evaluator
+
+
+def _tile(key, metric_type, data_field, format_type="decimal", unit=None):
+    return models.MetricTile.objects.create(
+        name=key,
+        key=key,
+        title=key,
+        icon="fa-road",
+        metric_type=metric_type,
+        data_field=data_field,
+        format_type=format_type,
+        unit=unit,
+        decimal_places=2,
+    )
+
+
+@pytest.fixture
+def activities(insert_activity):
+    now = timezone.now()
+    insert_activity(date=now - datetime.timedelta(days=1), duration=datetime.timedelta(hours=1))
+    insert_activity(date=now - datetime.timedelta(days=3), duration=datetime.timedelta(hours=2))
+    insert_activity(date=now - datetime.timedelta(days=10), duration=datetime.timedelta(minutes=30))
+
+
+def test_calculate_tile_metrics(activities, django_assert_num_queries):
+    tiles = [
+        _tile("total_duration", "total", "duration", "duration", "hours"),
+        _tile("avg_duration", "average", "duration", "duration", "minutes"),
+        _tile("longest_activity", "max", "duration", "duration", "hours"),
+        _tile("shortest_activity", "min", "duration", "duration", "hours"),
+        _tile("weekly_duration", "trend", "duration", "duration", "hours"),
+        _tile("total_distance", "total", "distance"),
+        _tile("weekly_distance", "trend", "distance"),
+        _tile("activity_count", "count", "id", "number"),
+        _tile("avg_pace", "custom", "duration", "custom"),
+        _tile("unknown", "median", "distance"),
+    ]
+    calculator = TileMetricCalculator()
+    with django_assert_num_queries(1):
+        results = calculator.calculate_tile_metrics(tiles)
+    values = {result["tile"].key: result["value"] for result in results}
+    assert values["total_duration"] == 3.5
+    assert values["avg_duration"] == 70
+    assert values["longest_activity"] == 2
+    assert values["shortest_activity"] == 0.5
+    assert values["weekly_duration"] == 3
+    assert values["total_distance"] == pytest.approx(15.6)
+    assert values["weekly_distance"] == pytest.approx(10.4)
+    assert values["activity_count"] == 3
+    assert values["avg_pace"] == pytest.approx(210 / 15.6)
+    assert values["unknown"] == 0
+    formatted = {result["tile"].key: result["formatted_value"] for result in results}
+    assert formatted["total_duration"] == "3h 30m"
+    assert formatted["avg_duration"] == "70m"
+    assert formatted["avg_pace"] == "13:27"
+
+    # a single tile yields the same result
+    assert calculator.calculate_tile_metric(tiles[0])["value"] == 3.5
+    assert TileMetricCalculator(days_limit=7).calculate_tile_metric(tiles[0])["value"] == 3
+
+
+def test_calculate_tile_metrics__no_activities(db):
+    results = TileMetricCalculator().calculate_tile_metrics(
+        [_tile("total_duration", "total", "duration", "duration", "hours"), _tile("avg_pace", "custom", "duration")]
+    )
+    assert [result["value"] for result in results] == [0, 0]
+    assert results[0]["formatted_value"] == "0h 0m"
+
+
+def test_calculate_tile_metrics__invalid_data_field(activities):
+    tiles = [
+        _tile("total_duration", "total", "duration", "duration", "hours"),
+        _tile("total_typo", "total", "distanse"),
+        _tile("activity_count", "count", "id", "number"),
+    ]
+    # the invalid data field only breaks its own tile
+    results = TileMetricCalculator().calculate_tile_metrics(tiles)
+    assert [result["value"] for result in results] == [3.5, 0, 3]
+    assert results[1]["formatted_value"] == "0.00"
+
+
+def test_metric_tile__data_field_is_validated(db):
+    _tile("total_distance", "total", "distance").full_clean()
+    _tile("max_speed", "max", "trace_file__max_speed").full_clean()
+    # the data field is not used by counts
+    _tile("activity_count", "count", "notes").full_clean()
+    with pytest.raises(ValidationError) as e:
+        _tile("total_typo", "total", "distanse").full_clean()
+    assert list(e.value.message_dict) == ["data_field"]
+
+
+def test_tile_evaluator(activities, django_assert_num_queries, django_capture_on_commit_callbacks):
+    cache.clear()
+    total_duration = _tile("total_duration", "total", "duration", "duration", "hours")
+    activity_count = _tile("activity_count", "count", "id", "number")
+    sport = models.Sport.objects.get()
+
+    evaluator = TileEvaluator()
+    # only the requested tiles are computed
+    with django_assert_num_queries(1):
+        assert evaluator.evaluate([total_duration], sport=sport)[0]["value"] == 3.5
+    # tiles which are already known are not computed again
+    with django_assert_num_queries(1):
+        assert evaluator.evaluate([activity_count, total_duration], sport=sport)[0]["value"] == 3
+    with django_assert_num_queries(0):
+        assert evaluator.evaluate([total_duration, activity_count], sport=sport)[1]["value"] == 3
+    # other scopes are computed separately
+    assert evaluator.evaluate([total_duration], sport=sport, days_limit=7)[0]["value"] == 3
+
+    # another request gets the metrics from the cache
+    with django_assert_num_queries(0):
+        assert TileEvaluator().evaluate([activity_count], sport=sport)[0]["formatted_value"] == "3"
+
+    # until activities change
+    with django_capture_on_commit_callbacks(execute=True):
+        models.Activity.objects.first().delete()
+    assert TileEvaluator().evaluate([activity_count], sport=sport)[0]["value"] == 2
+    cache.clear()
+
+
+def test_get_tile_evaluator():
+    request = RequestFactory().get("/")
+    assert get_tile_evaluator(request) is get_tile_evaluator(request)
+    assert get_tile_evaluator(request) is not get_tile_evaluator(RequestFactory().get("/"))
+    assert isinstance(get_tile_evaluator(), TileEvaluator)
@@ -1,12 +1,22 @@
 import datetime
+import io
 
 import numpy as np
 import pytest
 import pytz
+from django.contrib.auth.models import User
 from django.urls import reverse
+from PIL import Image
 
-from wkz import models
-from wkz.views import get_flat_list_of_pks_of_activities_in_top_awards, get_summary_of_all_activities
+from wkz import configuration, models
+from wkz.gis import heatmap
+from wkz.gis.heatmap import get_pixel_coordinates
+from wkz.views import (
+    get_bounding_box_of_traces,
+    get_flat_list_of_pks_of_activities_in_top_awards,
+    get_simplified_coordinates_of_traces,
+    get_summary_of_all_activities,
+)
 from workoutizer import settings as django_settings
 
 
@@ -45,6 +55,29 @@ def test_activity_view__no_activity(db, client):
         client.get("/activity/1")
 
 
+def test_get_simplified_coordinates_of_traces(import_demo_data, monkeypatch):
+    trace_ids = list(models.Traces.objects.values_list("pk", flat=True))
+    polylines = models.Polyline.objects.filter(trace_id__in=trace_ids)
+
+    # the most detailed polylines are used as long as they do not exceed the maximum number of points
+    coordinates = get_simplified_coordinates_of_traces(trace_ids)
+    finest = polylines.filter(tolerance=min(configuration.polyline_tolerances))
+    assert sum(len(longitudes) for longitudes, _ in coordinates.values()) == sum(p.number_of_points for p in finest)
+    assert set(coordinates) == set(finest.values_list("trace_id", flat=True))
+
+    monkeypatch.setattr(configuration, "max_number_of_map_points", sum(p.number_of_points for p in finest) - 1)
+    coordinates = get_simplified_coordinates_of_traces(trace_ids)
+    assert sum(len(longitudes) for longitudes, _ in coordinates.values()) < sum(p.number_of_points for p in finest)
+
+    # the coarsest polylines are used if no polylines satisfy the maximum number of points
+    monkeypatch.setattr(configuration, "max_number_of_map_points", 0)
+    coordinates = get_simplified_coordinates_of_traces(trace_ids)
+    coarsest = polylines.filter(tolerance=max(configuration.polyline_tolerances))
+    assert sum(len(longitudes) for longitudes, _ in coordinates.values()) == sum(p.number_of_points for p in coarsest)
+
+    assert get_simplified_coordinates_of_traces([]) == {}
+
+
 def test_get_flat_list_of_pks_of_activities_in_top_awards(db, import_demo_data):
     result_pks = get_flat_list_of_pks_of_activities_in_top_awards()
     assert len(result_pks) == 7
@@ -113,3 +146,133 @@ def test_get_summary_of_all_activities(insert_sport, db, insert_activity):
     }
     result = get_summary_of_all_activities()
     assert expected == result
+
+
+@pytest.fixture
+def logged_in_client(client, import_demo_data):
+    user = User.objects.create_user(username="runner", password="secret")
+    models.Activity.objects.update(user=user)
+    models.rebuild_daily_summaries()
+    client.force_login(user)
+    return client
+
+
+def test_dashboard_view__daily_summaries(logged_in_client):
+    user = User.objects.get(username="runner")
+    profile = models.get_settings(user)
+    profile.number_of_days = 9999
+    profile.save()
+    response = logged_in_client.get(reverse("dashboard"))
+    assert response.status_code == 200
+    assert response.context["activities_selected_for_plot"]
+    assert response.context["summary"]["count"] == models.Activity.objects.count()
+    assert sum(response.context["pie_chart_data"]) == models.Activity.objects.count()
+    assert sorted(response.context["pie_chart_labels"]) == sorted(
+        set(models.Activity.objects.values_list("sport__name", flat=True))
+    )
+    summary = get_summary_of_all_activities(user)
+    assert summary["duration"] == sum(models.Activity.objects.values_list("duration", flat=True), datetime.timedelta())
+
+
+def test_sport_traces(logged_in_client):
+    sport = models.Sport.objects.get(name="Cycling")
+    url = reverse("sport-traces", args=[sport.slug])
+    activities = models.Activity.objects.filter(sport=sport).exclude(trace_file__latitude_list=b"")
+
+    response = logged_in_client.get(url, {"days": 10_000})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["precision"] == configuration.polyline_precision
+    assert sorted(trace["pk"] for trace in data["traces"]) == sorted(activities.values_list("pk", flat=True))
+    assert all(trace["sport"] == "Cycling" and trace["coordinates"] for trace in data["traces"])
+    assert response.has_header("Last-Modified")
+
+    # unchanged traces are not sent again
+    etag = response["ETag"]
+    response = logged_in_client.get(url, {"days": 10_000}, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    activity = activities.first()
+    activity.name = "Renamed"
+    activity.save()
+    response = logged_in_client.get(url, {"days": 10_000}, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+
+    # only traces within the bounding box are returned
+    response = logged_in_client.get(url, {"days": 10_000, "bbox": "-10.0,-10.0,-9.0,-9.0"})
+    assert response.json()["traces"] == []
+    (south, west), (north, east) = get_bounding_box_of_traces(list(activities.values_list("trace_file", flat=True)))
+    response = logged_in_client.get(url, {"days": 10_000, "bbox": f"{west},{south},{east},{north}"})
+    assert len(response.json()["traces"]) == activities.count()
+    assert logged_in_client.get(url, {"bbox": "1,2,3"}).status_code == 400
+    assert logged_in_client.get(url, {"bbox": "a,b,c,d"}).status_code == 400
+
+    # activities outside of the date window are not returned
+    assert logged_in_client.get(url, {"days": 0}).json()["traces"] == []
+
+
+def test_activity_traces(logged_in_client, client):
+    activity = models.Activity.objects.exclude(trace_file__latitude_list=b"").first()
+
+    response = logged_in_client.get(reverse("activity-traces", args=[activity.pk]))
+    assert response.status_code == 200
+    traces = response.json()["traces"]
+    assert len(traces) == 1
+    assert traces[0]["pk"] == activity.pk
+    assert traces[0]["name"] == activity.name
+
+    # activities of other users are not accessible, the 404 handler redirects to the dashboard
+    activity.user = User.objects.create_user(username="other", password="secret")
+    activity.save()
+    response = logged_in_client.get(reverse("activity-traces", args=[activity.pk]))
+    assert response.status_code == 302
+    assert response.url == "/"
+
+
+def test_heatmap_tile(logged_in_client, tmp_path, monkeypatch, django_capture_on_commit_callbacks):
+    monkeypatch.setattr(django_settings, "HEATMAP_TILES_DIR", str(tmp_path))
+    activity = models.Activity.objects.filter(sport__name="Cycling").exclude(trace_file__latitude_list=b"").first()
+    polyline = models.Polyline.objects.filter(trace=activity.trace_file).first()
+    x, y = get_pixel_coordinates(polyline.min_longitude, polyline.max_latitude, 12)
+    x, y = int(x // heatmap.TILE_SIZE), int(y // heatmap.TILE_SIZE)
+    url = reverse("heatmap-tile", args=["cycling", 12, x, y])
+
+    response = logged_in_client.get(url)
+    assert response.status_code == 200
+    assert response["Content-Type"] == "image/png"
+    path = heatmap.get_path_of_tile(str(tmp_path), activity.user.pk, "cycling", 12, x, y)
+    assert path.read_bytes() == response.content
+    # the tile shows some traces, while the one of another sport does not
+    assert np.asarray(Image.open(io.BytesIO(response.content)))[..., 3].any()
+    response = logged_in_client.get(reverse("heatmap-tile", args=["hiking", 12, x, y]))
+    assert not np.asarray(Image.open(io.BytesIO(response.content)))[..., 3].any()
+
+    # cached tiles are not rendered again
+    response = logged_in_client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+    assert response.status_code == 304
+
+    # renaming an activity does not affect the tiles
+    activity.name = "renamed"
+    with django_capture_on_commit_callbacks(execute=True):
+        activity.save()
+    assert path.is_file()
+    # while changing its sport invalidates the tiles it passes through
+    activity.sport = models.Sport.objects.get(name="Hiking")
+    with django_capture_on_commit_callbacks(execute=True):
+        activity.save()
+    assert not path.is_file()
+    assert logged_in_client.get(url).status_code == 200
+    assert path.is_file()
+
+    assert logged_in_client.get(reverse("heatmap-tile", args=["all", 1, 2, 0])).status_code == 404
+
+
+def test_settings_view__import_runs(logged_in_client):
+    response = logged_in_client.get(reverse("settings"))
+    assert response.status_code == 200
+    # importing the demo data was recorded
+    run = models.ImportRun.objects.get()
+    assert list(response.context["import_runs"]) == [run]
+    content = response.content.decode("UTF-8")
+    assert 'id="import-runs"' in content
+    assert f"{run.number_of_imported}/{run.number_of_files}" in content
@@ -252,3 +252,23 @@ def test_file_importer__with_path_being_changed(db, tmp_path, demo_data_dir, fit
     )
     time.sleep(3)
     delayed_assertion(models.Activity.objects.count, operator.ne, 2)
+
+
+def test_trigger_file_watchdog__only_given_paths(db, tracks_in_tmpdir, demo_data_dir, fit_file_a, fit_file_b):
+    trace_dir = Path(tracks_in_tmpdir.path_to_trace_dir)
+    copy_demo_fit_files_to_track_dir(
+        source_dir=demo_data_dir,
+        targe_dir=trace_dir,
+        list_of_files_to_copy=[fit_file_a, fit_file_b],
+    )
+
+    # only import the file which was reported by the file watcher
+    trigger_file_watchdog(paths=[str(trace_dir / fit_file_a), str(trace_dir / "already_removed.fit")])
+    assert models.Activity.objects.count() == 1
+    assert models.Traces.objects.get().file_name == fit_file_a
+    assert models.FileIndex.objects.count() == 1
+
+    # without paths all files in the trace dir are imported
+    trigger_file_watchdog()
+    assert models.Activity.objects.count() == 2
+    assert models.FileIndex.objects.count() == 2
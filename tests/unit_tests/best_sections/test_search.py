@@ -0,0 +1,154 @@
+import math
+import os
+
+import numpy as np
+import pytest
+from sportgems import (
+    DistanceTooSmallException,
+    InconsistentLengthException,
+    NoSectionFoundException,
+    TooFewDataPointsException,
+    find_best_climb_section,
+    find_fastest_section,
+)
+
+from wkz import configuration
+from wkz.best_sections.climb import BestClimbSections
+from wkz.best_sections.fastest import FastestSections
+from wkz.best_sections.search import SectionSearch, get_altitude_gains, get_section_distances
+
+sportgems_exceptions = (
+    DistanceTooSmallException,
+    InconsistentLengthException,
+    NoSectionFoundException,
+    TooFewDataPointsException,
+)
+test_files = [
+    "example.fit",
+    "example.gpx",
+    "2020-09-12-11-15-46.fit",
+    "2020-10-25-10-54-06.fit",
+    "run_with_coordinates.fit",
+    "with_nones.fit",
+    "2020-08-20-09-34-33.fit",
+    "cycling_walchensee.gpx",
+    "hike_with_coordinates_muggenbrunn.fit",
+]
+
+
+@pytest.fixture
+def parser(fit_parser, gpx_parser, test_data_dir, demo_data_dir):
+    def _parser(file_name):
+        if file_name.endswith(".fit"):
+            return fit_parser(file_name)
+        path = os.path.join(test_data_dir, file_name)
+        if not os.path.isfile(path):
+            path = os.path.join(demo_data_dir, file_name)
+        return gpx_parser(path)
+
+    return _parser
+
+
+def _sportgems_tuple(section):
+    return section.start, section.end, section.velocity if hasattr(section, "velocity") else section.climb
+
+
+def _sportgems_fastest_section(distance, parser):
+    coordinates = list(zip(parser.latitude_list, parser.longitude_list))
+    try:
+        section = find_fastest_section(distance, parser.timestamps_list, coordinates)
+    except sportgems_exceptions:
+        return None
+    return _sportgems_tuple(section)
+
+
+def _sportgems_best_climb_section(distance, parser):
+    coordinates = list(zip(parser.latitude_list, parser.longitude_list))
+    try:
+        section = find_best_climb_section(distance, parser.timestamps_list, coordinates, parser.altitude_list)
+    except sportgems_exceptions:
+        return None
+    return _sportgems_tuple(section)
+
+
+def test_get_section_distances():
+    coordinates = [(48.123, 9.35), (48.123, 9.36), (48.123, 9.37), (48.123, 9.38)]
+    distances = get_section_distances(*zip(*coordinates))
+
+    assert distances[0] == 0.0
+    assert np.all(np.diff(distances) > 0)
+    # section distances are computed using the earth radius of sportgems, which differs from the haversine one
+    assert math.isclose(distances[-1], 2229.27, abs_tol=0.01)
+
+
+def test_get_section_distances__missing_and_identical_coordinates():
+    latitudes = [48.123, None, 48.123, 48.123, np.nan, 48.123]
+    longitudes = [9.35, None, 9.36, 9.36, np.nan, 9.37]
+    distances = get_section_distances(latitudes, longitudes)
+
+    # distance of points without coordinates is attributed to the next point with coordinates
+    assert distances[1] == 0.0
+    assert distances[2] > 0.0
+    # identical points do not add any distance
+    assert distances[3] == distances[2]
+    assert distances[4] == distances[3]
+    assert distances[5] > distances[4]
+
+
+def test_get_altitude_gains():
+    gains = get_altitude_gains([100.0, 101.5, None, 101.0, 103.0, np.nan])
+
+    np.testing.assert_array_equal(gains, [0.0, 1.5, 0.0, 0.0, 2.0, 0.0])
+
+
+def test_section_search__dummy_data():
+    # same example data as used in the sportgems readme
+    coordinates = [(48.123, 9.35), (48.123, 9.36), (48.123, 9.37), (48.123, 9.38)]
+    altitudes = [123.4, 234.5, 345.6, 456.7]
+    times = [1608228953.8, 1608228954.8, 1608228955.8, 1608228956.8]
+    search = SectionSearch(times, *zip(*coordinates), altitudes=altitudes, tolerance=1000)
+
+    assert search.get_fastest_section(1000) == _sportgems_tuple(find_fastest_section(1000, times, coordinates, 1000))
+    assert search.get_best_climb_section(1000) == _sportgems_tuple(
+        find_best_climb_section(1000, times, coordinates, altitudes, 1000)
+    )
+    # distance of trace is too small
+    assert search.get_fastest_section(10_000) is None
+    assert search.get_best_climb_section(10_000) is None
+
+
+def test_section_search__no_data():
+    search = SectionSearch([], [], [], [])
+
+    assert search.get_fastest_section(1000) is None
+    assert search.get_best_climb_section(1000) is None
+
+
+@pytest.mark.parametrize("file_name", test_files)
+def test_section_search__same_sections_as_sportgems(parser, file_name):
+    parser = parser(file_name)
+    search = SectionSearch(parser.timestamps_list, parser.latitude_list, parser.longitude_list, parser.altitude_list)
+
+    for distance in FastestSections.distances + [100, 500, 20_000]:
+        assert search.get_fastest_section(distance) == _sportgems_fastest_section(distance, parser)
+    for distance in BestClimbSections.distances + [50, 5000]:
+        assert search.get_best_climb_section(distance) == _sportgems_best_climb_section(distance, parser)
+
+
+@pytest.mark.parametrize("file_name", ["example.fit", "example.gpx", "2020-10-25-10-54-06.fit"])
+def test_get_best_sections__same_as_sportgems(parser, file_name):
+    parser = parser(file_name)
+    parser.get_best_sections()
+
+    expected = []
+    for bs in configuration.best_sections:
+        for distance in bs.distances:
+            if parser.distance * 1000 > distance:
+                try:
+                    section = bs.parser(distance, parser)
+                except sportgems_exceptions:
+                    continue
+                if section:
+                    expected.append(section)
+    assert parser.best_sections == expected
+    assert len(expected) > 0
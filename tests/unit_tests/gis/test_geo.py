@@ -1,12 +1,17 @@
 import math
 
+import numpy as np
 import pytest
 
 from wkz.gis.geo import (
     add_elevation_data_to_coordinates,
     calculate_distance_between_points,
+    encode_polyline,
+    get_distances_of_trace,
+    get_douglas_peucker_significance,
     get_list_of_coordinates,
     get_location_name,
+    get_simplified_polylines,
     get_total_distance_of_trace,
 )
 
@@ -56,6 +61,28 @@ def test_get_total_distance_of_trace__reversed_points():
     assert get_total_distance_of_trace(longitude_list=[99, 98], latitude_list=[16, 16]) == 106.89
 
 
+def test_get_distances_of_trace():
+    distances, total = get_distances_of_trace(longitude_list=[8.0, 8.1, 8.2], latitude_list=[48.0, 48.0, 48.0])
+    assert distances[0] == 0.0
+    assert math.isclose(distances[1], 7440.4, abs_tol=0.01)
+    assert math.isclose(distances[2], 2 * distances[1], rel_tol=1e-6)
+    assert total == 14.88
+
+
+def test_get_distances_of_trace__missing_coordinates():
+    # points without coordinates are skipped, also in between other points
+    distances, total = get_distances_of_trace(
+        longitude_list=[None, 8.0, float("nan"), None, 8.1, None],
+        latitude_list=[None, 48.0, float("nan"), None, 48.0, None],
+    )
+    np.testing.assert_allclose(distances, [0.0, 0.0, 0.0, 0.0, 7440.4, 7440.4], atol=0.01)
+    assert total == 7.44
+
+    distances, total = get_distances_of_trace(longitude_list=[None, None], latitude_list=[None, None])
+    np.testing.assert_array_equal(distances, [0.0, 0.0])
+    assert total == 0.0
+
+
 def test_add_elevation_data_to_coordinates():
     assert add_elevation_data_to_coordinates(
         coordinates=[(8, 49), (9, 50), (10, 51)],
@@ -108,3 +135,71 @@ def test_get_list_of_coordinates__data_with_gaps():
 
     # note that because of configuration.every_nth_value only every nth value will be used
     assert coordinates == [(49.2345, 11.2345), (49.2345, 11.2345)]
+
+
+def test_get_douglas_peucker_significance__dummy_data():
+    # an L-shaped trace with its corner roughly 157m off the line from start to end and a small bump of roughly 11m
+    lon = [0.0, 0.001, 0.002, 0.002, 0.002]
+    lat = [0.0, 0.0001, 0.0, 0.001, 0.002]
+    significance = get_douglas_peucker_significance(lon, lat)
+
+    assert significance[0] == significance[-1] == np.inf
+    assert math.isclose(significance[2], 157.3, abs_tol=0.1)
+    assert math.isclose(significance[1], 11.1, abs_tol=0.1)
+    # points on a straight line do not add any detail
+    assert significance[3] == 0.0
+
+
+def test_get_douglas_peucker_significance__missing_coordinates():
+    lon = [None, 0.0, np.nan, 0.001, 0.002, None]
+    lat = [None, 0.0, np.nan, 0.001, 0.0, None]
+    significance = get_douglas_peucker_significance(lon, lat)
+
+    np.testing.assert_array_equal(significance[[0, 2, 5]], [0.0, 0.0, 0.0])
+    assert significance[1] == significance[4] == np.inf
+    assert significance[3] > 0.0
+
+    assert not get_douglas_peucker_significance([None, None], [None, None]).any()
+    with pytest.raises(ValueError):
+        get_douglas_peucker_significance([0.0], [0.0, 1.0])
+
+
+def test_get_simplified_polylines__dummy_data():
+    lon = [0.0, 0.001, 0.002, 0.002, 0.002]
+    lat = [0.0, 0.0001, 0.0, 0.001, 0.002]
+    polylines = get_simplified_polylines(lon, lat, [1, 50, 200])
+
+    np.testing.assert_array_equal(polylines[1][0], [0.0, 0.001, 0.002, 0.002])
+    np.testing.assert_array_equal(polylines[1][1], [0.0, 0.0001, 0.0, 0.002])
+    np.testing.assert_array_equal(polylines[50][0], [0.0, 0.002, 0.002])
+    np.testing.assert_array_equal(polylines[50][1], [0.0, 0.0, 0.002])
+    np.testing.assert_array_equal(polylines[200][0], [0.0, 0.002])
+    assert get_simplified_polylines([], [], [1, 50]) == {}
+
+
+def test_get_simplified_polylines__deviation_within_tolerance(fit_parser):
+    parser = fit_parser("2020-10-25-10-54-06.fit")
+    polylines = get_simplified_polylines(parser.longitude_list, parser.latitude_list, [2, 10, 50])
+
+    # more detail for smaller tolerances, but still way fewer points than the original trace
+    number_of_points = [len(polylines[tolerance][0]) for tolerance in [2, 10, 50]]
+    assert len(parser.latitude_list) > 5 * number_of_points[0]
+    assert number_of_points[0] > number_of_points[1] > number_of_points[2] > 2
+    # first and last point with coordinates are always kept
+    coordinates = [(lon, lat) for lon, lat in zip(parser.longitude_list, parser.latitude_list) if not math.isnan(lon)]
+    for longitudes, latitudes in polylines.values():
+        assert (longitudes[0], latitudes[0]) == coordinates[0]
+        assert (longitudes[-1], latitudes[-1]) == coordinates[-1]
+
+
+def test_encode_polyline():
+    # example of the documentation of the encoded polyline algorithm format
+    assert encode_polyline([-120.2, -120.95, -126.453], [38.5, 40.7, 43.252]) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert encode_polyline([-120.2, -120.95], [38.5, 40.7], precision=6) == "_izlhA~rlgdF_{geC~ywl@"
+    # consecutive coordinates which are equal after rounding are encoded as zero differences
+    assert encode_polyline([8.123451, 8.123449], [49.0, 49.0]) == "_iajHqrqp@??"
+    assert encode_polyline([], []) == ""
+    with pytest.raises(ValueError):
+        encode_polyline([8.1, np.nan], [49.0, 49.1])
+    with pytest.raises(ValueError):
+        encode_polyline([8.1], [49.0, 49.1])
@@ -0,0 +1,112 @@
+import io
+import math
+
+import numpy as np
+from PIL import Image
+
+from wkz.gis.heatmap import (
+    TILE_SIZE,
+    get_bounding_box_of_tile,
+    get_path_of_tile,
+    get_pixel_coordinates,
+    get_tiles_of_bounding_box,
+    get_tolerance_for_zoom,
+    invalidate_tiles,
+    render_tile,
+    save_tile,
+)
+
+
+def _decode(tile: bytes) -> np.ndarray:
+    return np.asarray(Image.open(io.BytesIO(tile)))
+
+
+def test_get_pixel_coordinates():
+    x, y = get_pixel_coordinates(np.array([0.0, -180.0, 180.0]), np.array([0.0, 85.05112878, -85.05112878]), 0)
+    np.testing.assert_allclose(x, [128.0, 0.0, 256.0])
+    np.testing.assert_allclose(y, [128.0, 0.0, 256.0], atol=1e-6)
+
+    x, y = get_pixel_coordinates(np.array([8.4]), np.array([49.0]), 12)
+    assert (int(x[0] // TILE_SIZE), int(y[0] // TILE_SIZE)) == (2143, 1406)
+
+
+def test_get_bounding_box_of_tile():
+    west, south, east, north = get_bounding_box_of_tile(0, 0, 0)
+    assert (west, east) == (-180.0, 180.0)
+    assert math.isclose(north, 85.0511, abs_tol=1e-4)
+    assert math.isclose(south, -85.0511, abs_tol=1e-4)
+
+    west, south, east, north = get_bounding_box_of_tile(12, 2143, 1406)
+    assert west <= 8.4 <= east
+    assert south <= 49.0 <= north
+
+
+def test_get_tiles_of_bounding_box():
+    assert get_tiles_of_bounding_box((-180.0, -85.0, 180.0, 85.0), 0) == (range(0, 1), range(0, 1))
+    assert get_tiles_of_bounding_box((-180.0, -85.0, 180.0, 85.0), 1) == (range(0, 2), range(0, 2))
+
+    x_range, y_range = get_tiles_of_bounding_box((8.4, 49.0, 8.4, 49.0), 12)
+    assert 2143 in x_range and 1406 in y_range
+    # the margin for the line width only adds neighbouring tiles
+    assert len(x_range) <= 2 and len(y_range) <= 2
+
+
+def test_get_tolerance_for_zoom():
+    tolerances = [2, 10, 50]
+    assert get_tolerance_for_zoom(0, tolerances) == 50
+    assert get_tolerance_for_zoom(12, tolerances) == 10
+    assert get_tolerance_for_zoom(15, tolerances) == 2
+    assert get_tolerance_for_zoom(20, tolerances) == 2
+
+
+def test_render_tile__no_traces():
+    tile = _decode(render_tile([], 12, 2143, 1406))
+
+    assert tile.shape == (TILE_SIZE, TILE_SIZE, 4)
+    assert not tile[..., 3].any()
+
+
+def test_render_tile__overlapping_traces():
+    west, south, east, north = get_bounding_box_of_tile(12, 2143, 1406)
+    middle = (south + north) / 2
+    # two horizontal traces across the tile, one of them only crossing its western half
+    traces = [
+        (np.array([west - 0.01, east + 0.01]), np.array([middle, middle])),
+        (np.array([west - 0.01, (west + east) / 2]), np.array([middle, middle])),
+        # traces far away from the tile do not show up
+        (np.array([0.0, 1.0]), np.array([0.0, 1.0])),
+        (np.array([]), np.array([])),
+    ]
+    tile = _decode(render_tile(traces, 12, 2143, 1406))
+
+    row = tile[TILE_SIZE // 2]
+    assert row[10, 3] > row[TILE_SIZE - 10, 3] > 0
+    assert row[10, 1] > row[TILE_SIZE - 10, 1]
+    assert not tile[10, :, 3].any()
+
+    # each trace is counted once per pixel, even if it passes a pixel several times
+    loop = (
+        np.array([west - 0.01, east + 0.01, east + 0.01, west - 0.01, west - 0.01, east + 0.01]),
+        np.array([middle, middle, north + 0.1, north + 0.1, middle, middle]),
+    )
+    np.testing.assert_array_equal(
+        _decode(render_tile([loop], 12, 2143, 1406)), _decode(render_tile(traces[:1], 12, 2143, 1406))
+    )
+
+
+def test_invalidate_tiles(tmp_path):
+    tiles = [(1, "all", 12, 2143, 1406), (1, "cycling", 12, 2143, 1406), (2, "all", 12, 2143, 1406)]
+    tiles += [(1, "all", 12, 2000, 1406), (1, "all", 12, 2143, 1000), (1, "all", 5, 16, 10)]
+    for tile in tiles:
+        save_tile(get_path_of_tile(str(tmp_path), *tile), b"png")
+    assert all(get_path_of_tile(str(tmp_path), *tile).read_bytes() == b"png" for tile in tiles)
+
+    # only tiles intersecting the bounding box are deleted, for all users, scopes and zoom levels
+    assert invalidate_tiles(str(tmp_path), (8.39, 48.99, 8.41, 49.01)) == 4
+    remaining = [tile for tile in tiles if get_path_of_tile(str(tmp_path), *tile).is_file()]
+    assert remaining == [(1, "all", 12, 2000, 1406), (1, "all", 12, 2143, 1000)]
+    assert invalidate_tiles(str(tmp_path / "not_existing"), (8.39, 48.99, 8.41, 49.01)) == 0
+
+    # the tiles of several bounding boxes are deleted at once
+    assert invalidate_tiles(str(tmp_path), (8.39, 48.99, 8.41, 49.01), (-4.2, 48.99, -4.15, 49.01)) == 1
+    assert invalidate_tiles(str(tmp_path)) == 0
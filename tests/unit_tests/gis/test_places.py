@@ -0,0 +1,111 @@
+import time
+
+import numpy as np
+import pytest
+
+from wkz import configuration as cfg
+from wkz.gis import geo, places
+from wkz.gis.places import PlaceIndex, get_place_index, read_geonames_file
+from workoutizer import settings as django_settings
+
+# rows of a GeoNames dump: geonameid, name, asciiname, alternatenames, latitude, longitude, feature class, ...
+GEONAMES = [
+    (2873891, "Mannheim", "Mannheim", "MA", 49.48806, 8.46611, "P", "PPLA2", "DE"),
+    (2907911, "Heidelberg", "Heidelberg", "", 49.40768, 8.69079, "P", "PPLA3", "DE"),
+    (2953402, "Bad Dürkheim", "Bad Durkheim", "", 49.4618, 8.17236, "P", "PPLA3", "DE"),
+    (2921044, "Germany", "Germany", "", 51.5, 10.5, "A", "PCLI", "DE"),
+    (4036284, "Alofi", "Alofi", "", -19.05451, -169.91851, "P", "PPLC", "NU"),
+    (2198148, "Levuka", "Levuka", "", -17.68333, 178.83333, "P", "PPL", "FJ"),
+]
+
+
+@pytest.fixture
+def geonames_file(tmp_path):
+    path = tmp_path / "geonames.txt"
+    lines = ["\t".join(str(value) for value in row) + "\t\t\t\t\t\t\t\t\tEurope/Berlin\t2020-01-01" for row in GEONAMES]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def test_read_geonames_file(geonames_file):
+    index = read_geonames_file(geonames_file)
+    # only populated places are taken into account
+    assert len(index) == 5
+    assert sorted(index.names) == ["Alofi", "Bad Dürkheim", "Heidelberg", "Levuka", "Mannheim"]
+
+
+def test_get_nearest_place(geonames_file):
+    index = read_geonames_file(geonames_file)
+    assert index.get_nearest_place((49.47950, 8.47102), max_distance=10_000) == "Mannheim"
+    assert index.get_nearest_place((49.46278, 8.16051), max_distance=10_000) == "Bad Dürkheim"
+    # nearest place across cells
+    assert index.get_nearest_place((49.42, 8.6), max_distance=10_000) == "Heidelberg"
+    assert index.get_nearest_place((49.3, 8.6), max_distance=10_000) is None
+    assert index.get_nearest_place((49.3, 8.6), max_distance=20_000) == "Heidelberg"
+    assert index.get_nearest_place((51.5, 10.5), max_distance=10_000) is None
+    # across the antimeridian
+    assert index.get_nearest_place((-17.7, -179.9), max_distance=200_000) == "Levuka"
+    assert index.get_nearest_place((-90, 90), max_distance=10_000) is None
+
+
+def test_get_nearest_place__many_places():
+    rng = np.random.default_rng(0)
+    latitudes, longitudes = rng.uniform(-60, 70, 100_000), rng.uniform(-180, 180, 100_000)
+    index = PlaceIndex(np.arange(len(latitudes)), latitudes, longitudes)
+    coordinates = list(zip(rng.uniform(-60, 70, 100), rng.uniform(-180, 180, 100)))
+    start = time.perf_counter()
+    nearest = [index.get_nearest_place(coordinate, max_distance=50_000) for coordinate in coordinates]
+    assert (time.perf_counter() - start) / len(coordinates) < 0.01
+
+    # same result as computing the distances to all places
+    for (latitude, longitude), place in zip(coordinates, nearest):
+        distances = np.array(
+            [geo.calculate_distance_between_points((latitude, longitude), p) for p in zip(latitudes, longitudes)]
+        )
+        expected = int(np.argmin(distances)) if distances.min() <= 50_000 else None
+        assert place == expected
+
+
+def test_get_place_index(geonames_file, tmp_path):
+    assert get_place_index(str(tmp_path / "missing.txt")) is None
+    assert get_place_index(geonames_file) is get_place_index(geonames_file)
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "2873891\tMannheim\n",
+        "\n".join("\t".join(str(value) for value in row) for row in GEONAMES[:2]) + "\n1\t2\t3\n",
+        "\t".join(str(value) for value in GEONAMES[2]).encode("latin-1"),
+        "",
+    ],
+    ids=["too_few_columns", "ragged", "not_utf_8", "empty"],
+)
+def test_get_place_index__malformed_file(content, tmp_path, monkeypatch):
+    path = tmp_path / "geonames.txt"
+    if isinstance(content, bytes):
+        path.write_bytes(content)
+    else:
+        path.write_text(content, encoding="utf-8")
+    read = []
+    monkeypatch.setattr(places, "read_geonames_file", lambda path: read.append(path) or read_geonames_file(path))
+    assert get_place_index(str(path)) is None
+    # the file is not read again until it changes
+    assert get_place_index(str(path)) is None
+    assert len(read) == 1
+
+    # the location is looked up with Nominatim instead
+    monkeypatch.setattr(django_settings, "GEONAMES_FILE", str(path))
+    monkeypatch.setattr(geo, "_get_location_name_from_nominatim", lambda coordinate, min_delay: "Heidelberg")
+    assert geo.get_location_name((49.40768, 8.69079), use_nominatim=True) == "Heidelberg"
+
+
+def test_get_location_name__offline(geonames_file, tmp_path, monkeypatch):
+    monkeypatch.setattr(django_settings, "GEONAMES_FILE", geonames_file)
+    monkeypatch.setattr(cfg, "use_nominatim", False)
+    assert geo.get_location_name((49.47950, 8.47102)) == "Mannheim"
+    assert geo.get_location_name((48.1234, 8.9123)) is None
+
+    # without any GeoNames file
+    monkeypatch.setattr(django_settings, "GEONAMES_FILE", str(tmp_path / "missing.txt"))
+    assert geo.get_location_name((49.47950, 8.47102)) is None
@@ -0,0 +1,147 @@
+import shutil
+import time
+from pathlib import Path
+
+import pytest
+
+from wkz.io.file_watcher import InotifyWatcher, PollingWatcher, TraceDirWatcher
+
+
+def _copy_activity(demo_data_dir, target: Path) -> Path:
+    shutil.copy(Path(demo_data_dir) / "cycling_bad_schandau.fit", target)
+    return target
+
+
+def test_inotify_watcher(tmp_path, demo_data_dir):
+    try:
+        watcher = InotifyWatcher(tmp_path)
+    except OSError:
+        pytest.skip("inotify is not available on this system")
+
+    # no events
+    assert watcher.read_events(timeout=0.1) == set()
+
+    # writing an activity file is detected, other files are ignored
+    fit = _copy_activity(demo_data_dir, tmp_path / "a.fit")
+    (tmp_path / "notes.txt").write_text("not an activity")
+    assert watcher.read_events(timeout=1) == {fit}
+
+    # files in newly created sub dirs are detected as well
+    sub_dir = tmp_path / "sub_dir"
+    sub_dir.mkdir()
+    assert watcher.read_events(timeout=1) == set()
+    nested_fit = _copy_activity(demo_data_dir, sub_dir / "b.fit")
+    assert watcher.read_events(timeout=1) == {nested_fit}
+
+    # moving a file into the watched dir is detected
+    outside = tmp_path.parent / f"{tmp_path.name}_outside.fit"
+    _copy_activity(demo_data_dir, outside)
+    moved = tmp_path / "moved.fit"
+    outside.rename(moved)
+    assert watcher.read_events(timeout=1) == {moved}
+    watcher.close()
+
+
+def test_polling_watcher(tmp_path, demo_data_dir):
+    existing = _copy_activity(demo_data_dir, tmp_path / "existing.fit")
+    watcher = PollingWatcher(tmp_path, poll_interval=0)
+
+    # files present at start are not reported
+    assert watcher.read_events(timeout=0) == set()
+
+    fit = _copy_activity(demo_data_dir, tmp_path / "a.fit")
+    (tmp_path / "notes.txt").write_text("not an activity")
+    assert watcher.read_events(timeout=0) == {fit}
+    assert watcher.read_events(timeout=0) == set()
+
+    # changed files are reported again
+    with open(existing, "ab") as f:
+        f.write(b"\0")
+    assert watcher.read_events(timeout=0) == {existing}
+
+
+def test_trace_dir_watcher__debounces_events(tmp_path, demo_data_dir):
+    imported = []
+    watcher = TraceDirWatcher(get_path=lambda: str(tmp_path), on_change=imported.append, debounce=0.5, idle_timeout=0.1)
+    watcher.start()
+    try:
+        time.sleep(0.3)
+        fit = _copy_activity(demo_data_dir, tmp_path / "a.fit")
+        gpx = tmp_path / "b.gpx"
+        shutil.copy(Path(demo_data_dir) / "cycling_walchensee.gpx", gpx)
+
+        # both files are passed on in a single batch once the debounce time passed
+        for _ in range(50):
+            if imported:
+                break
+            time.sleep(0.1)
+        assert imported == [[str(fit), str(gpx)]]
+    finally:
+        watcher.stop()
+        watcher.join(timeout=2)
+    assert not watcher.is_alive()
+
+
+def test_inotify_watcher__vanished_sub_dir(tmp_path, demo_data_dir, monkeypatch):
+    try:
+        watcher = InotifyWatcher(tmp_path)
+    except OSError:
+        pytest.skip("inotify is not available on this system")
+    add_watch = watcher._add_watch
+
+    def _add_watch(path):
+        if path.name == "gone":
+            raise OSError(2, f"failed to watch {path}")
+        return add_watch(path)
+
+    monkeypatch.setattr(watcher, "_add_watch", _add_watch)
+    (tmp_path / "gone").mkdir()
+    kept = tmp_path / "kept"
+    kept.mkdir()
+    fit = _copy_activity(demo_data_dir, tmp_path / "a.fit")
+
+    # the remaining events are processed nevertheless
+    assert watcher.read_events(timeout=1) == {fit}
+    nested_fit = _copy_activity(demo_data_dir, kept / "b.fit")
+    assert watcher.read_events(timeout=1) == {nested_fit}
+    watcher.close()
+
+
+def test_inotify_watcher__watched_dir_deleted(tmp_path):
+    watched = tmp_path / "traces"
+    watched.mkdir()
+    try:
+        watcher = InotifyWatcher(watched)
+    except OSError:
+        pytest.skip("inotify is not available on this system")
+
+    assert not watcher.lost
+    watched.rmdir()
+    assert watcher.read_events(timeout=1) == set()
+    assert watcher.lost
+    watcher.close()
+
+
+def test_trace_dir_watcher__watched_dir_recreated(tmp_path, demo_data_dir):
+    watched = tmp_path / "traces"
+    watched.mkdir()
+    imported = []
+    watcher = TraceDirWatcher(get_path=lambda: str(watched), on_change=imported.append, debounce=0.2, idle_timeout=0.1)
+    watcher.start()
+    try:
+        time.sleep(0.3)
+        shutil.rmtree(watched)
+        time.sleep(0.3)
+        watched.mkdir()
+        fit = _copy_activity(demo_data_dir, watched / "a.fit")
+
+        # the recreated dir is watched again
+        for _ in range(50):
+            if imported:
+                break
+            time.sleep(0.1)
+        assert imported == [[str(fit)]]
+    finally:
+        watcher.stop()
+        watcher.join(timeout=2)
+    assert not watcher.is_alive()
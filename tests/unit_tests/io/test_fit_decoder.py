@@ -0,0 +1,75 @@
+import io
+import os
+import struct
+
+import pytest
+from fitparse import FitFile
+
+from wkz.io.fit_decoder import FitDecodeError, iter_messages
+from wkz.io.fit_parser import FIELD_NAMES
+
+fit_files = (
+    "example.fit",
+    "with_nones.fit",
+    "swim_no_coordinates.fit",
+    "run_with_coordinates.fit",
+)
+
+
+@pytest.mark.parametrize("file_name", fit_files)
+def test_iter_messages__values_equal_fitparse_values(test_data_dir, file_name):
+    with open(os.path.join(test_data_dir, file_name), "rb") as f:
+        data = f.read()
+
+    expected = [
+        (message.name, {key: value for key, value in message.get_values().items() if key in FIELD_NAMES})
+        for message in FitFile(data).get_messages()
+    ]
+    assert list(iter_messages(data, FIELD_NAMES)) == expected
+
+
+class ReadSizes(io.BytesIO):
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.sizes = []
+
+    def read(self, size=-1):
+        self.sizes.append(size)
+        return super().read(size)
+
+
+def test_iter_messages__reads_stream_in_chunks(test_data_dir):
+    with open(os.path.join(test_data_dir, "example.fit"), "rb") as f:
+        data = f.read()
+    stream = ReadSizes(data)
+
+    assert list(iter_messages(stream, FIELD_NAMES, chunk_size=256)) == list(iter_messages(data, FIELD_NAMES))
+    # the file is never read at once, only definition messages larger than a chunk are read in one go
+    assert 0 < max(stream.sizes) < len(data) // 10
+    assert len(stream.sizes) > len(data) // 256
+
+
+def test_iter_messages__only_decodes_requested_fields(test_data_dir):
+    with open(os.path.join(test_data_dir, "example.fit"), "rb") as f:
+        data = f.read()
+
+    messages = list(iter_messages(data, {"heart_rate"}))
+    records = [values for message_type, values in messages if message_type == "record"]
+    assert len(records) == 1202
+    assert all(set(values.keys()) <= {"heart_rate"} for _, values in messages)
+    assert 99 in [values.get("heart_rate") for values in records]
+
+
+def test_iter_messages__invalid_files(test_data_dir):
+    with pytest.raises(FitDecodeError):
+        list(iter_messages(b"no valid fit file content", FIELD_NAMES))
+
+    with open(os.path.join(test_data_dir, "example.fit"), "rb") as f:
+        data = f.read()
+    # truncated file
+    with pytest.raises(FitDecodeError):
+        list(iter_messages(data[: len(data) // 2], FIELD_NAMES))
+    # data message referring to an undefined local message type
+    header = struct.pack("<BBHI4s", 12, 0x10, 2100, 1, b".FIT")
+    with pytest.raises(FitDecodeError):
+        list(iter_messages(header + b"\x0f" + b"\x00\x00", FIELD_NAMES))
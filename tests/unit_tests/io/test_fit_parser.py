@@ -6,7 +6,10 @@ import pytz
 from django.conf import settings
 from fitparse.utils import FitHeaderError
 
+from wkz import configuration
 from wkz.best_sections.generic import GenericBestSection
+from wkz.io import fit_parser as fit_parser_module
+from wkz.io.fit_decoder import FitDecodeError
 from wkz.io.fit_parser import FITParser, LapData
 
 tz = pytz.timezone(settings.TIME_ZONE)
@@ -199,3 +202,49 @@ def test_faulty_fit_file(tmp_path, fit_parser):
     # now run fit_parser on faulty file and verify that FitHeaderError is raised
     with pytest.raises(FitHeaderError):
         fit_parser(fit)
+
+
+def _assert_parsers_equal(parser, expected):
+    pd.testing.assert_frame_equal(parser.dataframe, expected.dataframe)
+    for attribute, value in vars(expected).items():
+        if attribute == "dataframe":
+            continue
+        if isinstance(value, list) and attribute != "laps":
+            pd.testing.assert_series_equal(pd.Series(getattr(parser, attribute)), pd.Series(value), check_dtype=False)
+        else:
+            assert getattr(parser, attribute) == value, attribute
+
+
+@pytest.mark.parametrize("file_name", ("example.fit", "with_nones.fit", "swim_no_coordinates.fit"))
+def test_fast_fit_decoding_equals_fitparse(fit_parser, monkeypatch, file_name):
+    monkeypatch.setattr(configuration, "fast_fit_decoding", False)
+    expected = fit_parser(file_name)
+    monkeypatch.setattr(configuration, "fast_fit_decoding", True)
+    _assert_parsers_equal(fit_parser(file_name), expected)
+
+
+def test_fast_fit_decoding__falls_back_to_fitparse(fit_parser, monkeypatch, caplog):
+    expected = fit_parser()
+
+    def failing_decoder(data, names):
+        yield "record", {"heart_rate": 80}
+        yield "sport", {"sport": "cycling"}
+        raise FitDecodeError("unsupported content")
+
+    monkeypatch.setattr(fit_parser_module, "iter_messages", failing_decoder)
+    p = fit_parser()
+
+    assert "falling back to fitparse" in caplog.text
+    assert p.file is None
+    # values parsed before the fast decoder failed are discarded
+    _assert_parsers_equal(p, expected)
+
+
+def test_fast_fit_decoding__does_not_use_fitparse(fit_parser, monkeypatch):
+    expected = fit_parser()
+
+    def fit_file(*args, **kwargs):
+        raise AssertionError("fitparse is not required")
+
+    monkeypatch.setattr(fit_parser_module, "FitFile", fit_file)
+    _assert_parsers_equal(fit_parser(), expected)
@@ -40,6 +40,14 @@ def test__parse_coordinates(gpx_parser):
     assert parser.altitude_list[0] == 128.94
 
 
+def test_distance_list(gpx_parser):
+    parser = gpx_parser()
+    assert len(parser.distance_list) == len(parser.latitude_list)
+    assert parser.distance_list[0] == 0.0
+    assert parser.distance_list == sorted(parser.distance_list)
+    assert round(parser.distance_list[-1] / 1000, 2) == parser.distance == 4.29
+
+
 def test_parse_timestamps(gpx_parser):
     parser = gpx_parser()
     assert 1562951136.0 in parser.timestamps_list
@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+from wkz.io.import_profile import STAGES, ImportProfile
+
+
+def test_import_profile__stages():
+    profile = ImportProfile()
+    with profile.stage("persist"):
+        time.sleep(0.02)
+        with profile.stage("name"):
+            time.sleep(0.05)
+    with pytest.raises(ValueError):
+        with profile.stage("persist"):
+            raise ValueError
+    profile.add("hash", items=3)
+    profile.finish()
+
+    assert list(profile.stages) == STAGES
+    assert profile.stages["name"].items == 1
+    assert profile.stages["name"].wall_time >= 0.05
+    # time of nested stages is not part of the enclosing stage
+    assert 0.02 <= profile.stages["persist"].wall_time < 0.05
+    assert profile.stages["persist"].items == 2
+    assert profile.stages["persist"].failures == 1
+    assert profile.stages["hash"].items == 3
+    assert profile.duration >= 0.07
+
+
+def test_import_profile__merge():
+    profile = ImportProfile()
+    worker_profile = ImportProfile()
+    with worker_profile.stage("parse"):
+        pass
+    worker_profile.add("sections", wall_time=1.5, cpu_time=1.0, items=1)
+
+    profile.merge(worker_profile)
+    profile.merge(worker_profile)
+
+    assert profile.stages["parse"].items == 2
+    assert profile.stages["sections"].items == 2
+    assert profile.stages["sections"].wall_time == 3.0
+    assert profile.stages["sections"].cpu_time == 2.0
+
+
+def test_import_profile__str():
+    profile = ImportProfile()
+    profile.add("parse", wall_time=1.234, cpu_time=1.0, items=5, failures=1)
+
+    lines = str(profile).splitlines()
+    assert lines[0].split() == ["stage", "wall", "[s]", "cpu", "[s]", "items", "failures"]
+    assert lines[3].split() == ["parse", "1.23", "1.00", "5", "1"]
+    assert len(lines) == len(STAGES) + 1
+
+    profile.finish()
+    assert str(profile).splitlines()[-1].split()[0] == "total"
@@ -1,28 +1,45 @@
 import datetime
+import gzip
+import multiprocessing
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import numpy as np
 import pytest
 
+from wkz import configuration
 from wkz.io.file_importer import (
     _all_files_in_db_already,
     _check_and_parse_file,
-    _convert_list_attributes_to_json,
+    _encode_list_attributes,
     _get_all_files,
+    _init_parse_worker,
+    _parse_data,
+    _parse_files,
     _parse_single_file,
+    _should_be_written_to_db,
 )
 from wkz.io.parser import Parser
+from wkz.tools import sse
+from wkz.tools.series import decode_series
 from wkz.tools.utils import calc_md5
 
 
-def test_convert_list_attributes_to_json(fit_parser):
+def test_encode_list_attributes(fit_parser):
     parser = fit_parser()
     assert type(parser.timestamps_list) == list
     assert type(parser.latitude_list) == list
     assert type(parser.longitude_list) == list
-    parser = _convert_list_attributes_to_json(parser)
-    assert type(parser.timestamps_list) == str
-    assert type(parser.latitude_list) == str
-    assert type(parser.longitude_list) == str
+    series = _encode_list_attributes(parser)
+    assert set(series.keys()) == configuration.time_series_attributes
+    assert type(series["timestamps_list"]) == bytes
+    assert type(series["latitude_list"]) == bytes
+    assert type(series["longitude_list"]) == bytes
+    # parser attributes are left untouched
+    assert type(parser.latitude_list) == list
+    np.testing.assert_array_equal(decode_series(series["timestamps_list"]), parser.timestamps_list)
 
 
 def test_get_all_files(tmpdir):
@@ -50,21 +67,24 @@ def test__parse_single_file(demo_data_dir, fit_file):
 
 def test__all_files_in_db_already(demo_data_dir):
     all_files = list(Path(demo_data_dir).iterdir())
-    assert _all_files_in_db_already(all_files, []) is False
 
     # get all md5sums of existing files
-    md5sums_from_db = []
+    md5sums_from_files = []
     for trace in all_files:
-        md5sums_from_db.append(calc_md5(trace))
+        md5sums_from_files.append(calc_md5(trace))
+
+    assert _all_files_in_db_already(md5sums_from_files, {}) is False
 
-    assert _all_files_in_db_already(all_files, md5sums_from_db) is True
+    md5sums_from_db = {md5sum: "some/path.fit" for md5sum in md5sums_from_files}
+    assert _all_files_in_db_already(md5sums_from_files, md5sums_from_db) is True
 
     # remove only one md5sum and verify that result is False
-    fewer_md5sums = md5sums_from_db[:-1]
-    assert _all_files_in_db_already(all_files, fewer_md5sums) is False
+    fewer_md5sums = dict(md5sums_from_db)
+    fewer_md5sums.pop(md5sums_from_files[-1])
+    assert _all_files_in_db_already(md5sums_from_files, fewer_md5sums) is False
 
     # remove one file (thus db all md5sums of existing files plus one) and verify result is True
-    fewer_files = all_files[:-1]
+    fewer_files = md5sums_from_files[:-1]
     assert _all_files_in_db_already(fewer_files, md5sums_from_db) is True
 
 
@@ -73,7 +93,7 @@ def test__check_and_parse_file(demo_data_dir, reimporting):
     trace = Path(demo_data_dir) / "2019-09-18-16-02-35.fit"
 
     # file md5sum is not in db
-    md5sums_from_db = []
+    md5sums_from_db = {}
     md5sum, path_to_file, parsed_file = _check_and_parse_file(trace, demo_data_dir, md5sums_from_db, reimporting)
     assert isinstance(md5sum, str)
     assert isinstance(path_to_file, Path)
@@ -81,8 +101,95 @@ def test__check_and_parse_file(demo_data_dir, reimporting):
 
     if not reimporting:
         # file md5sum is in db
-        md5sums_from_db = [calc_md5(trace)]
+        md5sums_from_db = {calc_md5(trace): str(trace)}
         md5sum, path_to_file, parsed_file = _check_and_parse_file(trace, demo_data_dir, md5sums_from_db, reimporting)
         assert isinstance(md5sum, str)
         assert isinstance(path_to_file, Path)
         assert parsed_file is None
+
+
+@pytest.mark.parametrize("workers", (1, 2))
+def test__parse_files(demo_data_dir, workers):
+    trace_files = sorted(Path(demo_data_dir).glob("*.fit"))[:3]
+    md5sums_of_files = {trace: calc_md5(trace) for trace in trace_files}
+    md5sums_from_db = {calc_md5(trace_files[1]): str(trace_files[1])}
+
+    results = list(_parse_files(md5sums_of_files, demo_data_dir, md5sums_from_db, reimporting=False, workers=workers))
+
+    # results are yielded in the order of the given files
+    assert [path_to_file for _, path_to_file, _ in results] == trace_files
+    assert [md5sum for md5sum, _, _ in results] == [calc_md5(trace) for trace in trace_files]
+    # file with md5sum already being in db is not parsed
+    assert isinstance(results[0][2], Parser)
+    assert results[1][2] is None
+    assert isinstance(results[2][2], Parser)
+
+
+@pytest.mark.parametrize("workers", (1, 2))
+def test__parse_files__failure_is_reported_by_calling_process(demo_data_dir, tmp_path, monkeypatch, workers):
+    messages = []
+    monkeypatch.setattr(sse, "send", lambda text, *args, **kwargs: messages.append(text))
+    trace = Path(demo_data_dir) / "2019-09-18-16-02-35.fit"
+    faulty = tmp_path / "faulty.fit"
+    faulty.write_text("no valid fit file content")
+    md5sums_of_files = {faulty: calc_md5(faulty), trace: calc_md5(trace)}
+
+    results = list(_parse_files(md5sums_of_files, tmp_path.parent, {}, reimporting=False, workers=workers))
+
+    assert results[0][2] is None
+    assert isinstance(results[1][2], Parser)
+    # the failure is sent from this process, messages sent from worker processes would get lost
+    assert len(messages) == 1
+    assert f"<code>{tmp_path.name}/faulty.fit</code>" in messages[0]
+
+
+def _has_dispatcher() -> bool:
+    return getattr(sse._local, "dispatcher", None) is not None
+
+
+def test__init_parse_worker__discards_inherited_dispatcher():
+    context = multiprocessing.get_context("fork")
+    with sse.dispatching():
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            assert executor.submit(_has_dispatcher).result() is True
+        with ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=_init_parse_worker) as executor:
+            assert executor.submit(_has_dispatcher).result() is False
+
+
+def test__should_be_written_to_db(demo_data_dir, caplog):
+    trace = Path(demo_data_dir) / "2019-09-18-16-02-35.fit"
+    parsed_file = _parse_single_file(trace, demo_data_dir, md5sum=calc_md5(trace))
+
+    assert _should_be_written_to_db(parsed_file, {}, reimporting=False) is True
+    assert _should_be_written_to_db(parsed_file, {"other md5sum": "other.fit"}, reimporting=False) is True
+
+    md5sums_from_db = {parsed_file.md5sum: "path/to/existing.fit"}
+    assert _should_be_written_to_db(parsed_file, md5sums_from_db, reimporting=True) is True
+    assert _should_be_written_to_db(parsed_file, md5sums_from_db, reimporting=False) is False
+    # the path of the existing file is taken from the index
+    assert "path/to/existing.fit" in caplog.text
+
+
+@pytest.mark.parametrize("file_name", ("example.fit", "example.gpx"))
+def test__parse_data__compressed_file(test_data_dir, tmp_path, monkeypatch, file_name):
+    compressed_file = tmp_path / f"{file_name}.gz"
+    with open(Path(test_data_dir) / file_name, "rb") as source, gzip.open(compressed_file, "wb") as target:
+        shutil.copyfileobj(source, target)
+
+    # compressed files are decompressed on the fly, without writing them to a temporary file
+    def no_temp_file(*args, **kwargs):
+        raise AssertionError("no temporary file should be created")
+
+    monkeypatch.setattr(tempfile, "NamedTemporaryFile", no_temp_file)
+    monkeypatch.setattr(tempfile, "mkstemp", no_temp_file)
+
+    parser = _parse_data(compressed_file, "foo")
+    uncompressed_parser = _parse_data(Path(test_data_dir) / file_name, "foo")
+
+    assert parser.path_to_file == str(compressed_file)
+    assert parser.file_name == f"{file_name}.gz"
+    assert parser.stream is None
+    assert parser.date == uncompressed_parser.date
+    assert parser.distance == uncompressed_parser.distance
+    np.testing.assert_array_equal(parser.timestamps_list, uncompressed_parser.timestamps_list)
+    np.testing.assert_array_equal(parser.latitude_list, uncompressed_parser.latitude_list)
@@ -0,0 +1,52 @@
+import json
+
+import numpy as np
+import pytest
+
+from wkz.tools.series import HEADER, InvalidSeriesError, decode_series, encode_series, series_to_list
+
+
+@pytest.mark.parametrize("delta", (True, False))
+@pytest.mark.parametrize("compress", (True, False))
+@pytest.mark.parametrize(
+    "values",
+    (
+        [1.5, 2.25, None, 3.0],  # floats with missing value
+        [120, 121, 125, 119, None, None, 130],  # integers with missing values
+        [1568467325.0, 1568467326.0, 1568467330.0],  # timestamps
+        [49.40601873211563, 49.40602, 49.406035],  # coordinates
+        [-300, 40_000, 2**40],  # integers requiring wider types
+        [None, None],
+        [0],
+    ),
+)
+def test_encode_and_decode_series(values, delta, compress):
+    decoded = decode_series(encode_series(values, delta=delta, compress=compress))
+    assert isinstance(decoded, np.ndarray)
+    assert decoded.dtype == np.float64
+    expected = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    np.testing.assert_array_equal(decoded, expected)
+    assert series_to_list(decoded) == values
+
+
+def test_encode_series__empty():
+    assert encode_series([]) == b""
+    decoded = decode_series(b"")
+    assert decoded.size == 0
+    assert decode_series(None).size == 0
+
+
+def test_encode_series__is_compact(fit_parser):
+    parser = fit_parser()
+    for values in [parser.heart_rate_list, parser.timestamps_list, parser.latitude_list]:
+        assert len(encode_series(values)) < len(json.dumps(values))
+    # integral series are stored using the smallest integer type, i.e. a single byte per (delta encoded) value
+    heart_rate = encode_series(parser.heart_rate_list, compress=False)
+    assert len(heart_rate) <= HEADER.size + len(parser.heart_rate_list) + len(parser.heart_rate_list) // 8 + 1
+
+
+def test_decode_series__invalid_data():
+    with pytest.raises(InvalidSeriesError):
+        decode_series(b"[1, 2, 3]")
+    with pytest.raises(InvalidSeriesError):
+        decode_series(b"no valid time series data")
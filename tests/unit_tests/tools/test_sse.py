@@ -0,0 +1,134 @@
+import pytest
+
+from wkz.tools import sse
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def events(monkeypatch):
+    events = []
+    monkeypatch.setattr(sse, "send_event", lambda channel, event_type, data: events.append((event_type, data)))
+    return events
+
+
+def test_clean_html():
+    assert (
+        sse.clean_html("<b>Progress Update:</b> Imported <code>5</code> files.") == "Progress Update: Imported 5 files."
+    )
+
+
+def test_send__without_dispatcher(events):
+    sse.send("foo", "green")
+    sse.send("foo", "green")
+
+    assert events == [("message", {"text": "foo", "color": "green"})] * 2
+
+
+def test_dispatcher__batches_messages(events):
+    clock = FakeClock()
+    dispatcher = sse.Dispatcher(interval=2, progress_interval=5, clock=clock)
+
+    # the first message is sent right away
+    dispatcher.add("a", "green")
+    assert events == [("message", {"text": "a", "color": "green"})]
+
+    dispatcher.add("b", "green")
+    dispatcher.add("c", "red")
+    clock.now = 1
+    dispatcher.add("d", "green")
+    assert len(events) == 1
+
+    clock.now = 2
+    dispatcher.add("e", "green")
+    assert events[1:] == [
+        ("message", {"text": "b<br>d<br>e", "color": "green"}),
+        ("message", {"text": "c", "color": "red"}),
+    ]
+
+    dispatcher.add("f", "green")
+    dispatcher.flush()
+    assert events[-1] == ("message", {"text": "f", "color": "green"})
+    # nothing left to send
+    dispatcher.flush()
+    assert len(events) == 4
+
+
+def test_dispatcher__collapses_repeated_messages(events, monkeypatch):
+    monkeypatch.setattr(sse.cfg, "sse_max_messages_per_event", 3)
+    clock = FakeClock()
+    dispatcher = sse.Dispatcher(interval=2, progress_interval=5, clock=clock)
+    dispatcher.add("import started", "yellow")
+
+    for i in range(10):
+        dispatcher.add(f"duplicate file {i}", "yellow", key="duplicate_files")
+        dispatcher.add("same text", "yellow")
+    for i in range(3):
+        dispatcher.add(f"other {i}", "yellow")
+    dispatcher.flush()
+
+    assert events[1:] == [
+        (
+            "message",
+            {
+                "text": "duplicate file 0<br>... and 9 more like this.<br>same text<br>... and 9 more like this.<br>"
+                "other 0<br>... and 2 more messages.",
+                "color": "yellow",
+            },
+        )
+    ]
+
+
+def test_dispatcher__progress(events):
+    clock = FakeClock()
+    dispatcher = sse.Dispatcher(interval=2, progress_interval=5, clock=clock)
+
+    clock.now = 1
+    dispatcher.progress("Imported", done=10, total=100)
+    clock.now = 4
+    dispatcher.progress("Imported", done=40, total=100)
+    clock.now = 6
+    dispatcher.add("some warning", "yellow")
+    dispatcher.progress("Imported", done=60, total=100)
+    clock.now = 7
+    dispatcher.progress("Imported", done=100, total=100)
+
+    assert events == [
+        ("progress", {"text": "Imported", "done": 10, "total": 100, "rate": 10.0, "eta": 9}),
+        ("message", {"text": "some warning", "color": "yellow"}),
+        ("progress", {"text": "Imported", "done": 60, "total": 100, "rate": 10.0, "eta": 4}),
+        # the final progress is always sent
+        ("progress", {"text": "Imported", "done": 100, "total": 100, "rate": 14.29, "eta": 0}),
+    ]
+
+
+def test_dispatching(events):
+    with sse.dispatching(interval=60) as dispatcher:
+        sse.send("a", "green")
+        sse.send("b", "green")
+        with sse.dispatching() as nested:
+            assert nested is dispatcher
+            sse.send("c", "green")
+        assert len(events) == 1
+        sse.progress("Imported", done=1, total=2)
+        sse.send("d", "green")
+
+    assert events == [
+        ("message", {"text": "a", "color": "green"}),
+        ("message", {"text": "b<br>c", "color": "green"}),
+        (
+            "progress",
+            {"text": "Imported", "done": 1, "total": 2, "rate": events[2][1]["rate"], "eta": events[2][1]["eta"]},
+        ),
+        ("message", {"text": "d", "color": "green"}),
+    ]
+
+    # messages are sent right away again once the context is left
+    sse.send("e", "green")
+    assert events[-1] == ("message", {"text": "e", "color": "green"})
@@ -3,6 +3,7 @@ from typing import Callable, List
 from sportgems import find_best_climb_section
 
 from wkz.best_sections.generic import GenericBestSection
+from wkz.best_sections.search import SectionSearch
 
 
 def get_best_climb_section(distance: int, parser) -> GenericBestSection:
@@ -29,9 +30,26 @@ def get_best_climb_section(distance: int, parser) -> GenericBestSection:
     )
 
 
+def search_best_climb_section(distance: int, search: SectionSearch) -> GenericBestSection:
+    # same as get_best_climb_section, but reusing the data shared by all distances
+    section = search.get_best_climb_section(distance)
+    if section is None:
+        return None
+
+    start, end, climb = section
+    return GenericBestSection(
+        start=start,
+        end=end,
+        distance=distance,
+        max_value=round(climb, 2),
+        kind="climb",
+    )
+
+
 class BestClimbSections:
     kind: str = "climb"
     parser: Callable = get_best_climb_section
+    search: Callable = search_best_climb_section
     distances: List[int] = [  # in meter
         100,
         200,
@@ -3,6 +3,7 @@ from typing import Callable, List
 from sportgems import find_fastest_section
 
 from wkz.best_sections.generic import GenericBestSection
+from wkz.best_sections.search import SectionSearch
 
 
 def get_fastest_section(distance: int, parser) -> GenericBestSection:
@@ -24,9 +25,26 @@ def get_fastest_section(distance: int, parser) -> GenericBestSection:
     )
 
 
+def search_fastest_section(distance: int, search: SectionSearch) -> GenericBestSection:
+    # same as get_fastest_section, but reusing the data shared by all distances
+    section = search.get_fastest_section(distance)
+    if section is None:
+        return None
+
+    start, end, velocity = section
+    return GenericBestSection(
+        start=start,
+        end=end,
+        distance=distance,
+        max_value=round(velocity, 2),
+        kind="fastest",
+    )
+
+
 class FastestSections:
     kind: str = "fastest"
     parser: Callable = get_fastest_section
+    search: Callable = search_fastest_section
     distances: List[int] = [  # in meter
         1_000,
         2_000,
@@ -0,0 +1,202 @@
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# earth radius in meter and default distance tolerance as used by sportgems
+EARTH_RADIUS = 6_378_100.0
+TOLERANCE = 0.01
+
+# relative margin used to preselect the candidates of the best climb section, which are then evaluated exactly
+CLIMB_CANDIDATE_MARGIN = 1e-6
+
+
+def _map(func, values: np.ndarray) -> np.ndarray:
+    # apply a function of the math module element wise, numpy's implementation of e.g. arccos may differ from the
+    # one of libm (used by sportgems) in the last bit, which could change the sections found
+    return np.fromiter(map(func, values.tolist()), dtype=np.float64, count=len(values))
+
+
+def get_section_distances(latitudes: List[float], longitudes: List[float]) -> np.ndarray:
+    """
+    Computes the cumulative distance in meters at each point of a trace, in the very same way sportgems does
+    when searching for best sections, i.e. using the spherical law of cosines. Points without coordinates
+    are skipped, the distance to the next point with coordinates is attributed to the latter.
+
+    Parameters
+    ----------
+    latitudes : List[float]
+        latitude values of the trace, might contain None or nan
+    longitudes : List[float]
+        longitude values of the trace, might contain None or nan
+
+    Returns
+    -------
+    np.ndarray
+        cumulative distance in meters at each point of the trace
+    """
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    steps = np.zeros(len(latitudes))
+    valid = np.flatnonzero(~(np.isnan(latitudes) | np.isnan(longitudes)))
+    if len(valid) > 1:
+        lat = latitudes[valid] / 180 * np.pi
+        lon = longitudes[valid] / 180 * np.pi
+        sin_lat = _map(math.sin, lat)
+        cos_lat = _map(math.cos, lat)
+        cos_delta_lon = _map(math.cos, lon[1:] - lon[:-1])
+        cos_angle = sin_lat[:-1] * sin_lat[1:] + cos_lat[:-1] * cos_lat[1:] * cos_delta_lon
+        distances = EARTH_RADIUS * _map(math.acos, np.clip(cos_angle, -1.0, 1.0))
+        # identical points are exactly zero meters apart, which the formula above does not compute precisely
+        identical = (latitudes[valid[1:]] == latitudes[valid[:-1]]) & (longitudes[valid[1:]] == longitudes[valid[:-1]])
+        distances[identical] = 0.0
+        steps[valid[1:]] = distances
+    return np.cumsum(steps)
+
+
+def get_altitude_gains(altitudes: List[float]) -> np.ndarray:
+    """
+    Computes the uphill meters at each point of a trace, compared to the previous point with an altitude value.
+    """
+    altitudes = np.asarray(altitudes, dtype=np.float64)
+    gains = np.zeros(len(altitudes))
+    valid = np.flatnonzero(~np.isnan(altitudes))
+    gains[valid[1:]] = np.maximum(altitudes[valid[1:]] - altitudes[valid[:-1]], 0.0)
+    return gains
+
+
+class SectionSearch:
+    """
+    Searches the best sections of an activity for several desired distances in one go. It finds the very same
+    sections as the per distance functions of sportgems (`find_fastest_section` and `find_best_climb_section`),
+    but all data which does not depend on the desired distance, like the cumulative distances along the trace,
+    is only computed once per activity. The sliding window of sportgems (two pointers running over the trace)
+    is evaluated in a vectorized way on the shared cumulative distances. The candidate sections of a distance
+    are shared between all section kinds.
+    """
+
+    def __init__(
+        self,
+        times: List[float],
+        latitudes: List[float],
+        longitudes: List[float],
+        altitudes: Optional[List[float]] = None,
+        tolerance: float = TOLERANCE,
+    ):
+        self.tolerance = tolerance
+        self.times = np.asarray(times, dtype=np.float64)
+        self.consistent = len(times) == len(latitudes) == len(longitudes)
+        self.distances = get_section_distances(latitudes, longitudes) if self.consistent else np.zeros(0)
+        self.altitudes = altitudes
+        self._gains = None
+        self._cumulative_gains = None
+        self._sections: Dict[int, Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]] = {}
+
+    @property
+    def gains(self) -> np.ndarray:
+        if self._gains is None:
+            self._gains = get_altitude_gains(self.altitudes)
+            self._cumulative_gains = np.cumsum(self._gains)
+        return self._gains
+
+    def get_sections(self, distance: int) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Returns start indices, end indices and distances of all candidate sections of the given desired distance,
+        in the order sportgems evaluates them. None is returned if the trace is too short for the desired distance.
+        """
+        if distance not in self._sections:
+            self._sections[distance] = self._get_sections(distance)
+        return self._sections[distance]
+
+    def _get_sections(self, distance: int) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        cumulative = self.distances
+        n = len(cumulative)
+        if n < 3 or cumulative[-1] < distance:
+            return None
+
+        # sportgems moves the end of the section forward while the section distance, which is computed as
+        # distance[end] - distance[start + 1], is below the desired distance, otherwise it moves the start. For each
+        # end get the smallest start + 1 for which the section distance is below the desired distance.
+        ends = np.arange(1, n - 1)
+        limit = np.searchsorted(cumulative, cumulative[ends] - distance, side="right")
+        limit = np.clip(limit, 1, ends)
+        # correct the search result for rounding, such that the exact same comparison as in sportgems is used
+        while True:
+            too_small = cumulative[ends] - cumulative[limit] >= distance
+            if not too_small.any():
+                break
+            limit[too_small] += 1
+        while True:
+            too_large = (limit > 1) & (cumulative[ends] - cumulative[np.maximum(limit - 1, 0)] < distance)
+            if not too_large.any():
+                break
+            limit[too_large] -= 1
+
+        # start positions when reaching and leaving each end
+        leave = np.maximum.accumulate(limit - 1)
+        reach = np.concatenate(([0], leave[:-1]))
+        counts = leave - reach + 1
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        # sportgems stops once the end reached the last point
+        starts = np.append(np.repeat(reach, counts) + offsets, leave[-1])
+        ends = np.append(np.repeat(ends, counts), n - 1)
+
+        section_distances = cumulative[ends] - cumulative[starts + 1]
+        within_tolerance = (section_distances >= distance * (1 - self.tolerance)) & (
+            section_distances <= distance * (1 + self.tolerance)
+        )
+        return starts[within_tolerance], ends[within_tolerance], section_distances[within_tolerance]
+
+    def get_fastest_section(self, distance: int) -> Optional[Tuple[int, int, float]]:
+        """
+        Returns start index, end index and velocity in m/s of the fastest section of the given distance.
+        """
+        sections = self.get_sections(distance)
+        if sections is None:
+            return None
+        starts, ends, section_distances = sections
+        with np.errstate(divide="ignore", invalid="ignore"):
+            velocities = section_distances / (self.times[ends] - self.times[starts])
+        velocities = np.where(velocities > 0, velocities, -np.inf)
+        if not len(velocities):
+            return None
+        best = int(np.argmax(velocities))
+        if velocities[best] == -np.inf:
+            return None
+        return int(starts[best]), int(ends[best]), float(velocities[best])
+
+    def get_best_climb_section(self, distance: int) -> Optional[Tuple[int, int, float]]:
+        """
+        Returns start index, end index and climb in m/min of the best climb section of the given distance.
+        """
+        if not self.altitudes or len(self.altitudes) != len(self.distances):
+            return None
+        sections = self.get_sections(distance)
+        if sections is None:
+            return None
+        starts, ends, _ = sections
+        if not len(starts):
+            return None
+        gains = self.gains
+        cumulative_gains = self._cumulative_gains
+        with np.errstate(divide="ignore", invalid="ignore"):
+            minutes = (self.times[ends] - self.times[starts]) / 60
+            climbs = (cumulative_gains[ends - 1] - cumulative_gains[starts]) / minutes
+        climbs = np.where(climbs > 0, climbs, -np.inf)
+        maximum = climbs.max()
+        if maximum == -np.inf:
+            return None
+
+        # sportgems sums up the gains of each section separately, which might differ from the difference of the
+        # cumulative gains in the last bits. Evaluate the sections close to the maximum the same way to get the
+        # very same section in case of (almost) equal climbs.
+        best = None
+        best_climb = 0.0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for index in np.flatnonzero(climbs >= maximum * (1 - CLIMB_CANDIDATE_MARGIN)):
+                start, end = starts[index], ends[index]
+                gain = np.cumsum(gains[start + 1 : end])[-1] if end - start > 1 else np.float64(0.0)
+                climb = gain / minutes[index]
+                if climb > best_climb:
+                    best, best_climb = (int(start), int(end), float(climb)), climb
+        return best
@@ -46,6 +46,10 @@ avg_attributes = {
     "temperature_list",
 }
 
+# decode fit files with the fast decoder, which only decodes the fields used by the fit parser. Files the fast decoder
+# cannot handle are parsed using fitparse
+fast_fit_decoding = True
+
 # configuration of best sections
 rank_limit = 3
 
@@ -57,8 +61,14 @@ climb_distances = BestClimbSections.distances
 # with respect to the table listing activities used both on dashboard and sport page
 number_of_rows_per_page_in_table = 40
 
-# how many activities should be included in one server sent event message when importing/reimporting
-num_activities_in_progress_update = 5
+# server sent events sent during e.g. imports are batched, this is the min number of seconds between two batches
+sse_interval = 2
+
+# min number of seconds between two server sent events reporting the progress of e.g. an import
+sse_progress_interval = 5
+
+# max number of different messages shown in one server sent event, further messages are only counted
+sse_max_messages_per_event = 5
 
 # time to wait for an huey task to finish in seconds
 huey_timeout = 30
@@ -66,8 +76,90 @@ huey_timeout = 30
 # reduce number of data points for activity view in order speed up page load
 every_nth_value = 5
 
+# number of rendered time series plots of activities kept in memory, such that repeated views of an activity do not
+# need to build the plots again
+time_series_plot_cache_size = 32
+
+# seconds the metrics of tiles are cached, activities changed in another process (e.g. by the file importer) show up
+# after this time at the latest
+tile_metrics_cache_timeout = 60
+
+# tolerances in meters of the simplified polylines stored for each activity, used by maps showing many activities
+polyline_tolerances = [2, 10, 50]
+
+# maximum number of points of all traces rendered on a map showing many activities, the most detailed polylines not
+# exceeding this limit are used
+max_number_of_map_points = 100_000
+
+# number of decimals of the coordinates of traces sent to the browser as encoded polylines, 5 is roughly one meter
+polyline_precision = 5
+
+# the map of the sport page shows a heatmap of all activities instead of individual traces, in case all activities are
+# selected and there are more than this number of activities with coordinates
+max_number_of_map_traces = 500
+
+# number of traces passing a pixel of the heatmap for it to be colored with maximum intensity
+heatmap_saturation = 20
+
+# width in pixels of the lines of the heatmap
+heatmap_line_width = 2
+
 # interval in minutes for periodic file import import
 file_importer_interval = 1
 
+# number of worker processes used to parse activity files during periodic file import, 1 means sequential parsing
+file_importer_workers = 1
+
+# number of files each worker may have parsed ahead of the (sequential) database writer
+parse_queue_size_per_worker = 4
+
+# watch the trace dir for new activity files (using inotify or polling as fallback) instead of periodically
+# checking all files in the trace dir
+watch_trace_dir = True
+
+# seconds without further events for a file before it gets imported, to not import files which are still being copied
+file_watcher_debounce = 2
+
+# max seconds the file watcher waits for events before checking whether the path to the trace dir changed
+file_watcher_idle_timeout = 30
+
+# interval in seconds for scanning the trace dir in case inotify is not available
+file_watcher_poll_interval = 60
+
 # interval in minutes for periodic file collector
 file_collector_interval = file_importer_interval
+
+# maximum distance in meters of the start of an activity to the nearest place of the GeoNames file to name the activity
+# after the place, see GEONAMES_FILE
+max_distance_to_place = 10_000
+
+# query Nominatim (OpenStreetMap) to name activities after the place they started, in case there is no GeoNames file or
+# no place nearby, disable on machines without internet access
+use_nominatim = True
+
+# size in degrees of the cells start coordinates are quantized to for caching their location names, 0.01 degrees are
+# roughly 1km
+geocode_cache_cell_size = 0.01
+
+# number of days location names are cached, before they are looked up again
+geocode_cache_ttl_days = 180
+
+# maximum number of cached location names, the least recently used ones are evicted first
+geocode_cache_max_entries = 10_000
+
+# minimum seconds between two requests to Nominatim, which allows at most one request per second. Lookups in the
+# GeoNames file are not delayed, note that the huey task naming activities in the background sleeps in between
+geocoding_min_delay = 1.0
+
+# number of activities whose names get the location added at once, after the activities were imported
+geocoding_batch_size = 50
+
+# seconds until the location of an activity is looked up again after the lookup failed (e.g. Nominatim being
+# unreachable), doubled with every further failure
+geocoding_retry_delay = 300
+
+# number of failed lookups after which an activity keeps its provisional name
+geocoding_max_attempts = 6
+
+# number of runs of the file importer kept in the history shown on the settings page
+import_runs_to_keep = 20
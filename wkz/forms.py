@@ -40,7 +40,17 @@ class AddActivityForm(forms.ModelForm):
 
     class Meta:
         model = Activity
-        exclude = ("trace_file", "created", "modified", "is_demo_activity", "evaluates_for_awards", "user")
+        exclude = (
+            "trace_file",
+            "created",
+            "modified",
+            "is_demo_activity",
+            "evaluates_for_awards",
+            "location_pending",
+            "location_attempts",
+            "location_retry",
+            "user",
+        )
 
     def __init__(self, *args, **kwargs):
         self.user = kwargs.pop('user', None)
@@ -70,7 +80,16 @@ class EditActivityForm(forms.ModelForm):
 
     class Meta:
         model = Activity
-        exclude = ("trace_file", "created", "modified", "is_demo_activity", "user")
+        exclude = (
+            "trace_file",
+            "created",
+            "modified",
+            "is_demo_activity",
+            "location_pending",
+            "location_attempts",
+            "location_retry",
+            "user",
+        )
 
     def __init__(self, *args, **kwargs):
         self.user = kwargs.pop('user', None)
@@ -83,6 +102,15 @@ class EditActivityForm(forms.ModelForm):
             self.fields["sport"] = forms.ModelChoiceField(queryset=Sport.objects.all().exclude(name="unknown"))
         set_field_attributes(self.visible_fields())
 
+    def save(self, commit=True):
+        activity = super().save(commit=False)
+        # do not add the location to a name chosen by the user
+        if "name" in self.changed_data:
+            activity.location_pending = False
+        if commit:
+            activity.save()
+        return activity
+
 
 class EditSettingsForm(forms.ModelForm):
     class Meta:
@@ -1,22 +1,32 @@
 import logging
+import time
 from dataclasses import dataclass
-from typing import List, Tuple
+from functools import lru_cache
+from typing import Dict, List, Tuple, Union
 
+import numpy as np
 import pandas as pd
 from geopy.geocoders import Nominatim
 from geopy.point import Point
-from haversine import Unit, haversine
+from haversine import Unit, haversine, haversine_vector
 
 from wkz import configuration as cfg
+from workoutizer import settings as django_settings
 
 log = logging.getLogger(__name__)
 
+# mean earth radius in meter, used to project coordinates onto a plane for simplifying traces
+EARTH_RADIUS = 6_371_000.0
+
+# time (see time.monotonic) of the latest request to Nominatim, to space requests by `geocoding_min_delay`
+_last_nominatim_request = None
+
 
 @dataclass
 class GeoTrace:
     pk: int
     name: str
-    coordinates: list
+    coordinates: str  # encoded polyline, see encode_polyline
     sport: str
     color: str = "#808080"
     opacity: float = 0.7
@@ -27,22 +37,44 @@ def calculate_distance_between_points(coordinate_1: Tuple[float], coordinate_2:
     return haversine(coordinate_1, coordinate_2, unit=Unit.METERS)
 
 
-def get_total_distance_of_trace(longitude_list: List[float], latitude_list: List[float]) -> float:
+def get_distances_of_trace(longitude_list: List[float], latitude_list: List[float]) -> Tuple[np.ndarray, float]:
+    """
+    Computes the distances along a trace using the haversine formula for all pairs of consecutive points at once.
+    Points without coordinates (None or NaN) are skipped.
+
+    Parameters
+    ----------
+    longitude_list : List[float]
+        longitude values of the trace
+    latitude_list : List[float]
+        latitude values of the trace, need to be of the same length as the longitude values
+
+    Returns
+    -------
+    Tuple[np.ndarray, float]
+        the cumulative distance in meters at each point of the trace (points without coordinates carry the distance
+        of the previous point) and the total distance of the trace in kilometers rounded to two decimals
+    """
     if len(latitude_list) != len(longitude_list):
         raise ValueError("lat and lon lists need to have same length")
     if len(latitude_list) < 2 or len(longitude_list) < 2:
         raise ValueError("lat and lon lists need to be at least of length 2")
-    coordinates_df = pd.DataFrame({"lat": latitude_list, "lon": longitude_list})
-    coordinates_df.dropna(inplace=True)
+    coordinates = np.column_stack(
+        [np.array(latitude_list, dtype=np.float64), np.array(longitude_list, dtype=np.float64)]
+    )
+    valid = ~np.isnan(coordinates).any(axis=1)
+    valid_coordinates = coordinates[valid]
+
+    distances = np.zeros(len(coordinates), dtype=np.float64)
+    if len(valid_coordinates) > 1:
+        steps = haversine_vector(valid_coordinates[:-1], valid_coordinates[1:], unit=Unit.METERS)
+        distances[np.flatnonzero(valid)[1:]] = steps
+    cumulative_distances = np.cumsum(distances)
+    return cumulative_distances, round(cumulative_distances[-1] / 1000, 2)
 
-    total_distance = 0
-    for index, row in coordinates_df.iterrows():
-        if index < len(coordinates_df) - 1:
-            point = (row["lat"], row["lon"])
-            next_point = (coordinates_df.at[index + 1, "lat"], coordinates_df.at[index + 1, "lon"])
-            dist = calculate_distance_between_points(point, next_point)
-            total_distance += dist
-    return round(total_distance / 1000, 2)
+
+def get_total_distance_of_trace(longitude_list: List[float], latitude_list: List[float]) -> float:
+    return get_distances_of_trace(longitude_list, latitude_list)[1]
 
 
 def add_elevation_data_to_coordinates(coordinates: list, altitude: list):
@@ -53,11 +85,55 @@ def add_elevation_data_to_coordinates(coordinates: list, altitude: list):
     return coordinates_with_elevation
 
 
-def get_location_name(coordinate: Tuple[float, float]) -> str:
-    app = Nominatim(user_agent="workoutizer")
+@lru_cache(maxsize=1)
+def _get_nominatim() -> Nominatim:
+    return Nominatim(user_agent="workoutizer")
+
+
+def get_location_name(
+    coordinate: Tuple[float, float], min_delay: float = None, use_nominatim: bool = None
+) -> Union[str, None]:
+    """
+    Returns the name of the place at the given coordinate (latitude, longitude). The nearest populated place within
+    `max_distance_to_place` of the GeoNames file `GEONAMES_FILE` is preferred, since it is looked up offline. In case
+    there is no such file or place, Nominatim is queried instead, unless `use_nominatim` is disabled. Requests to
+    Nominatim are spaced by at least `min_delay` seconds (defaults to `geocoding_min_delay`) by sleeping in the calling
+    thread, offline lookups are not delayed.
+
+    Raises
+    ------
+    geopy.exc.GeopyError
+        in case Nominatim could not be queried, e.g. it timed out or there is no network. In contrast to returning
+        None, this does not mean that there is no place at the coordinate.
+    """
+    from wkz.gis.places import get_place_index
+
+    place_index = get_place_index(django_settings.GEONAMES_FILE)
+    if place_index is not None:
+        name = place_index.get_nearest_place(coordinate, max_distance=cfg.max_distance_to_place)
+        if name:
+            return name
+    if use_nominatim is None:
+        use_nominatim = cfg.use_nominatim
+    if use_nominatim:
+        return _get_location_name_from_nominatim(coordinate, min_delay)
+    return None
+
+
+def _wait_for_nominatim(min_delay: float = None) -> None:
+    global _last_nominatim_request
+    if min_delay is None:
+        min_delay = cfg.geocoding_min_delay
+    if _last_nominatim_request is not None:
+        time.sleep(max(0.0, _last_nominatim_request + min_delay - time.monotonic()))
+    _last_nominatim_request = time.monotonic()
+
+
+def _get_location_name_from_nominatim(coordinate: Tuple[float, float], min_delay: float = None) -> Union[str, None]:
     try:
         p = Point(coordinate[0], coordinate[1])
-        address = app.reverse(query=p, language="en", timeout=10).raw["address"]
+        _wait_for_nominatim(min_delay)
+        address = _get_nominatim().reverse(query=p, language="en", timeout=10).raw["address"]
         # use name of location from village, town, city or county (in this order)
         if "village" in address.keys():
             return address["village"]
@@ -78,3 +154,140 @@ def get_list_of_coordinates(list_of_lon: List[float], list_of_lat: List[float])
             list(pd.Series(list_of_lat, dtype="float64").iloc[:: cfg.every_nth_value].ffill().bfill()),
         )
     )
+
+
+def get_douglas_peucker_significance(
+    longitude_list: List[float], latitude_list: List[float], min_tolerance: float = 0.0
+) -> np.ndarray:
+    """
+    Runs the Douglas-Peucker algorithm on a trace and returns the significance of each point, i.e. the largest
+    tolerance in meters for which the point is still part of the simplified trace. Simplifying the trace with any
+    tolerance then boils down to selecting the points with a significance above the tolerance. Start and end point
+    have infinite significance, points without coordinates (None or NaN) have a significance of zero. Segments are
+    not split any further once no point deviates more than `min_tolerance`, their points get a significance of zero.
+
+    Parameters
+    ----------
+    longitude_list : List[float]
+        longitude values of the trace
+    latitude_list : List[float]
+        latitude values of the trace, need to be of the same length as the longitude values
+    min_tolerance : float
+        smallest tolerance in meters the trace is going to be simplified with
+
+    Returns
+    -------
+    np.ndarray
+        significance in meters of each point of the trace
+    """
+    longitudes = np.array(longitude_list, dtype=np.float64)
+    latitudes = np.array(latitude_list, dtype=np.float64)
+    if len(longitudes) != len(latitudes):
+        raise ValueError("lat and lon lists need to have same length")
+    significance = np.zeros(len(longitudes), dtype=np.float64)
+    valid = np.flatnonzero(~(np.isnan(longitudes) | np.isnan(latitudes)))
+    if len(valid) == 0:
+        return significance
+
+    # equirectangular projection, which is precise enough for the extent of a single activity
+    y = np.radians(latitudes[valid]) * EARTH_RADIUS
+    x = np.radians(longitudes[valid]) * EARTH_RADIUS * np.cos(np.radians(np.mean(latitudes[valid])))
+    points = np.zeros(len(valid), dtype=np.float64)
+    points[[0, -1]] = np.inf
+    # iterate over the segments instead of recursing, a point is only as significant as the segment it splits
+    segments = [(0, len(valid) - 1, np.inf)]
+    while segments:
+        start, end, parent_significance = segments.pop()
+        if end - start < 2:
+            continue
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1 : end] - x[start], y[start + 1 : end] - y[start]
+        length = np.hypot(dx, dy)
+        if length > 0:
+            distances = np.abs(dx * py - dy * px) / length
+        else:
+            distances = np.hypot(px, py)
+        index = int(np.argmax(distances))
+        if distances[index] <= min_tolerance:
+            continue
+        split = start + 1 + index
+        points[split] = min(distances[index], parent_significance)
+        segments.append((start, split, points[split]))
+        segments.append((split, end, points[split]))
+    significance[valid] = points
+    return significance
+
+
+def get_simplified_polylines(
+    longitude_list: List[float], latitude_list: List[float], tolerances: List[float]
+) -> Dict[float, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Simplifies a trace using the Douglas-Peucker algorithm for each of the given tolerances in meters at once.
+
+    Parameters
+    ----------
+    longitude_list : List[float]
+        longitude values of the trace
+    latitude_list : List[float]
+        latitude values of the trace, need to be of the same length as the longitude values
+    tolerances : List[float]
+        maximum deviation in meters of the simplified traces from the original trace
+
+    Returns
+    -------
+    Dict[float, Tuple[np.ndarray, np.ndarray]]
+        longitude and latitude values of the simplified trace for each tolerance, empty if the trace has no
+        coordinates
+    """
+    significance = get_douglas_peucker_significance(longitude_list, latitude_list, min(tolerances))
+    if not significance.any():
+        return {}
+    longitudes = np.array(longitude_list, dtype=np.float64)
+    latitudes = np.array(latitude_list, dtype=np.float64)
+    polylines = {}
+    for tolerance in tolerances:
+        keep = significance > tolerance
+        polylines[tolerance] = longitudes[keep], latitudes[keep]
+    return polylines
+
+
+def encode_polyline(longitude_list: List[float], latitude_list: List[float], precision: int = 5) -> str:
+    """
+    Encodes coordinates using the encoded polyline algorithm format of Google, i.e. the differences of consecutive
+    coordinates (rounded to the given number of decimals) are encoded as variable length integers using printable
+    ASCII characters. This takes roughly a fifth of the space of the coordinates as JSON. The encoded polyline is
+    decoded client side, see `decodePolyline` in map_icons.js.
+
+    Parameters
+    ----------
+    longitude_list : List[float]
+        longitude values of the trace, must not contain missing values
+    latitude_list : List[float]
+        latitude values of the trace, need to be of the same length as the longitude values
+    precision : int
+        number of decimals of the coordinates to keep, 5 corresponds to roughly one meter
+
+    Returns
+    -------
+    str
+        the encoded polyline
+    """
+    if len(latitude_list) != len(longitude_list):
+        raise ValueError("lat and lon lists need to have same length")
+    # the format encodes latitude before longitude
+    coordinates = np.column_stack(
+        [np.array(latitude_list, dtype=np.float64), np.array(longitude_list, dtype=np.float64)]
+    )
+    if not np.isfinite(coordinates).all():
+        raise ValueError("coordinates must not contain missing values")
+    values = np.round(coordinates * 10**precision).astype(np.int64)
+    values = np.diff(values, axis=0, prepend=0).ravel()
+    # zigzag encoding of signed values, followed by chunks of 5 bits (least significant first) with a continuation bit
+    values = (values << 1) ^ (values >> 63)
+    shifts = np.arange(0, 64, 5)
+    chunks = (values[:, None] >> shifts) & 0x1F
+    number_of_chunks = np.maximum(1, (np.floor(np.log2(np.maximum(values, 1))).astype(np.int64) + 5) // 5)
+    is_used = np.arange(len(shifts)) < number_of_chunks[:, None]
+    has_continuation = np.arange(len(shifts)) < number_of_chunks[:, None] - 1
+    chunks = chunks | (has_continuation * 0x20)
+    return (chunks[is_used] + 63).astype(np.uint8).tobytes().decode("ascii")
@@ -0,0 +1,181 @@
+import datetime
+import logging
+from typing import Dict, Iterable, Iterator, Tuple, Type, Union
+
+import numpy as np
+from django.db import models
+from django.utils import timezone
+from geopy.exc import GeopyError
+
+from wkz import configuration as cfg
+from wkz.gis.geo import get_location_name
+from wkz.tools.series import decode_series
+
+log = logging.getLogger(__name__)
+
+
+def get_cell(coordinate: Tuple[float, float]) -> str:
+    """
+    Returns the key of the cell of the geocode cache containing the given coordinate (latitude, longitude). Coordinates
+    are quantized to cells of `geocode_cache_cell_size` degrees, such that activities starting at about the same place
+    share the same cell. The cell size is part of the key to not mix up cells of different sizes.
+    """
+    size = cfg.geocode_cache_cell_size
+    latitude, longitude = coordinate
+    return f"{size}:{round(latitude / size)}:{round(longitude / size)}"
+
+
+def _get_expiry_date() -> datetime.datetime:
+    return timezone.now() - datetime.timedelta(days=cfg.geocode_cache_ttl_days)
+
+
+def get_cached_location_name(
+    geocode_cache_model: Type[models.Model], coordinate: Tuple[float, float]
+) -> Union[str, None]:
+    """
+    Returns the name of the place at the given coordinate like `get_location_name`, but looks up the cell of the
+    coordinate in the persistent geocode cache first. Resolved names are stored in the cache, such that activities
+    starting at the same place only get geocoded once within `geocode_cache_ttl_days`.
+
+    Parameters
+    ----------
+    geocode_cache_model : Type[models.Model]
+        the GeocodeCache model
+    coordinate : Tuple[float, float]
+        latitude and longitude to look up
+
+    Returns
+    -------
+    Union[str, None]
+        name of the place or None if no place could be found
+    """
+    return get_cached_location_names(geocode_cache_model, [coordinate]).get(get_cell(coordinate))
+
+
+def get_cached_location_names(
+    geocode_cache_model: Type[models.Model], coordinates: Iterable[Tuple[float, float]], min_delay: float = None
+) -> Dict[str, Union[str, None]]:
+    """
+    Returns the names of the places at the given coordinates mapped to the cells of the coordinates, see `get_cell`.
+    Cached names are fetched at once, the names of the remaining cells are looked up (each cell only once) and stored
+    in the cache, requests to Nominatim are spaced by at least `min_delay` seconds to comply with its usage policy.
+    Cells whose lookup failed (e.g. Nominatim being unreachable) are missing in the result, while cells without any
+    place are mapped to None.
+    """
+    cells = _get_cells(coordinates)
+    names = dict(
+        geocode_cache_model.objects.filter(cell__in=list(cells), created__gte=_get_expiry_date()).values_list(
+            "cell", "name"
+        )
+    )
+    if names:
+        geocode_cache_model.objects.filter(cell__in=list(names)).update(last_used=timezone.now())
+    missing = {cell: coordinate for cell, coordinate in cells.items() if cell not in names}
+    names.update(_look_up(geocode_cache_model, missing, min_delay))
+    return names
+
+
+def _get_cells(coordinates: Iterable[Tuple[float, float]]) -> Dict[str, Tuple[float, float]]:
+    cells = {}
+    for coordinate in coordinates:
+        cells.setdefault(get_cell(coordinate), coordinate)
+    return cells
+
+
+def _look_up(
+    geocode_cache_model: Type[models.Model], cells: Dict[str, Tuple[float, float]], min_delay: float = None
+) -> Dict[str, Union[str, None]]:
+    names = {}
+    use_nominatim = cfg.use_nominatim
+    for cell, coordinate in cells.items():
+        try:
+            name = get_location_name(coordinate, min_delay=min_delay, use_nominatim=use_nominatim)
+        except GeopyError as e:
+            # back off: look up the remaining cells offline only, instead of waiting for Nominatim to time out again
+            log.warning(f"failed to look up the location of {coordinate}, not querying Nominatim for now: {e}")
+            use_nominatim = False
+            continue
+        if name is None and not use_nominatim:
+            # without Nominatim a missing name only means there is no place nearby in the GeoNames file (or no such
+            # file), which is cheap to look up again, so it is not cached. After Nominatim failed, the cell is unresolved
+            if not cfg.use_nominatim:
+                names[cell] = None
+            continue
+        names[cell] = name
+        _store(geocode_cache_model, cell, name)
+    return names
+
+
+def _store(geocode_cache_model: Type[models.Model], cell: str, name: Union[str, None]) -> None:
+    now = timezone.now()
+    geocode_cache_model.objects.update_or_create(cell=cell, defaults={"name": name, "created": now, "last_used": now})
+    evict(geocode_cache_model)
+
+
+def evict(geocode_cache_model: Type[models.Model]) -> int:
+    """
+    Deletes the entries of the geocode cache older than `geocode_cache_ttl_days` and, if there are still more than
+    `geocode_cache_max_entries` entries left, the least recently used ones.
+
+    Returns
+    -------
+    int
+        number of deleted entries
+    """
+    deleted, _ = geocode_cache_model.objects.filter(created__lt=_get_expiry_date()).delete()
+    excess = geocode_cache_model.objects.count() - cfg.geocode_cache_max_entries
+    if excess > 0:
+        pks = geocode_cache_model.objects.order_by("last_used", "pk").values_list("pk", flat=True)[:excess]
+        deleted += geocode_cache_model.objects.filter(pk__in=list(pks)).delete()[0]
+    if deleted:
+        log.debug(f"evicted {deleted} entries from geocode cache")
+    return deleted
+
+
+def prewarm(
+    geocode_cache_model: Type[models.Model],
+    coordinates: Iterable[Tuple[float, float]],
+    min_delay: float = None,
+) -> int:
+    """
+    Looks up the names of all cells of the given coordinates which are not in the geocode cache yet, each cell only
+    once. Requests to Nominatim are spaced by at least `min_delay` seconds to comply with its usage policy.
+
+    Returns
+    -------
+    int
+        number of newly resolved cells
+    """
+    cells = _get_cells(coordinates)
+    cached = set(
+        geocode_cache_model.objects.filter(cell__in=list(cells), created__gte=_get_expiry_date()).values_list(
+            "cell", flat=True
+        )
+    )
+    missing = {cell: coordinate for cell, coordinate in cells.items() if cell not in cached}
+    log.info(f"pre-warming geocode cache: {len(cells)} cells, {len(missing)} of them not cached yet")
+    return len(_look_up(geocode_cache_model, missing, min_delay))
+
+
+def get_start_coordinate(latitude_list: bytes, longitude_list: bytes) -> Union[Tuple[float, float], None]:
+    """
+    Returns the first coordinate (latitude, longitude) of the given encoded series of a trace, i.e. the coordinate the
+    automatic name of the activity is based on, or None if the trace has no coordinates.
+    """
+    latitudes, longitudes = decode_series(latitude_list), decode_series(longitude_list)
+    if len(latitudes) != len(longitudes):
+        return None
+    valid = np.flatnonzero(~(np.isnan(latitudes) | np.isnan(longitudes)))
+    if len(valid) == 0:
+        return None
+    return float(latitudes[valid[0]]), float(longitudes[valid[0]])
+
+
+def get_start_coordinates(traces_model: Type[models.Model]) -> Iterator[Tuple[float, float]]:
+    """
+    Yields the start coordinates of all traces with coordinates, see `get_start_coordinate`.
+    """
+    for latitude_list, longitude_list in traces_model.objects.values_list("latitude_list", "longitude_list").iterator():
+        coordinate = get_start_coordinate(latitude_list, longitude_list)
+        if coordinate is not None:
+            yield coordinate
@@ -0,0 +1,163 @@
+import io
+import logging
+import math
+import os
+import tempfile
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from wkz import configuration as cfg
+
+log = logging.getLogger(__name__)
+
+# size of the square map tiles in pixels and maximum zoom level supported by the tile endpoint
+TILE_SIZE = 256
+MAX_ZOOM = 20
+# circumference of the earth at the equator in meters as used by web mercator
+EARTH_CIRCUMFERENCE = 40_075_016.686
+
+
+def get_pixel_coordinates(longitudes: np.ndarray, latitudes: np.ndarray, zoom: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Projects coordinates onto the global pixel grid of the given zoom level using web mercator, i.e. the projection
+    used by the map tiles of leaflet.
+    """
+    size = TILE_SIZE * 2**zoom
+    latitudes = np.clip(np.asarray(latitudes, dtype=np.float64), -85.05112878, 85.05112878)
+    x = (np.asarray(longitudes, dtype=np.float64) + 180.0) / 360.0 * size
+    sin_latitude = np.sin(np.radians(latitudes))
+    y = (0.5 - np.log((1 + sin_latitude) / (1 - sin_latitude)) / (4 * np.pi)) * size
+    return x, y
+
+
+def get_bounding_box_of_tile(zoom: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """
+    Returns the bounding box (west, south, east, north) of the given tile in degrees.
+    """
+    n = 2**zoom
+
+    def latitude(tile_y: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / n))))
+
+    return x / n * 360.0 - 180.0, latitude(y + 1), (x + 1) / n * 360.0 - 180.0, latitude(y)
+
+
+def get_tiles_of_bounding_box(bounding_box: Tuple[float, float, float, float], zoom: int) -> Tuple[range, range]:
+    """
+    Returns the ranges of x and y indices of all tiles of the given zoom level intersecting the bounding box (west,
+    south, east, north), including the tiles a line drawn along the border of the bounding box might reach into.
+    """
+    west, south, east, north = bounding_box
+    x, y = get_pixel_coordinates(np.array([west, east]), np.array([north, south]), zoom)
+    margin = cfg.heatmap_line_width
+    last = 2**zoom - 1
+    x_min, x_max = (max(0, min(last, int(value // TILE_SIZE))) for value in (x[0] - margin, x[1] + margin))
+    y_min, y_max = (max(0, min(last, int(value // TILE_SIZE))) for value in (y[0] - margin, y[1] + margin))
+    return range(x_min, x_max + 1), range(y_min, y_max + 1)
+
+
+def get_tolerance_for_zoom(zoom: int, tolerances: List[float]) -> float:
+    """
+    Returns the largest polyline tolerance, which does not exceed half a pixel at the given zoom level, or the
+    smallest tolerance if all of them exceed it.
+    """
+    meters_per_pixel = EARTH_CIRCUMFERENCE / (TILE_SIZE * 2**zoom)
+    suitable = [tolerance for tolerance in tolerances if tolerance <= meters_per_pixel / 2]
+    return max(suitable) if suitable else min(tolerances)
+
+
+def render_tile(traces: Iterable[Tuple[np.ndarray, np.ndarray]], zoom: int, x: int, y: int) -> bytes:
+    """
+    Renders a heatmap tile of the given traces as PNG. Each pixel is colored by the number of traces passing through
+    it, from transparent (none) over red to yellow (`heatmap_saturation` traces or more). Since the colors do not
+    depend on the other tiles, each tile can be rendered on its own.
+
+    Parameters
+    ----------
+    traces : Iterable[Tuple[np.ndarray, np.ndarray]]
+        longitudes and latitudes of the traces to render, traces outside of the tile are fine
+    zoom : int
+        zoom level of the tile
+    x : int
+        x index of the tile
+    y : int
+        y index of the tile
+
+    Returns
+    -------
+    bytes
+        the rendered tile as PNG
+    """
+    counts = np.zeros((TILE_SIZE, TILE_SIZE), dtype=np.uint32)
+    mask = Image.new("L", (TILE_SIZE, TILE_SIZE))
+    draw = ImageDraw.Draw(mask)
+    for longitudes, latitudes in traces:
+        if len(longitudes) == 0:
+            continue
+        pixel_x, pixel_y = get_pixel_coordinates(longitudes, latitudes, zoom)
+        points = list(zip((pixel_x - x * TILE_SIZE).tolist(), (pixel_y - y * TILE_SIZE).tolist()))
+        # every trace counts only once per pixel, even if it passes a pixel several times
+        draw.rectangle((0, 0, TILE_SIZE, TILE_SIZE), fill=0)
+        if len(points) == 1:
+            points = points * 2
+        draw.line(points, fill=1, width=cfg.heatmap_line_width, joint="curve")
+        counts += np.asarray(mask, dtype=np.uint32)
+
+    intensity = np.minimum(1.0, np.log1p(counts) / np.log1p(cfg.heatmap_saturation))
+    rgba = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+    rgba[..., 0] = 255
+    rgba[..., 1] = (255 * intensity).astype(np.uint8)
+    rgba[..., 3] = np.where(counts > 0, 128 + 127 * intensity, 0).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(rgba, mode="RGBA").save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def get_path_of_tile(cache_dir: str, user_id: int, scope: str, zoom: int, x: int, y: int) -> Path:
+    return Path(cache_dir) / str(user_id) / scope / str(zoom) / str(x) / f"{y}.png"
+
+
+def save_tile(path: Path, tile: bytes) -> None:
+    """
+    Writes a tile to the cache atomically, such that concurrent requests never read a partially written tile.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(file_descriptor, "wb") as file:
+        file.write(tile)
+    os.replace(temporary_path, path)
+
+
+def invalidate_tiles(cache_dir: str, *bounding_boxes: Tuple[float, float, float, float]) -> int:
+    """
+    Deletes all cached tiles of all users and scopes intersecting any of the given bounding boxes (west, south, east,
+    north), such that they get rendered again on their next request. Only the tiles the activities touch are affected,
+    the costs are independent of the number of activities and the cache is scanned once for all bounding boxes.
+
+    Returns
+    -------
+    int
+        number of deleted tiles
+    """
+    deleted = 0
+    if not bounding_boxes:
+        return deleted
+    for zoom_dir in Path(cache_dir).glob("*/*/*"):
+        if not zoom_dir.name.isdigit():
+            continue
+        tile_ranges = [get_tiles_of_bounding_box(bounding_box, int(zoom_dir.name)) for bounding_box in bounding_boxes]
+        for x_dir in zoom_dir.iterdir():
+            if not x_dir.name.isdigit():
+                continue
+            y_ranges = [y_range for x_range, y_range in tile_ranges if int(x_dir.name) in x_range]
+            if not y_ranges:
+                continue
+            for tile in x_dir.glob("*.png"):
+                if tile.stem.isdigit() and any(int(tile.stem) in y_range for y_range in y_ranges):
+                    tile.unlink(missing_ok=True)
+                    deleted += 1
+    log.debug(f"deleted {deleted} heatmap tiles intersecting {len(bounding_boxes)} bounding boxes")
+    return deleted
@@ -0,0 +1,132 @@
+import logging
+import math
+import os
+from functools import lru_cache
+from typing import Dict, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from wkz.gis.geo import EARTH_RADIUS
+
+log = logging.getLogger(__name__)
+
+# columns of the GeoNames dumps (e.g. cities1000.txt) required for reverse geocoding, see
+# https://download.geonames.org/export/dump/readme.txt
+GEONAMES_COLUMNS = {1: "name", 4: "latitude", 5: "longitude", 6: "feature_class"}
+# size of the cells of the grid index in degrees
+CELL_SIZE = 0.25
+
+
+class PlaceIndex:
+    """
+    Spatial index of named places to look up the nearest place of a coordinate offline. Places are bucketed into the
+    cells of a regular grid of latitudes and longitudes (similar to geohashes), such that a lookup only needs to compute
+    the distances to the places of the few cells around the coordinate.
+    """
+
+    def __init__(self, names: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray):
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        cells = self._get_cells(latitudes, longitudes)
+        order = np.lexsort((cells[:, 1], cells[:, 0]))
+        self.names = np.asarray(names, dtype=object)[order]
+        self.latitudes = np.radians(latitudes[order])
+        self.longitudes = np.radians(longitudes[order])
+        cells = cells[order]
+        unique_cells, starts = np.unique(cells, axis=0, return_index=True)
+        ends = np.append(starts[1:], len(cells))
+        self._cells: Dict[Tuple[int, int], Tuple[int, int]] = {
+            (int(row), int(column)): (int(start), int(end))
+            for (row, column), start, end in zip(unique_cells, starts, ends)
+        }
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @staticmethod
+    def _get_cells(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+        return np.column_stack(
+            [np.floor((latitudes + 90) / CELL_SIZE), np.floor((longitudes + 180) / CELL_SIZE)]
+        ).astype(np.int64)
+
+    def get_nearest_place(self, coordinate: Tuple[float, float], max_distance: float) -> Union[str, None]:
+        """
+        Returns the name of the place nearest to the given coordinate (latitude, longitude), or None if there is no
+        place within the given distance in meters.
+        """
+        latitude, longitude = coordinate
+        row, column = self._get_cells(np.array([latitude]), np.array([longitude]))[0]
+        # number of cells to search around the cell of the coordinate, cells get narrower towards the poles
+        number_of_columns = int(360 / CELL_SIZE)
+        rows = math.ceil(math.degrees(max_distance / EARTH_RADIUS) / CELL_SIZE)
+        farthest_latitude = min(abs(latitude) + rows * CELL_SIZE, 89.9)
+        radius_of_circle_of_latitude = EARTH_RADIUS * math.cos(math.radians(farthest_latitude))
+        columns = min(
+            math.ceil(math.degrees(max_distance / radius_of_circle_of_latitude) / CELL_SIZE), number_of_columns
+        )
+
+        cells = {
+            (r, c % number_of_columns)
+            for r in range(row - rows, row + rows + 1)
+            for c in range(column - columns, column + columns + 1)
+        }
+        candidates = [self._cells[cell] for cell in cells if cell in self._cells]
+        if not candidates:
+            return None
+        indices = np.concatenate([np.arange(start, end) for start, end in candidates])
+        # haversine distances from the coordinate to all candidates
+        latitude, longitude = math.radians(latitude), math.radians(longitude)
+        a = (
+            np.sin((self.latitudes[indices] - latitude) / 2) ** 2
+            + math.cos(latitude)
+            * np.cos(self.latitudes[indices])
+            * np.sin((self.longitudes[indices] - longitude) / 2) ** 2
+        )
+        distances = 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        nearest = int(np.argmin(distances))
+        if distances[nearest] > max_distance:
+            return None
+        return self.names[indices[nearest]]
+
+
+def read_geonames_file(path: str) -> PlaceIndex:
+    """
+    Reads the populated places (feature class P) of a GeoNames dump, e.g. cities1000.txt, into a place index. Other
+    files with the same tab separated columns are fine too.
+    """
+    df = pd.read_csv(
+        path,
+        sep="\t",
+        header=None,
+        usecols=list(GEONAMES_COLUMNS),
+        quoting=3,
+        dtype={1: str, 4: np.float64, 5: np.float64, 6: str},
+        keep_default_na=False,
+        encoding="utf-8",
+    ).rename(columns=GEONAMES_COLUMNS)
+    df = df[df["feature_class"] == "P"]
+    log.debug(f"read {len(df)} places from {path}")
+    return PlaceIndex(df["name"].to_numpy(), df["latitude"].to_numpy(), df["longitude"].to_numpy())
+
+
+@lru_cache(maxsize=1)
+def _get_place_index_of_file(path: str, mtime_ns: int) -> Union[PlaceIndex, None]:
+    try:
+        return read_geonames_file(path)
+    except (ValueError, OSError) as e:
+        # e.g. too few columns, ragged rows or another encoding, not reading the file again until it changes
+        log.warning(f"could not read GeoNames file {path}, ignoring it: {e}")
+        return None
+
+
+def get_place_index(path: str) -> Union[PlaceIndex, None]:
+    """
+    Returns the place index of the given GeoNames file, which is read only once per process (and again whenever the
+    file changes), or None if the file does not exist or is not a valid GeoNames dump.
+    """
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    return _get_place_index_of_file(path, mtime_ns)
@@ -1,10 +1,18 @@
 import datetime
 import json
+import logging
+from types import ModuleType
 from typing import Union
 
 import pandas as pd
+from django.db.models import Min, Q
+from django.utils import timezone
 
-from wkz.gis.geo import get_location_name
+from wkz import configuration as cfg
+from wkz.gis.geocode_cache import get_cached_location_names, get_cell, get_start_coordinate
+from wkz.tools import sse
+
+log = logging.getLogger(__name__)
 
 
 def _get_daytime_name(date: datetime.datetime) -> str:
@@ -43,16 +51,99 @@ def _get_coordinate_not_null(coordinates: Union[str, list]):
     return coordinate
 
 
-def get_automatic_name(parser, sport_name: str) -> str:
+def has_start_coordinate(parser) -> bool:
     lat = _get_coordinate_not_null(coordinates=parser.latitude_list)
     lon = _get_coordinate_not_null(coordinates=parser.longitude_list)
-    if lat and lon:
-        location = get_location_name((lat, lon))
-    else:
-        location = None
+    return bool(lat and lon)
+
+
+def get_automatic_name(parser, sport_name: str) -> str:
+    """
+    Returns the provisional name of an activity based on daytime and sport, e.g. "Morning Cycling". For activities
+    with coordinates the location is added later on by `add_location_to_names`, to not delay the import.
+    """
     daytime = _get_daytime_name(parser.date)
     sport = _get_sport_name(sport_name)
-    if location:
-        return f"{daytime} {sport} in {location}"
-    else:
-        return f"{daytime} {sport}"
+    return f"{daytime} {sport}"
+
+
+def add_location_to_names(models: ModuleType, batch_size: int = None) -> int:
+    """
+    Adds the location to the names of one batch of activities with pending location, e.g. "Morning Cycling" becomes
+    "Morning Cycling in Heidelberg". Locations are looked up once per cell of the geocode cache, see
+    `get_cached_location_names`. Names which were changed by the user in the meantime are kept. Activities whose
+    location could not be looked up (e.g. Nominatim being unreachable) stay pending, but are only tried again after
+    `geocoding_retry_delay` seconds, doubled with every failure, such that a failing geocoder neither aborts the batch
+    nor holds back the activities of the following batches. After `geocoding_max_attempts` failures they keep their
+    provisional name.
+
+    Parameters
+    ----------
+    models : ModuleType
+        the wkz models module
+    batch_size : int
+        maximum number of activities to process, defaults to `geocoding_batch_size`
+
+    Returns
+    -------
+    int
+        number of activities whose location is pending and due to be looked up
+    """
+    if batch_size is None:
+        batch_size = cfg.geocoding_batch_size
+    activities = list(
+        _get_due_activities(models)
+        .order_by("pk")
+        .values_list("pk", "name", "location_attempts", "trace_file__latitude_list", "trace_file__longitude_list")[
+            :batch_size
+        ]
+    )
+    if not activities:
+        return 0
+    coordinates = {pk: get_start_coordinate(lat, lon) for pk, _, _, lat, lon in activities if lat and lon}
+    locations = get_cached_location_names(
+        models.GeocodeCache, [coordinate for coordinate in coordinates.values() if coordinate is not None]
+    )
+    renamed = 0
+    resolved = []
+    for pk, name, attempts, _, _ in activities:
+        coordinate = coordinates.get(pk)
+        if coordinate and get_cell(coordinate) not in locations:
+            _retry_later(models, pk, attempts + 1)
+            continue
+        resolved.append(pk)
+        location = locations.get(get_cell(coordinate)) if coordinate else None
+        if location:
+            # only rename the activity if its name did not change since it was read
+            renamed += models.Activity.objects.filter(pk=pk, name=name, location_pending=True).update(
+                name=f"{name} in {location}", location_pending=False, updated=timezone.now()
+            )
+    models.Activity.objects.filter(pk__in=resolved).update(location_pending=False)
+    if len(resolved) < len(activities):
+        log.warning(f"failed to look up the location of {len(activities) - len(resolved)} activities, trying later")
+    if renamed:
+        sse.send(f"<b>Activity Names:</b> Added the location to the names of {renamed} activities.", "green", "INFO")
+    return _get_due_activities(models).count()
+
+
+def get_next_location_retry(models: ModuleType) -> Union[datetime.datetime, None]:
+    """
+    Returns the date at which the location of the next activity whose lookup failed is due to be looked up again, or
+    None if there is no such activity.
+    """
+    return models.Activity.objects.filter(location_pending=True).aggregate(retry=Min("location_retry"))["retry"]
+
+
+def _get_due_activities(models: ModuleType):
+    return models.Activity.objects.filter(location_pending=True).filter(
+        Q(location_retry__isnull=True) | Q(location_retry__lte=timezone.now())
+    )
+
+
+def _retry_later(models: ModuleType, pk: int, attempts: int) -> None:
+    if attempts >= cfg.geocoding_max_attempts:
+        log.warning(f"giving up to look up the location of activity {pk}, keeping its provisional name")
+        models.Activity.objects.filter(pk=pk).update(location_pending=False, location_attempts=attempts)
+        return
+    delay = datetime.timedelta(seconds=cfg.geocoding_retry_delay * 2 ** (attempts - 1))
+    models.Activity.objects.filter(pk=pk).update(location_attempts=attempts, location_retry=timezone.now() + delay)
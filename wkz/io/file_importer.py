@@ -1,28 +1,45 @@
-import json
+import datetime
+import gzip
 import logging
 import os
-import gzip
-import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 from types import ModuleType
-from typing import Dict, List, Tuple, Union
+from typing import BinaryIO, Dict, Iterator, List, Tuple, Union
 
+from django.db import transaction
 from django.db.models import Model
+from django.utils import timezone
 from fitparse.utils import FitEOFError, FitHeaderError
 
 from wkz import configuration
 from wkz.best_sections.generic import GenericBestSection
 from wkz.demo import finalize_demo_activity_insertion, sport_name_mapping
-from wkz.io.auto_naming import get_automatic_name
+from wkz.io.auto_naming import get_automatic_name, has_start_coordinate
 from wkz.io.fit_parser import FITParser
 from wkz.io.gpx_parser import GPXParser
+from wkz.io.import_profile import ImportProfile
 from wkz.io.parser import Parser
 from wkz.tools import sse
+from wkz.tools.series import encode_series
 from wkz.tools.utils import calc_md5, limit_string
 
 log = logging.getLogger(__name__)
 
 
+@dataclass
+class ParseFailure:
+    """
+    Result of a file which could not be parsed. Worker processes return it instead of reporting the failure
+    themselves, since they neither send server sent events nor access the db.
+    """
+
+    path_to_file: Path
+    error: str
+
+
 def _save_laps_to_model(lap_model, laps: list, trace_instance, update_existing: bool):
     if update_existing:
         for lap in laps:
@@ -40,21 +57,45 @@ def _save_laps_to_model(lap_model, laps: list, trace_instance, update_existing:
                 defaults={"speed": lap.speed},  # only speed could really be updated
             )
     else:
-        for lap in laps:
-            lap_object = lap_model(
-                start_time=lap.start_time,
-                end_time=lap.end_time,
-                elapsed_time=lap.elapsed_time,
-                trigger=lap.trigger,
-                start_lat=lap.start_lat,
-                start_long=lap.start_long,
-                end_lat=lap.end_lat,
-                end_long=lap.end_long,
-                distance=lap.distance,
-                speed=lap.speed,
+        lap_model.objects.bulk_create(
+            [
+                lap_model(
+                    start_time=lap.start_time,
+                    end_time=lap.end_time,
+                    elapsed_time=lap.elapsed_time,
+                    trigger=lap.trigger,
+                    start_lat=lap.start_lat,
+                    start_long=lap.start_long,
+                    end_lat=lap.end_lat,
+                    end_long=lap.end_long,
+                    distance=lap.distance,
+                    speed=lap.speed,
+                    trace=trace_instance,
+                )
+                for lap in laps
+            ]
+        )
+
+
+def _save_polylines_to_model(polyline_model, parser, trace_instance, update_existing: bool):
+    if update_existing:
+        polyline_model.objects.filter(trace=trace_instance).delete()
+    polyline_model.objects.bulk_create(
+        [
+            polyline_model(
                 trace=trace_instance,
+                tolerance=tolerance,
+                number_of_points=len(longitudes),
+                longitude_list=encode_series(longitudes),
+                latitude_list=encode_series(latitudes),
+                min_latitude=min(latitudes),
+                max_latitude=max(latitudes),
+                min_longitude=min(longitudes),
+                max_longitude=max(longitudes),
             )
-            lap_object.save()
+            for tolerance, (longitudes, latitudes) in parser.simplified_polylines.items()
+        ]
+    )
 
 
 def _save_best_sections_to_model(best_section_model, parser, activity_instance, update_existing: bool):
@@ -73,23 +114,29 @@ def _save_best_sections_to_model(best_section_model, parser, activity_instance,
             )
         # If the parser does not have some best sections but the db has -> delete them from the db
         db_sections = best_section_model.objects.filter(activity=activity_instance)
+        sections_to_delete = []
         for section in db_sections:
             sec = GenericBestSection(section.distance, section.start, section.end, section.max_value, section.kind)
             if sec not in parser.best_sections:
                 log.debug(f"deleting section: {section} from db, because it is not present in parser")
-                section.delete()
+                sections_to_delete.append(section.pk)
+        if sections_to_delete:
+            best_section_model.objects.filter(pk__in=sections_to_delete).delete()
     else:
         # save best sections to model
-        for section in parser.best_sections:
-            best_section_object = best_section_model(
-                activity=activity_instance,
-                kind=section.kind,
-                distance=section.distance,
-                start=section.start,
-                end=section.end,
-                max_value=section.max_value,
-            )
-            best_section_object.save()
+        best_section_model.objects.bulk_create(
+            [
+                best_section_model(
+                    activity=activity_instance,
+                    kind=section.kind,
+                    distance=section.distance,
+                    start=section.start,
+                    end=section.end,
+                    max_value=section.max_value,
+                )
+                for section in parser.best_sections
+            ]
+        )
 
 
 def _get_or_create_sport(models, parsed_sport_name: str):
@@ -110,7 +157,9 @@ def _get_or_create_sport(models, parsed_sport_name: str):
         return models.default_sport(return_pk=False)
 
 
-def _save_activity_to_model(models, parser, trace_instance, importing_demo_data: bool, update_existing: bool):
+def _save_activity_to_model(
+    models, parser, trace_instance, importing_demo_data: bool, update_existing: bool, profile: ImportProfile
+):
     if update_existing:
         # name should not be overwritten
         activity_object = models.Activity.objects.get(trace_file=trace_instance)
@@ -125,9 +174,12 @@ def _save_activity_to_model(models, parser, trace_instance, importing_demo_data:
     else:
         sport = _get_or_create_sport(models, parser.sport)
         log.debug(f"parsed sport name: {parser.sport} was mapped to: {sport.name}")
+        with profile.stage("name"):
+            # determine automatic name (based on sport name and daytime), the location is added later on
+            name = get_automatic_name(parser, sport.name)
         activity_object = models.Activity(
-            # determine automatic name (based on location, sport name and daytime)
-            name=get_automatic_name(parser, sport.name),
+            name=name,
+            location_pending=has_start_coordinate(parser),
             sport=sport,
             date=parser.date,
             duration=parser.duration,
@@ -140,10 +192,10 @@ def _save_activity_to_model(models, parser, trace_instance, importing_demo_data:
 
 
 def _save_trace_to_model(traces_model, md5sum: str, parser, trace_file, update_existing: bool):
-    parser = _convert_list_attributes_to_json(parser)
+    series = _encode_list_attributes(parser)
     if update_existing:
         trace_object = traces_model.objects.get(md5sum=md5sum)
-        for attribute, value in parser.__dict__.items():
+        for attribute, value in {**parser.__dict__, **series}.items():
             if attribute == "sport":
                 continue
             if hasattr(trace_object, attribute):
@@ -160,31 +212,31 @@ def _save_trace_to_model(traces_model, md5sum: str, parser, trace_file, update_e
             md5sum=md5sum,
             calories=parser.calories,
             # coordinates
-            latitude_list=parser.latitude_list,
-            longitude_list=parser.longitude_list,
+            latitude_list=series["latitude_list"],
+            longitude_list=series["longitude_list"],
             # distances
-            distance_list=parser.distance_list,
+            distance_list=series["distance_list"],
             # altitude
-            altitude_list=parser.altitude_list,
+            altitude_list=series["altitude_list"],
             max_altitude=parser.max_altitude,
             min_altitude=parser.min_altitude,
             # heart rate
-            heart_rate_list=parser.heart_rate_list,
+            heart_rate_list=series["heart_rate_list"],
             min_heart_rate=parser.min_heart_rate,
             avg_heart_rate=parser.avg_heart_rate,
             max_heart_rate=parser.max_heart_rate,
             # cadence
-            cadence_list=parser.cadence_list,
+            cadence_list=series["cadence_list"],
             min_cadence=parser.min_cadence,
             avg_cadence=parser.avg_cadence,
             max_cadence=parser.max_cadence,
             # speed
-            speed_list=parser.speed_list,
+            speed_list=series["speed_list"],
             min_speed=parser.min_speed,
             avg_speed=parser.avg_speed,
             max_speed=parser.max_speed,
             # temperature
-            temperature_list=parser.temperature_list,
+            temperature_list=series["temperature_list"],
             min_temperature=parser.min_temperature,
             avg_temperature=parser.avg_temperature,
             max_temperature=parser.max_temperature,
@@ -195,72 +247,117 @@ def _save_trace_to_model(traces_model, md5sum: str, parser, trace_file, update_e
             total_ascent=parser.total_ascent,
             total_descent=parser.total_descent,
             # timestamps
-            timestamps_list=parser.timestamps_list,
+            timestamps_list=series["timestamps_list"],
         )
     trace_object.save()
     return trace_object
 
 
-def _convert_list_attributes_to_json(parser):
-    for attribute, values in parser.__dict__.items():
-        if attribute.endswith("_list"):
-            setattr(parser, attribute, json.dumps(values))
-    return parser
+def _encode_list_attributes(parser) -> Dict[str, bytes]:
+    return {attribute: encode_series(getattr(parser, attribute)) for attribute in configuration.time_series_attributes}
 
 
-def _get_md5sums_from_model(traces_model) -> List[str]:
-    return list(traces_model.objects.all().values_list("md5sum", flat=True))
+def _get_md5sums_from_model(traces_model) -> Dict[str, str]:
+    """
+    Returns an index of all traces in the db, mapping their md5sum to the path of their file. The index is meant to be
+    kept up to date by the importer, such that checking whether a file is stored in the db already requires no query.
+    """
+    return dict(traces_model.objects.values_list("md5sum", "path_to_file"))
 
 
 def _parse_data(file: Path, md5sum: str) -> Union[FITParser, GPXParser]:
     file = str(file)
     log.debug(f"importing {file} ...")
-    
-    # Handle compressed files
-    temp_file_path = None
-    original_file = file
-    
-    if file.lower().endswith(".gz"):
-        # Decompress file to a temporary location
-        base_name = os.path.basename(file[:-3])  # Remove .gz extension
-        
-        try:
-            with tempfile.NamedTemporaryFile(suffix=f'_{base_name}', delete=False) as temp_file:
-                with gzip.open(file, 'rb') as gz_file:
-                    temp_file.write(gz_file.read())
-                temp_file_path = temp_file.name
-                file = temp_file_path  # Use decompressed file for parsing
-                log.debug(f"decompressed {original_file} to {temp_file_path}")
-        except Exception as e:
-            log.error(f"Failed to decompress {original_file}: {e}")
-            raise
-    
-    try:
-        if file.lower().endswith(".gpx") or original_file.lower().endswith(".gpx.gz"):
-            log.debug("parsing GPX file ...")
-            parser = GPXParser(path_to_file=file, md5sum=md5sum)
-        elif file.lower().endswith(".fit") or original_file.lower().endswith(".fit.gz"):
-            log.debug("parsing FIT file ...")
-            parser = FITParser(path_to_file=file, md5sum=md5sum)
+    profile = ImportProfile()
+    with profile.stage("parse"):
+        if file.lower().endswith(".gz"):
+            # decompress compressed files on the fly while parsing, rather than writing them to a temporary file
+            with gzip.open(file, "rb") as stream:
+                parser = _parse_file_of_type(file, file[:-3], md5sum, stream)
         else:
-            log.error(f"file type: {original_file} unknown")
-            raise NotImplementedError(
-                f"Cannot parse {original_file} files. The only supported file formats are: {configuration.supported_formats}."
-            )
-        
-        # parse best sections
+            parser = _parse_file_of_type(file, file, md5sum)
+        # simplify coordinates for maps showing many activities
+        parser.get_simplified_polylines()
+
+    # parse best sections
+    with profile.stage("sections"):
         parser.get_best_sections()
-        log.debug(f"finished parsing file {original_file}.")
-        return parser
-        
-    finally:
-        # Clean up temporary file if created
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-                log.debug(f"cleaned up temporary file {temp_file_path}")
-            except Exception as e:
-                log.warning(f"Failed to clean up temporary file {temp_file_path}: {e}")
+    # the profile is passed on along with the parser, which might have been parsed in a worker process
+    parser.import_profile = profile
+    log.debug(f"finished parsing file {file}.")
+    return parser
+
+
+def _parse_file_of_type(
+    file: str, uncompressed_file_name: str, md5sum: str, stream: BinaryIO = None
+) -> Union[FITParser, GPXParser]:
+    if uncompressed_file_name.lower().endswith(".gpx"):
+        log.debug("parsing GPX file ...")
+        return GPXParser(path_to_file=file, md5sum=md5sum, stream=stream)
+    elif uncompressed_file_name.lower().endswith(".fit"):
+        log.debug("parsing FIT file ...")
+        return FITParser(path_to_file=file, md5sum=md5sum, stream=stream)
+    else:
+        log.error(f"file type: {file} unknown")
+        raise NotImplementedError(
+            f"Cannot parse {file} files. The only supported file formats are: {configuration.supported_formats}."
+        )
+
+
+def _get_md5sums_of_files(
+    trace_files: List[Path], file_index_model: Model, remove_missing: bool = True
+) -> Tuple[Dict[Path, str], int]:
+    """
+    Returns the md5sums of the given files and the number of files which were actually hashed. A file is only hashed
+    in case its size, modification time or inode changed since it was last hashed, otherwise its md5sum is taken from
+    the file index. The file index is updated accordingly and, if `remove_missing` is set, entries of files which are
+    not among the given files are removed from it.
+    """
+    if remove_missing:
+        entries = file_index_model.objects.all()
+    else:
+        entries = file_index_model.objects.filter(path__in=[str(trace_file) for trace_file in trace_files])
+    index = {entry.path: entry for entry in entries}
+    md5sums = {}
+    new_entries = []
+    changed_entries = []
+    for trace_file in trace_files:
+        stat = os.stat(trace_file)
+        entry = index.pop(str(trace_file), None)
+        if entry and (entry.size, entry.mtime_ns, entry.inode) == (stat.st_size, stat.st_mtime_ns, stat.st_ino):
+            md5sums[trace_file] = entry.md5sum
+            continue
+        md5sum = calc_md5(trace_file)
+        if entry:
+            entry.size, entry.mtime_ns, entry.inode, entry.md5sum = stat.st_size, stat.st_mtime_ns, stat.st_ino, md5sum
+            changed_entries.append(entry)
+        else:
+            new_entries.append(
+                file_index_model(
+                    path=str(trace_file),
+                    size=stat.st_size,
+                    mtime_ns=stat.st_mtime_ns,
+                    inode=stat.st_ino,
+                    md5sum=md5sum,
+                )
+            )
+        md5sums[trace_file] = md5sum
+
+    if not remove_missing:
+        index = {}
+    if new_entries or changed_entries or index:
+        log.debug(
+            f"updating file index: {len(new_entries)} new, {len(changed_entries)} changed and "
+            f"{len(index)} removed file(s)"
+        )
+        with transaction.atomic():
+            file_index_model.objects.bulk_create(new_entries)
+            file_index_model.objects.bulk_update(changed_entries, ["size", "mtime_ns", "inode", "md5sum"])
+            removed_pks = [entry.pk for entry in index.values()]
+            # delete in chunks to stay below the maximum number of sql variables
+            for i in range(0, len(removed_pks), 500):
+                file_index_model.objects.filter(pk__in=removed_pks[i : i + 500]).delete()
+    return md5sums, len(new_entries) + len(changed_entries)
 
 
 def _get_all_files(path: Path) -> List[Path]:
@@ -270,7 +367,8 @@ def _get_all_files(path: Path) -> List[Path]:
         for name in files
         if name.lower().endswith(tuple(configuration.supported_formats))
     ]
-    return trace_files
+    # sort files to import them in a deterministic order, independent of the order the file system lists them
+    return sorted(trace_files)
 
 
 def _parse_single_file(
@@ -296,124 +394,312 @@ def _parse_single_file(
     Union[Parser, None]
         Parser object containing the payload data of the parsed file or None in case parsing fails.
     """
+    return _handle_parse_result(_try_parse_single_file(path_to_file, md5sum), path_to_traces)
+
+
+def _try_parse_single_file(path_to_file: Path, md5sum: str) -> Union[Parser, ParseFailure]:
+    """
+    Parses a single file without sending any server sent event, such that it can run in a worker process. A file
+    which cannot be parsed is returned as ParseFailure, to be reported by the calling process.
+    """
     try:
-        parsed_data = _parse_data(str(path_to_file), md5sum)
-        return parsed_data
-    except (FitHeaderError, FitEOFError, AttributeError):
+        return _parse_data(str(path_to_file), md5sum)
+    except (FitHeaderError, FitEOFError, AttributeError) as e:
         # FitHeaderError and FitEOFError is used to catch corrupted fit files (e.g. non-fit files having a .fit ending).
         # AttributeError is raised in case of e.g. wahoo files, which are currently not supported by fitparse,
         # see https://github.com/dtcooper/python-fitparse/issues/121.
+        return ParseFailure(path_to_file=Path(path_to_file), error=repr(e))
+
+
+def _handle_parse_result(result: Union[Parser, ParseFailure], path_to_traces: Path) -> Union[Parser, None]:
+    if isinstance(result, ParseFailure):
+        log.debug(f"failed to parse {result.path_to_file}: {result.error}")
         sse.send(
-            f"Failed to parse fit file <code>{path_to_file.relative_to(path_to_traces)}</code>. File could either be "
-            f"corrupted or does not comply with the fit standard.",
+            f"Failed to parse fit file <code>{result.path_to_file.relative_to(path_to_traces)}</code>. File could "
+            f"either be corrupted or does not comply with the fit standard.",
             "red",
             "ERROR",
+            key="parse_error",
         )
+        return None
+    return result
 
 
 def _save_single_parsed_file_to_db(
-    parsed_file: Parser, models: ModuleType, importing_demo_data: bool, update_existing: bool
+    parsed_file: Parser,
+    models: ModuleType,
+    importing_demo_data: bool,
+    update_existing: bool,
+    profile: ImportProfile = None,
 ) -> None:
     log.debug(f"saving data of file {parsed_file.file_name} to db...")
-    # save trace data to model
-    trace_file_object = _save_trace_to_model(
-        traces_model=models.Traces,
-        md5sum=parsed_file.md5sum,
-        parser=parsed_file,
-        trace_file=parsed_file.path_to_file,
-        update_existing=update_existing,
-    )
-    trace_file_instance = models.Traces.objects.get(pk=trace_file_object.pk)
-
-    # save laps to model
-    _save_laps_to_model(
-        lap_model=models.Lap, laps=parsed_file.laps, trace_instance=trace_file_instance, update_existing=update_existing
-    )
-    # save activity itself to model
-    activity_object = _save_activity_to_model(
-        models=models,
-        parser=parsed_file,
-        trace_instance=trace_file_instance,
-        importing_demo_data=importing_demo_data,
-        update_existing=update_existing,
-    )
-    activity_instance = models.Activity.objects.get(pk=activity_object.pk)
-    # save best sections to model
-    _save_best_sections_to_model(
-        best_section_model=models.BestSection,
-        parser=parsed_file,
-        activity_instance=activity_instance,
-        update_existing=update_existing,
-    )
+    if profile is None:
+        profile = ImportProfile()
+    # write all data of one file in a single transaction, to avoid committing (and syncing to disk) each statement
+    with profile.stage("persist"), transaction.atomic():
+        # save trace data to model
+        trace_file_instance = _save_trace_to_model(
+            traces_model=models.Traces,
+            md5sum=parsed_file.md5sum,
+            parser=parsed_file,
+            trace_file=parsed_file.path_to_file,
+            update_existing=update_existing,
+        )
+        # save laps to model
+        _save_laps_to_model(
+            lap_model=models.Lap,
+            laps=parsed_file.laps,
+            trace_instance=trace_file_instance,
+            update_existing=update_existing,
+        )
+        # save simplified polylines to model
+        _save_polylines_to_model(
+            polyline_model=models.Polyline,
+            parser=parsed_file,
+            trace_instance=trace_file_instance,
+            update_existing=update_existing,
+        )
+        # save activity itself to model
+        activity_instance = _save_activity_to_model(
+            models=models,
+            parser=parsed_file,
+            trace_instance=trace_file_instance,
+            importing_demo_data=importing_demo_data,
+            update_existing=update_existing,
+            profile=profile,
+        )
+        # save best sections to model
+        _save_best_sections_to_model(
+            best_section_model=models.BestSection,
+            parser=parsed_file,
+            activity_instance=activity_instance,
+            update_existing=update_existing,
+        )
+        if update_existing:
+            # the geometry of the trace might have changed, while the activity itself did not
+            models.invalidate_heatmap_tiles_of_trace(trace_file_instance.pk)
     return activity_instance
 
 
 def _check_and_parse_file(
-    path_to_file: Path, path_to_traces: Path, md5sums_from_db: List[str], reimporting: bool
+    path_to_file: Path, path_to_traces: Path, md5sums_from_db: Dict[str, str], reimporting: bool, md5sum: str = None
 ) -> Tuple[str, Path, Union[Parser, None]]:
-    if reimporting:
+    if md5sum is None:
         md5sum = calc_md5(path_to_file)
+    if reimporting:
         return md5sum, path_to_file, _parse_single_file(path_to_file, path_to_traces, md5sum)
     else:
-        md5sum = calc_md5(path_to_file)
         if md5sum not in md5sums_from_db:
             return md5sum, path_to_file, _parse_single_file(path_to_file, path_to_traces, md5sum)
         else:
             return md5sum, path_to_file, None
 
 
-def run_importer(models: ModuleType, importing_demo_data: bool = False, reimporting: bool = False) -> None:
+def _init_parse_worker() -> None:
+    # forked worker processes inherit the dispatcher of the importer, events must not end up in that copy
+    sse.discard_dispatcher()
+    # worker processes which are not forked (e.g. spawned on macOS) need to set up django on their own
+    import django
+
+    django.setup()
+
+
+def _parse_files(
+    md5sums_of_files: Dict[Path, str],
+    path_to_traces: Path,
+    md5sums_from_db: Dict[str, str],
+    reimporting: bool,
+    workers: int,
+) -> Iterator[Tuple[str, Path, Union[Parser, None]]]:
+    """
+    Checks and parses the given files and yields the results in the same order as the files were given. In case of
+    more than one worker, parsing (including the search for best sections) is fanned out to a pool of processes.
+    Workers neither access the database nor send server sent events, failures are reported by the calling process
+    and since the results are yielded in order, the caller remains the single process writing to the database.
+
+    Parameters
+    ----------
+    md5sums_of_files : Dict[Path, str]
+        paths to the files to be parsed mapped to their md5sum
+    path_to_traces: Path
+        path to the directory containing the activity files
+    md5sums_from_db: Dict[str, str]
+        md5sums of all files which are already stored in the db mapped to their path
+    reimporting: bool
+        whether files should be parsed even though their md5sum is already stored in the db
+    workers: int
+        number of processes used for parsing, 1 means parsing sequentially in the calling process
+
+    Yields
+    ------
+    Tuple[str, Path, Union[Parser, None]]
+        md5sum, path and Parser object of each file, the latter is None for already imported or corrupted files
+    """
+    if workers <= 1:
+        for trace_file, md5sum in md5sums_of_files.items():
+            yield _check_and_parse_file(
+                path_to_file=trace_file,
+                path_to_traces=path_to_traces,
+                md5sums_from_db=md5sums_from_db,
+                reimporting=reimporting,
+                md5sum=md5sum,
+            )
+        return
+
+    log.debug(f"parsing files using {workers} worker processes...")
+    # limit the number of parsed files waiting for the db writer to keep memory consumption bounded
+    max_pending = workers * configuration.parse_queue_size_per_worker
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_parse_worker) as executor:
+        pending = deque()
+        for trace_file, md5sum in md5sums_of_files.items():
+            if reimporting or md5sum not in md5sums_from_db:
+                future = executor.submit(_try_parse_single_file, trace_file, md5sum)
+            else:
+                future = None
+            pending.append((md5sum, trace_file, future))
+            if len(pending) >= max_pending:
+                md5sum, path_to_file, future = pending.popleft()
+                yield md5sum, path_to_file, _handle_parse_result(future.result(), path_to_traces) if future else None
+        while pending:
+            md5sum, path_to_file, future = pending.popleft()
+            yield md5sum, path_to_file, _handle_parse_result(future.result(), path_to_traces) if future else None
+
+
+def run_importer(
+    models: ModuleType,
+    importing_demo_data: bool = False,
+    reimporting: bool = False,
+    workers: int = 1,
+    trace_files: List[Path] = None,
+) -> ImportProfile:
+    """
+    Imports activity files into the db. By default all files in the trace dir are considered, pass `trace_files` to
+    only import the given files, e.g. files reported by the file watcher. Server sent events about the import are
+    batched, see `sse.dispatching`, and cached heatmap tiles are invalidated once for all imported activities.
+
+    Each file passes the stages discover, hash, parse, sections, name and persist. The time spent in each stage is
+    returned as profile and, in case any file got parsed, stored as ImportRun.
+    """
+    profile = ImportProfile()
+    with sse.dispatching(), models.deferred_heatmap_invalidation():
+        _import_files(models, importing_demo_data, reimporting, workers, trace_files, profile)
+    return profile
+
+
+def _import_files(
+    models: ModuleType,
+    importing_demo_data: bool,
+    reimporting: bool,
+    workers: int,
+    trace_files: List[Path],
+    profile: ImportProfile,
+) -> None:
     path_to_traces = models.get_settings().path_to_trace_dir
     log.debug(f"triggered file importer on path: {path_to_traces}")
 
-    trace_files = _get_all_files(path_to_traces)
+    # discover: find the files to be imported and the files already imported
+    importing_all_files = trace_files is None
+    with profile.stage("discover", items=0):
+        if importing_all_files:
+            trace_files = _get_all_files(path_to_traces)
+        else:
+            # files might have been removed or renamed in the meantime
+            trace_files = [Path(trace_file) for trace_file in trace_files if os.path.isfile(trace_file)]
+        md5sums_from_db = _get_md5sums_from_model(models.Traces)
+    profile.add("discover", items=len(trace_files))
     _send_initial_info(len(trace_files), path_to_traces)
-    md5sums_from_db = _get_md5sums_from_model(models.Traces)
+
+    # hash: compute the md5sums of new or changed files
+    with profile.stage("hash", items=0):
+        md5sums_of_files, number_of_hashed_files = _get_md5sums_of_files(
+            trace_files, models.FileIndex, remove_missing=importing_all_files
+        )
+    profile.add("hash", items=number_of_hashed_files)
     num = 0
 
     # check whether all files are in db already or if a single new file was added
-    if _all_files_in_db_already(trace_files, md5sums_from_db) and not reimporting:
+    if _all_files_in_db_already(list(md5sums_of_files.values()), md5sums_from_db) and not reimporting:
         _send_result_info(num, reimporting)
+        profile.finish()
         return
 
     seen_md5sums = {}
     if trace_files:
         total_num = len(trace_files)
-        # loop over futures in a sequential fashion to store data to sqlite db sequentially
-        for i, trace_file in enumerate(trace_files):
-            md5sum, path_to_file, parsed_file = _check_and_parse_file(
-                path_to_file=trace_file,
-                path_to_traces=path_to_traces,
-                md5sums_from_db=md5sums_from_db,
-                reimporting=reimporting,
-            )
+        # parse and sections: parse files and search their best sections, possibly in worker processes
+        parsed_files = _parse_files(md5sums_of_files, path_to_traces, md5sums_from_db, reimporting, workers)
+        # loop over parsed files in a sequential fashion to store data to sqlite db sequentially
+        for i, (md5sum, path_to_file, parsed_file) in enumerate(parsed_files):
             # keep track of the seen md5sums and their file path
             seen_md5sums = _keep_track_of_md5sums_and_warn_about_duplicates(seen_md5sums, path_to_file, md5sum)
             # check if result is not None (due to failed parsing)
             if parsed_file:
-                # write parsed file to db if it does not exist yet, or in case of reimporting (=overwriting)
-                if _should_be_written_to_db(parsed_file, models.Traces, reimporting):
-                    _save_single_parsed_file_to_db(parsed_file, models, importing_demo_data, reimporting)
+                profile.merge(parsed_file.import_profile)
+                # name and persist: write parsed file to db if it does not exist yet, or in case of reimporting
+                if _should_be_written_to_db(parsed_file, md5sums_from_db, reimporting):
+                    _save_single_parsed_file_to_db(parsed_file, models, importing_demo_data, reimporting, profile)
+                    md5sums_from_db[parsed_file.md5sum] = str(parsed_file.path_to_file)
                     log.info(f"saved activity {i+1}/{total_num} to db")
                     num += 1
-            if (num + 1) % configuration.num_activities_in_progress_update == 0:
-                msg = f"<b>Progress Update:</b> Imported {num + 1} files."
-                sse.send(msg, "blue", "DEBUG")
+            elif reimporting or md5sum not in md5sums_from_db:
+                profile.add("parse", items=1, failures=1)
+            sse.progress(f"<b>Progress Update:</b> Imported {num} files.", done=i + 1, total=total_num)
 
     _send_result_info(num, reimporting)
+    if num:
+        schedule_adding_location_to_names(models)
 
     if importing_demo_data:
         finalize_demo_activity_insertion(models)
+    profile.finish()
+    _save_import_run(models, profile, reimporting, workers, number_of_files=len(trace_files), number_of_imported=num)
 
 
-def _all_files_in_db_already(trace_files: List[Path], md5sums_from_db: List[str]) -> bool:
-    md5sums_from_files = []
-    for trace in trace_files:
-        md5sums_from_files.append(calc_md5(trace))
-    if set(md5sums_from_db) >= set(md5sums_from_files):
-        return True
-    else:
-        return False
+def _save_import_run(
+    models: ModuleType,
+    profile: ImportProfile,
+    reimporting: bool,
+    workers: int,
+    number_of_files: int,
+    number_of_imported: int,
+) -> None:
+    if profile.stages["parse"].items == 0:
+        # do not clutter the history with runs which did not find any new file
+        return
+    run = models.ImportRun.objects.create(
+        started=timezone.now() - datetime.timedelta(seconds=profile.duration),
+        duration=profile.duration,
+        reimporting=reimporting,
+        workers=workers,
+        number_of_files=number_of_files,
+        number_of_imported=number_of_imported,
+    )
+    models.ImportStage.objects.bulk_create(
+        [
+            models.ImportStage(run=run, position=position, name=name, **stats.__dict__)
+            for position, (name, stats) in enumerate(profile.stages.items())
+        ]
+    )
+    old_runs = models.ImportRun.objects.order_by("-started", "-pk").values_list("pk", flat=True)[
+        configuration.import_runs_to_keep :
+    ]
+    models.ImportRun.objects.filter(pk__in=list(old_runs)).delete()
+
+
+def schedule_adding_location_to_names(models: ModuleType) -> None:
+    """
+    Schedules adding the location to the names of activities with pending location in the background, to be called
+    after saving activities with `_save_single_parsed_file_to_db`.
+    """
+    if models.Activity.objects.filter(location_pending=True).exists():
+        # imported here, since the huey tasks themselves depend on the file importer
+        from wkz.tasks import add_location_to_names_task
+
+        add_location_to_names_task()
+
+
+def _all_files_in_db_already(md5sums_from_files: List[str], md5sums_from_db: Dict[str, str]) -> bool:
+    return all(md5sum in md5sums_from_db for md5sum in md5sums_from_files)
 
 
 def _keep_track_of_md5sums_and_warn_about_duplicates(
@@ -425,24 +711,23 @@ def _keep_track_of_md5sums_and_warn_about_duplicates(
             f"<li><code>{path_to_file}</code> and </li>"
             f"<li><code>{seen_md5sums[md5sum]}</code></li></ul>"
         )
-        sse.send(msg, "yellow", "WARNING")
+        sse.send(msg, "yellow", "WARNING", key="duplicate_files")
     else:
         seen_md5sums[md5sum] = path_to_file
     return seen_md5sums
 
 
-def _should_be_written_to_db(parsed_file: Parser, traces_model: Model, reimporting: bool) -> bool:
+def _should_be_written_to_db(parsed_file: Parser, md5sums_from_db: Dict[str, str], reimporting: bool) -> bool:
     if reimporting:
         return True
     else:
-        if traces_model.objects.filter(md5sum=parsed_file.md5sum).exists():
-            existing_trace = traces_model.objects.get(md5sum=parsed_file.md5sum)
+        if parsed_file.md5sum in md5sums_from_db:
             msg = (
                 f"The following two files have the same checksum, you might want to remove one of them:<ul>"
-                f"<li><code>{existing_trace.path_to_file}</code> and </li>"
+                f"<li><code>{md5sums_from_db[parsed_file.md5sum]}</code> and </li>"
                 f"<li><code>{parsed_file.path_to_file}</code></li></ul>"
             )
-            sse.send(msg, "yellow", "WARNING")
+            sse.send(msg, "yellow", "WARNING", key="duplicate_files")
             return False
         else:
             return True
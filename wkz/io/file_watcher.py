@@ -0,0 +1,273 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Set, Tuple, Union
+
+from wkz import configuration as cfg
+
+log = logging.getLogger(__name__)
+
+# inotify constants, see `man 7 inotify`
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF
+
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+def _is_activity_file(name: str) -> bool:
+    return name.lower().endswith(tuple(cfg.supported_formats))
+
+
+def _get_activity_files_in_dir(path: Path) -> Set[Path]:
+    return {
+        Path(os.path.join(root, name))
+        for root, dirs, files in os.walk(path)
+        for name in files
+        if _is_activity_file(name)
+    }
+
+
+class InotifyWatcher:
+    """
+    Recursively watches a directory for activity files being written or moved into it, using the inotify API of the
+    linux kernel. Raises an OSError in case inotify is not available, e.g. on other operating systems. Once the watched
+    directory itself is deleted or moved, no further events are reported and `lost` is set.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        library = ctypes.util.find_library("c")
+        if not library:
+            raise OSError("could not find libc, inotify is not available")
+        self._libc = ctypes.CDLL(library, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify is not supported on this system")
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "failed to initialize inotify")
+        self._watched_dirs: Dict[int, Path] = {}
+        self.lost = False
+        self._root_wd = self._add_watches_recursively(self.path)
+
+    def _add_watch(self, path: Path) -> int:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"failed to watch {path}")
+        self._watched_dirs[wd] = path
+        return wd
+
+    def _add_watches_recursively(self, path: Path) -> int:
+        wd = self._add_watch(path)
+        for root, dirs, _ in os.walk(path):
+            for name in dirs:
+                try:
+                    self._add_watch(Path(root) / name)
+                except OSError as e:
+                    # the dir might have been removed in the meantime
+                    log.debug(f"could not watch {Path(root) / name}: {e}")
+        return wd
+
+    def read_events(self, timeout: float) -> Set[Path]:
+        """
+        Blocks until events are available or the timeout (in seconds) is reached and returns the paths of all activity
+        files, which were written, moved or created in the watched directory.
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        changed_files = set()
+        buffer = os.read(self._fd, 64 * 1024)
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(buffer[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                log.warning("inotify event queue overflowed, checking all files in watched directory")
+                changed_files |= _get_activity_files_in_dir(self.path)
+                continue
+            if wd == self._root_wd and mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                log.warning(f"watched directory {self.path} was deleted or moved")
+                self.lost = True
+                return changed_files
+            if mask & IN_IGNORED:
+                self._watched_dirs.pop(wd, None)
+                continue
+            directory = self._watched_dirs.get(wd)
+            if directory is None:
+                continue
+            path = directory / name
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                # files might have been placed in a new dir before it was watched, thus report all of them
+                try:
+                    self._add_watches_recursively(path)
+                except OSError as e:
+                    # the dir might have been removed in the meantime, which must not drop the remaining events
+                    log.debug(f"could not watch {path}: {e}")
+                    continue
+                changed_files |= _get_activity_files_in_dir(path)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and _is_activity_file(name):
+                changed_files.add(path)
+        return changed_files
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher:
+    """
+    Fallback for systems without inotify. Detects new or changed activity files by comparing the size, modification
+    time and inode of all files in the watched directory with the values of the previous scan.
+    """
+
+    def __init__(self, path: Union[str, Path], poll_interval: float = cfg.file_watcher_poll_interval):
+        self.path = Path(path)
+        self.poll_interval = poll_interval
+        # a deleted dir is simply scanned again, i.e. the watch never gets lost
+        self.lost = False
+        self._snapshot = self._scan()
+        self._last_scan = time.monotonic()
+
+    def _scan(self) -> Dict[Path, Tuple[int, int, int]]:
+        snapshot = {}
+        for path in _get_activity_files_in_dir(self.path):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            snapshot[path] = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        return snapshot
+
+    def read_events(self, timeout: float) -> Set[Path]:
+        """
+        Blocks until the timeout (in seconds) is reached and returns the paths of all activity files which were added
+        or changed since the previous scan. The directory is scanned at most once per poll interval.
+        """
+        time.sleep(max(0.0, min(timeout, self._last_scan + self.poll_interval - time.monotonic())))
+        if time.monotonic() - self._last_scan < self.poll_interval:
+            return set()
+        snapshot = self._scan()
+        self._last_scan = time.monotonic()
+        changed_files = {path for path, stat in snapshot.items() if self._snapshot.get(path) != stat}
+        self._snapshot = snapshot
+        return changed_files
+
+    def close(self) -> None:
+        pass
+
+
+def get_watcher(path: Union[str, Path]) -> Union[InotifyWatcher, PollingWatcher]:
+    try:
+        watcher = InotifyWatcher(path)
+        log.debug(f"watching {path} for new activity files using inotify")
+    except OSError as e:
+        log.info(f"inotify not available ({e}), falling back to polling {path} for new activity files")
+        watcher = PollingWatcher(path)
+    return watcher
+
+
+class TraceDirWatcher(threading.Thread):
+    """
+    Background thread watching the trace dir for new activity files. Events are debounced, i.e. a file is only passed
+    on once no further events occurred for it for `debounce` seconds. This ensures that files which are still being
+    copied are not imported prematurely. The paths of all files ready for import are passed to `on_change` in one go.
+    The trace dir is determined by calling `get_path` and a change of the path is picked up automatically. If the
+    trace dir is deleted or moved, it is watched again as soon as it exists again and all files in it are passed on.
+    """
+
+    def __init__(
+        self,
+        get_path: Callable[[], str],
+        on_change: Callable[[List[str]], None],
+        debounce: float = cfg.file_watcher_debounce,
+        idle_timeout: float = cfg.file_watcher_idle_timeout,
+    ):
+        super(TraceDirWatcher, self).__init__(name="trace-dir-watcher", daemon=True)
+        self.get_path = get_path
+        self.on_change = on_change
+        self.debounce = debounce
+        self.idle_timeout = idle_timeout
+        self._stop_event = threading.Event()
+        self._watcher = None
+        self._watched_path = None
+        # whether all files need to be passed on, since events might have been missed while not watching
+        self._rescan = False
+
+    def _ensure_watcher(self) -> bool:
+        path = self.get_path()
+        if self._watcher is not None and (path != self._watched_path or self._watcher.lost):
+            if self._watcher.lost:
+                self._rescan = True
+            self._watcher.close()
+            self._watcher = None
+        if self._watcher is None:
+            if Path(path).is_dir():
+                self._watcher = get_watcher(path)
+            elif path != self._watched_path:
+                log.warning(f"File Watcher: {path} is not a valid directory.")
+            self._watched_path = path
+        return self._watcher is not None
+
+    def run(self) -> None:
+        pending: Dict[Path, float] = {}
+        while not self._stop_event.is_set():
+            try:
+                if not self._ensure_watcher():
+                    self._stop_event.wait(self.idle_timeout)
+                    continue
+                timeout = self.debounce if pending else self.idle_timeout
+                changed_files = self._watcher.read_events(timeout)
+                if self._rescan:
+                    changed_files |= _get_activity_files_in_dir(Path(self._watched_path))
+                    self._rescan = False
+                now = time.monotonic()
+                for path in changed_files:
+                    pending[path] = now
+                ready = [path for path, last_event in pending.items() if now - last_event >= self.debounce]
+                if ready:
+                    for path in ready:
+                        del pending[path]
+                    log.debug(f"File Watcher: found {len(ready)} new or changed activity file(s)")
+                    self.on_change([str(path) for path in sorted(ready)])
+            except Exception as e:
+                log.error(f"File Watcher: failed to process file events: {e}", exc_info=True)
+                self._stop_event.wait(self.idle_timeout)
+        if self._watcher:
+            self._watcher.close()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+_trace_dir_watcher = None
+_trace_dir_watcher_lock = threading.Lock()
+
+
+def start_trace_dir_watcher(get_path: Callable[[], str], on_change: Callable[[List[str]], None]) -> bool:
+    """
+    Starts the trace dir watcher thread, unless it is already running in this process. Returns whether a new watcher
+    was started.
+    """
+    global _trace_dir_watcher
+    with _trace_dir_watcher_lock:
+        if _trace_dir_watcher is not None and _trace_dir_watcher.is_alive():
+            return False
+        _trace_dir_watcher = TraceDirWatcher(get_path=get_path, on_change=on_change)
+        _trace_dir_watcher.start()
+        return True
@@ -0,0 +1,325 @@
+import datetime
+import io
+import struct
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from fitparse.processors import UTC_REFERENCE
+from fitparse.profile import FIELD_TYPE_TIMESTAMP, MESSAGE_TYPES
+from fitparse.records import BASE_TYPE_BYTE, BASE_TYPES
+
+# definition number of the timestamp field, which is shared by all message types
+TIMESTAMP_FIELD = FIELD_TYPE_TIMESTAMP.def_num
+# base types which cannot be decoded into a single value by struct
+NON_SCALAR_BASE_TYPES = {"byte", "string"}
+# number of bytes read from the stream at once
+CHUNK_SIZE = 64 * 1024
+
+
+class FitDecodeError(Exception):
+    """
+    Raised in case a file cannot be decoded by the fast decoder, either because it is corrupted or because it
+    contains data the fast decoder does not support. The file should then be parsed using fitparse instead.
+    """
+
+
+class _Buffer:
+    """
+    Bytes of a stream, which are read in chunks of at least `chunk_size` bytes as they are required. Only the current
+    chunk is held in memory, such that decoding a (e.g. decompressing) stream does not need to read the entire file.
+    """
+
+    __slots__ = ("stream", "chunk_size", "data", "position", "discarded")
+
+    def __init__(self, stream: BinaryIO, chunk_size: int):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.data = b""
+        # position within the current data and number of bytes of the stream before the current data
+        self.position = 0
+        self.discarded = 0
+
+    @property
+    def offset(self) -> int:
+        return self.discarded + self.position
+
+    def require(self, size: int) -> bool:
+        """
+        Makes sure that at least `size` bytes are available from the current position on, returns False in case the
+        stream ends before.
+        """
+        while len(self.data) - self.position < size:
+            chunk = self.stream.read(max(self.chunk_size, size))
+            if not chunk:
+                return False
+            self.discarded += self.position
+            self.data = self.data[self.position :] + chunk
+            self.position = 0
+        return True
+
+    def read(self, size: int) -> int:
+        """
+        Returns the current position within `data`, after making sure `size` bytes are available from there on, and
+        advances the position by `size` bytes. Since `data` might be replaced, it must only be accessed afterwards.
+        """
+        if not self.require(size):
+            raise FitDecodeError("unexpected end of file")
+        position = self.position
+        self.position += size
+        return position
+
+
+class _DecodedField:
+    """
+    Decoding instructions of a single field of a definition message, refers to the fitparse profile for rendering.
+    """
+
+    __slots__ = ("index", "def_num", "field", "parse", "subfields", "components", "is_wanted")
+
+    def __init__(self, index: int, def_num: int, field, parse, names: Set[str]):
+        self.index = index
+        self.def_num = def_num
+        self.field = field
+        self.parse = parse
+        self.subfields = field.subfields if field and field.subfields else None
+        self.components = None
+        self.is_wanted = False
+        if field is None:
+            return
+        if _field_names(field) & names:
+            self.is_wanted = True
+        if _component_names(field) & names:
+            for component in _components(field):
+                if component.accumulate:
+                    raise FitDecodeError(f"accumulating component '{component.name}' is not supported")
+            self.components = True
+
+
+class _Definition:
+    __slots__ = ("mesg_num", "mesg_type", "struct", "fields", "decoded_def_nums")
+
+    def __init__(self, mesg_num: int, mesg_type, struct_format: str, fields: List[_DecodedField]):
+        self.mesg_num = mesg_num
+        self.mesg_type = mesg_type
+        self.struct = struct.Struct(struct_format)
+        self.fields = fields
+        self.decoded_def_nums = [field.def_num for field in fields]
+
+
+def _field_names(field) -> Set[str]:
+    names = {field.name}
+    for subfield in field.subfields or []:
+        names.add(subfield.name)
+    return names
+
+
+def _components(field) -> list:
+    components = list(field.components or [])
+    for subfield in field.subfields or []:
+        components.extend(subfield.components or [])
+    return components
+
+
+def _component_names(field) -> Set[str]:
+    return {component.name for component in _components(field)}
+
+
+def _process_type(field, value: Any) -> Any:
+    # mirrors the type processing of fitparse's default data processor
+    if value is None:
+        return value
+    type_name = field.type.name
+    if type_name == "date_time":
+        if value >= 0x10000000:
+            return datetime.datetime.utcfromtimestamp(UTC_REFERENCE + value)
+        raise FitDecodeError("timestamps relative to device power on are not supported")
+    elif type_name == "local_date_time":
+        return datetime.datetime.utcfromtimestamp(UTC_REFERENCE + value)
+    elif type_name == "bool":
+        return bool(value)
+    elif type_name == "localtime_into_day":
+        minutes, seconds = divmod(value, 60)
+        hours, minutes = divmod(minutes, 60)
+        return datetime.time(hours, minutes, seconds)
+    return value
+
+
+def _apply_scale_offset(field, value: Any) -> Any:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if field.scale:
+            value = float(value) / field.scale
+        if field.offset:
+            value = value - field.offset
+    return value
+
+
+def _resolve_subfield(field, def_nums: List[int], raw_values: List[Any]):
+    for subfield in field.subfields:
+        for ref_field in subfield.ref_fields:
+            for def_num, raw_value in zip(def_nums, raw_values):
+                if def_num == ref_field.def_num and ref_field.raw_value == raw_value:
+                    return subfield
+    return field
+
+
+def _parse_definition(buffer: _Buffer, is_developer_data: bool, names: Set[str]) -> _Definition:
+    position = buffer.read(5)
+    data = buffer.data
+    endian = ">" if data[position + 1] else "<"
+    mesg_num, num_fields = struct.unpack_from(f"{endian}HB", data, position + 2)
+    mesg_type = MESSAGE_TYPES.get(mesg_num)
+    formats = []
+    definitions = []
+    position = buffer.read(3 * num_fields)
+    data = buffer.data
+    for _ in range(num_fields):
+        def_num, size, base_type_num = data[position], data[position + 1], data[position + 2]
+        position += 3
+        base_type = BASE_TYPES.get(base_type_num, BASE_TYPE_BYTE)
+        if size % base_type.size:
+            raise FitDecodeError(f"invalid field size {size} for type '{base_type.name}'")
+        field = mesg_type.fields.get(def_num) if mesg_type else None
+        definitions.append((def_num, size, base_type, field))
+    if is_developer_data:
+        position = buffer.read(1)
+        num_dev_fields = buffer.data[position]
+        position = buffer.read(3 * num_dev_fields)
+        data = buffer.data
+        for _ in range(num_dev_fields):
+            definitions.append((None, data[position + 1], None, None))
+            position += 3
+
+    # determine which fields are required: the wanted ones, the ones their subfields refer to and the timestamp
+    required = set()
+    for def_num, _, _, field in definitions:
+        if def_num == TIMESTAMP_FIELD:
+            required.add(def_num)
+        if field is None or not (_field_names(field) | _component_names(field)) & names:
+            continue
+        required.add(def_num)
+        referencing_fields = [field] + [mesg_type.fields[component.def_num] for component in _components(field)]
+        for referencing_field in referencing_fields:
+            for subfield in referencing_field.subfields or []:
+                required.update(ref_field.def_num for ref_field in subfield.ref_fields)
+
+    fields = []
+    for def_num, size, base_type, field in definitions:
+        if def_num is None or def_num not in required:
+            formats.append(f"{size}x")
+            continue
+        if size != base_type.size or base_type.name in NON_SCALAR_BASE_TYPES:
+            raise FitDecodeError(f"array field '{field.name}' is not supported")
+        formats.append(base_type.fmt)
+        fields.append(_DecodedField(len(fields), def_num, field, base_type.parse, names))
+    return _Definition(mesg_num, mesg_type, endian + "".join(formats), fields)
+
+
+def _decode_values(
+    definition: _Definition, raw_values: List[Any], names: Set[str], values: Dict[str, Any]
+) -> Optional[int]:
+    """
+    Renders the wanted values of a data message into `values`, in the same way (and order) as fitparse does. Returns
+    the raw value of the timestamp field, if present.
+    """
+    timestamp = None
+    def_nums = definition.decoded_def_nums
+    for decoded in definition.fields:
+        raw_value = raw_values[decoded.index]
+        field = decoded.field
+        if decoded.subfields:
+            field = _resolve_subfield(field, def_nums, raw_values)
+        if decoded.components:
+            for component in field.components or []:
+                try:
+                    component_value = _apply_scale_offset(component, component.render(raw_value))
+                except ValueError:
+                    continue
+                component_field = definition.mesg_type.fields[component.def_num]
+                if component_field.subfields:
+                    component_field = _resolve_subfield(component_field, def_nums, raw_values)
+                if component_field.name in names:
+                    values[component_field.name] = _process_type(
+                        component_field, component_field.render(component_value)
+                    )
+        if decoded.is_wanted and field.name in names:
+            values[field.name] = _process_type(field, _apply_scale_offset(field, field.render(raw_value)))
+        if decoded.def_num == TIMESTAMP_FIELD and raw_value is not None:
+            timestamp = raw_value
+    return timestamp
+
+
+def iter_messages(
+    stream: Union[BinaryIO, bytes], names: Set[str], chunk_size: int = CHUNK_SIZE
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Decodes the data messages of a FIT file and yields the name of their message type together with the values of
+    the given field names, as fitparse's `get_values()` would return them. All other fields are skipped without being
+    decoded, which is a lot faster than decoding the entire file using fitparse. The CRC of the file is not checked.
+    The file is read from the stream in chunks while decoding, so memory consumption does not depend on its size.
+
+    Parameters
+    ----------
+    stream : Union[BinaryIO, bytes]
+        file-like object to read the FIT file from, e.g. a decompressing stream of a gzip file, or its content
+    names : Set[str]
+        names of the fields to decode, can be names of fields, subfields or components of any message type
+    chunk_size : int
+        minimum number of bytes read from the stream at once
+
+    Yields
+    ------
+    Tuple[str, Dict[str, Any]]
+        name of the message type and the decoded values of the message
+    """
+    if isinstance(stream, (bytes, bytearray)):
+        stream = io.BytesIO(stream)
+    buffer = _Buffer(stream, chunk_size)
+    while buffer.require(1):
+        # a file might consist of several chained FIT files, each starting with its own header
+        if not buffer.require(12) or buffer.data[buffer.position + 8 : buffer.position + 12] != b".FIT":
+            raise FitDecodeError("invalid FIT file header")
+        header_size = buffer.data[buffer.position]
+        (data_size,) = struct.unpack_from("<I", buffer.data, buffer.position + 4)
+        buffer.read(header_size)
+        end = buffer.offset + data_size
+        local_definitions: Dict[int, _Definition] = {}
+        timestamp = 0
+
+        while buffer.offset < end:
+            position = buffer.read(1)
+            header = buffer.data[position]
+            time_offset = None
+            if header & 0x80:
+                # compressed timestamp header
+                local_mesg_num = (header >> 5) & 0x3
+                time_offset = header & 0x1F
+            elif header & 0x40:
+                local_definitions[header & 0xF] = _parse_definition(buffer, bool(header & 0x20), names)
+                continue
+            else:
+                local_mesg_num = header & 0xF
+
+            definition = local_definitions.get(local_mesg_num)
+            if definition is None:
+                raise FitDecodeError(f"data message with undefined local message type {local_mesg_num}")
+            position = buffer.read(definition.struct.size)
+            raw_values = [
+                decoded.parse(raw_value)
+                for decoded, raw_value in zip(definition.fields, definition.struct.unpack_from(buffer.data, position))
+            ]
+
+            values = {}
+            message_timestamp = _decode_values(definition, raw_values, names, values)
+            if message_timestamp is not None:
+                timestamp = message_timestamp
+            if time_offset is not None:
+                # same accumulation as for compressed timestamps in fitparse
+                timestamp = time_offset + (timestamp & ~0x1F) + (0x20 if time_offset < (timestamp & 0x1F) else 0)
+                if "timestamp" in names:
+                    values["timestamp"] = _process_type(FIELD_TYPE_TIMESTAMP, timestamp)
+            mesg_name = definition.mesg_type.name if definition.mesg_type else f"unknown_{definition.mesg_num}"
+            yield mesg_name, values
+
+        if buffer.offset != end:
+            raise FitDecodeError("message exceeds the data size of the file")
+        # skip the file CRC
+        buffer.read(2)
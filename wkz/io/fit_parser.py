@@ -1,95 +1,190 @@
 import datetime
 import logging
 from dataclasses import dataclass
+from typing import BinaryIO
 
 import pandas as pd
 import pytz
 from django.conf import settings
 from fitparse import FitFile
+from fitparse.utils import FitEOFError, FitHeaderError
 
 from wkz import configuration
+from wkz.io.fit_decoder import FitDecodeError, iter_messages
 from wkz.io.parser import Parser
 
 log = logging.getLogger(__name__)
 
+# names of all fit message fields used by the parser
+FIELD_NAMES = {
+    # time series
+    "timestamp",
+    "distance",
+    "position_lat",
+    "position_long",
+    "enhanced_altitude",
+    "altitude",
+    "heart_rate",
+    "temperature",
+    "cadence",
+    "enhanced_speed",
+    # laps
+    "event",
+    "start_time",
+    "lap_trigger",
+    "start_position_lat",
+    "start_position_long",
+    "end_position_lat",
+    "end_position_long",
+    # summary values
+    "sport",
+    "total_training_effect",
+    "total_anaerobic_training_effect",
+    "total_distance",
+    "total_elapsed_time",
+    "total_calories",
+    "avg_heart_rate",
+    "avg_running_cadence",
+    "enhanced_avg_speed",
+    "avg_temperature",
+    "total_ascent",
+    "total_descent",
+}
+
 
 class FITParser(Parser):
-    def __init__(self, path_to_file: str, md5sum: str):
+    def __init__(self, path_to_file: str, md5sum: str, stream: BinaryIO = None):
         self.fit = None
-        super(FITParser, self).__init__(path_to_file, md5sum)
+        self.file = None
+        try:
+            super(FITParser, self).__init__(path_to_file, md5sum, stream)
+        finally:
+            # release the file handle, this also keeps the parser picklable for passing it between processes
+            if self.fit:
+                self.fit.close()
+                self.fit = None
+            if self.file and self.file is not stream:
+                self.file.close()
+            self.file = None
 
     def _parse_metadata(self):
         self.file_name = self.get_file_name_from_path(self.path_to_file)
-        self.fit = FitFile(self.path_to_file)
+        self.file = self.stream or open(self.path_to_file, "rb")
+        # check the file header right away (like fitparse does), to raise for files which are no valid fit files
+        header = self.file.read(12)
+        if len(header) != 12:
+            raise FitEOFError(f"Tried to read 12 bytes from .FIT file but got {len(header)}")
+        if header[8:12] != b".FIT":
+            raise FitHeaderError("Invalid .FIT File Header")
+        self.file.seek(0)
 
     def _parse_records(self):
+        if configuration.fast_fit_decoding:
+            try:
+                self._parse_records_with_fit_decoder()
+            except FitDecodeError as e:
+                log.warning(f"could not decode {self.file_name} with fast fit decoder, falling back to fitparse: {e}")
+                self._reset_parsed_records()
+                self.file.seek(0)
+                self._parse_records_with_fitparse()
+        else:
+            self._parse_records_with_fitparse()
+        self._log_parsed_records()
+
+    def _parse_records_with_fitparse(self):
+        # fitparse is only set up if required, since it decodes the file header (and seeks the stream) on its own
+        self.fit = FitFile(self.file)
         for record in self.fit.get_messages():
             record = record.get_values()
-            # print(record)
-
-            # parse laps
-            if record.get("event") == "lap":
-                lap = _parse_lap_data(record)
-                if (lap.end_lat and lap.end_long) or (lap.start_lat and lap.start_long):
-                    # only save lap if it comes with at least one coordinate
-                    self.laps.append(lap)
-
-            # parse list attributes
-            timestamp = record.get("timestamp")
-            self.timestamps_list.append(timestamp.timestamp() if timestamp is not None else None)
-            self.distance_list.append(record.get("distance"))
-            self.longitude_list.append(_to_coordinate(record.get("position_long")))
-            self.latitude_list.append(_to_coordinate(record.get("position_lat")))
-            # enhanced_altitude seems to contain the correct value (opposed to `altitude`) across multiple garmin devices
-            altitude = record.get("enhanced_altitude")
-            if altitude is None:  # get altitude value as backup in case enhanced_altitude is not available
-                altitude = record.get("altitude")
-            self.altitude_list.append(round(altitude, 1) if altitude is not None else None)
-            self.heart_rate_list.append(record.get("heart_rate"))
-            self.temperature_list.append(record.get("temperature"))
-            self.cadence_list.append(record.get("cadence"))
-            self.speed_list.append(record.get("enhanced_speed"))
-
-            # get first value of records
-            if not self.sport:
-                self.sport = record.get("sport")
-            if not self.aerobic_training_effect:
-                self.aerobic_training_effect = record.get("total_training_effect")
-            if not self.anaerobic_training_effect:
-                self.anaerobic_training_effect = record.get("total_anaerobic_training_effect")
-
-            # get last value of records
-            distance = record.get("total_distance")
-            if distance:
-                self.distance = round(float(distance) / 1000, 2)
-            duration = record.get("total_elapsed_time")
-            if duration:
-                self.duration = datetime.timedelta(seconds=int(duration))
+            self._parse_list_values(record)
+            self._parse_summary_values(record)
             date = record.get("timestamp")
             if date:
                 self.date = date.replace(tzinfo=pytz.timezone(settings.TIME_ZONE))
-            calories = record.get("total_calories")
-            if calories:
-                self.calories = calories
-            avg_heart_rate = record.get("avg_heart_rate")
-            if avg_heart_rate:
-                self.avg_heart_rate = avg_heart_rate
-            avg_cadence = record.get("avg_running_cadence")
-            if avg_cadence:
-                self.avg_cadence = avg_cadence
-            avg_speed = record.get("enhanced_avg_speed")
-            if avg_speed:
-                self.avg_speed = avg_speed
-            avg_temperature = record.get("avg_temperature")
-            if avg_temperature:
-                self.avg_temperature = avg_temperature
-            total_ascent = record.get("total_ascent")
-            if total_ascent:
-                self.total_ascent = total_ascent
-            total_descent = record.get("total_descent")
-            if total_descent:
-                self.total_descent = total_descent
 
+    def _parse_records_with_fit_decoder(self):
+        # only decode the fields the parser actually uses, `record` messages only contain values of time series
+        date = None
+        # the file is decoded while reading it, e.g. a gzip file is decompressed on the fly without being held in memory
+        for message_type, record in iter_messages(self.file, FIELD_NAMES):
+            self._parse_list_values(record)
+            if message_type != "record":
+                self._parse_summary_values(record)
+            timestamp = record.get("timestamp")
+            if timestamp:
+                date = timestamp
+        if date:
+            self.date = date.replace(tzinfo=pytz.timezone(settings.TIME_ZONE))
+
+    def _reset_parsed_records(self):
+        # clear the lists in place, since they are referenced by `list_attributes` as well
+        for attribute in configuration.time_series_attributes:
+            getattr(self, attribute).clear()
+        self.laps = []
+        self.sport = self.aerobic_training_effect = self.anaerobic_training_effect = None
+
+    def _parse_list_values(self, record: dict):
+        timestamp = record.get("timestamp")
+        self.timestamps_list.append(timestamp.timestamp() if timestamp is not None else None)
+        self.distance_list.append(record.get("distance"))
+        self.longitude_list.append(_to_coordinate(record.get("position_long")))
+        self.latitude_list.append(_to_coordinate(record.get("position_lat")))
+        # enhanced_altitude seems to contain the correct value (opposed to `altitude`) across multiple garmin devices
+        altitude = record.get("enhanced_altitude")
+        if altitude is None:  # get altitude value as backup in case enhanced_altitude is not available
+            altitude = record.get("altitude")
+        self.altitude_list.append(round(altitude, 1) if altitude is not None else None)
+        self.heart_rate_list.append(record.get("heart_rate"))
+        self.temperature_list.append(record.get("temperature"))
+        self.cadence_list.append(record.get("cadence"))
+        self.speed_list.append(record.get("enhanced_speed"))
+
+    def _parse_summary_values(self, record: dict):
+        # parse laps
+        if record.get("event") == "lap":
+            lap = _parse_lap_data(record)
+            if (lap.end_lat and lap.end_long) or (lap.start_lat and lap.start_long):
+                # only save lap if it comes with at least one coordinate
+                self.laps.append(lap)
+
+        # get first value of records
+        if not self.sport:
+            self.sport = record.get("sport")
+        if not self.aerobic_training_effect:
+            self.aerobic_training_effect = record.get("total_training_effect")
+        if not self.anaerobic_training_effect:
+            self.anaerobic_training_effect = record.get("total_anaerobic_training_effect")
+
+        # get last value of records
+        distance = record.get("total_distance")
+        if distance:
+            self.distance = round(float(distance) / 1000, 2)
+        duration = record.get("total_elapsed_time")
+        if duration:
+            self.duration = datetime.timedelta(seconds=int(duration))
+        calories = record.get("total_calories")
+        if calories:
+            self.calories = calories
+        avg_heart_rate = record.get("avg_heart_rate")
+        if avg_heart_rate:
+            self.avg_heart_rate = avg_heart_rate
+        avg_cadence = record.get("avg_running_cadence")
+        if avg_cadence:
+            self.avg_cadence = avg_cadence
+        avg_speed = record.get("enhanced_avg_speed")
+        if avg_speed:
+            self.avg_speed = avg_speed
+        avg_temperature = record.get("avg_temperature")
+        if avg_temperature:
+            self.avg_temperature = avg_temperature
+        total_ascent = record.get("total_ascent")
+        if total_ascent:
+            self.total_ascent = total_ascent
+        total_descent = record.get("total_descent")
+        if total_descent:
+            self.total_descent = total_descent
+
+    def _log_parsed_records(self):
         log.debug(f"found date: {self.date}")
         log.debug(f"found number of coordinates: {len(self.longitude_list)}")
         log.debug(f"found number of altitude: {len(self.altitude_list)}")
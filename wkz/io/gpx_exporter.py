@@ -1,5 +1,4 @@
 import datetime
-import json
 import os
 
 import pandas as pd
@@ -76,14 +75,15 @@ def save_activity_to_gpx_file(activity):
     path = os.path.join(settings.MEDIA_ROOT, file_name)
     coordinates = list(
         zip(
-            list(pd.Series(json.loads(activity.trace_file.longitude_list)).ffill().bfill()),
-            list(pd.Series(json.loads(activity.trace_file.latitude_list)).ffill().bfill()),
+            list(pd.Series(activity.trace_file.get_series("longitude_list")).ffill().bfill()),
+            list(pd.Series(activity.trace_file.get_series("latitude_list")).ffill().bfill()),
         )
     )
-    if json.loads(activity.trace_file.altitude_list):
+    altitude = activity.trace_file.get_series("altitude_list")
+    if altitude.size:
         coordinates = add_elevation_data_to_coordinates(
             coordinates=coordinates,
-            altitude=list(pd.Series(json.loads(activity.trace_file.altitude_list)).ffill().bfill()),
+            altitude=list(pd.Series(altitude).ffill().bfill()),
         )
     file_content = _build_gpx(
         time=activity.date,
@@ -1,23 +1,28 @@
 import logging
+from typing import BinaryIO
 
 import gpxpy
 import gpxpy.gpx
+import numpy as np
 
-from wkz.gis.geo import get_total_distance_of_trace
+from wkz.gis.geo import get_distances_of_trace
 from wkz.io.parser import Parser
 
 log = logging.getLogger(__name__)
 
 
 class GPXParser(Parser):
-    def __init__(self, path_to_file: str, md5sum: str):
-        super(GPXParser, self).__init__(path_to_file, md5sum)
+    def __init__(self, path_to_file: str, md5sum: str, stream: BinaryIO = None):
+        super(GPXParser, self).__init__(path_to_file, md5sum, stream)
         self.gpx = None
 
     def _parse_metadata(self):
-        gpx_file = open(self.path_to_file, "r")
         self.file_name = self.get_file_name_from_path(self.path_to_file)
-        self.gpx = gpxpy.parse(gpx_file)
+        if self.stream:
+            self.gpx = gpxpy.parse(self.stream)
+        else:
+            with open(self.path_to_file, "r") as gpx_file:
+                self.gpx = gpxpy.parse(gpx_file)
         self._get_sport_from_gpx_file()
         self._get_duration_from_gpx_file()
 
@@ -68,8 +73,10 @@ class GPXParser(Parser):
         log.debug(f"found number of elevation points: {len(self.altitude_list)}")
 
     def _post_process_data(self):
-        self.distance = get_total_distance_of_trace(
+        distances, self.distance = get_distances_of_trace(
             longitude_list=self.longitude_list,
             latitude_list=self.latitude_list,
         )
+        # gpx files contain no distances, use the distance along the trace in meters as distance series instead
+        self.distance_list = np.round(distances, 2).tolist()
         log.debug(f"found distance: {self.distance}")
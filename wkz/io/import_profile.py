@@ -0,0 +1,78 @@
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, List
+
+# stages of the file importer in the order they are passed by each file
+STAGES = ["discover", "hash", "parse", "sections", "name", "persist"]
+
+
+@dataclass
+class StageStats:
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    items: int = 0
+    failures: int = 0
+
+
+class ImportProfile:
+    """
+    Records wall time, cpu time, number of items and failures of each stage of the file importer. Times of nested
+    stages are not included in the enclosing stage, e.g. naming an activity is not part of persisting it. Profiles of
+    files parsed in worker processes are merged into the profile of the import, such that the times of the stages
+    running in parallel are summed up over all workers and might exceed the duration of the import itself.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, StageStats] = {name: StageStats() for name in STAGES}
+        self.duration = None
+        self._start = time.perf_counter()
+        # wall and cpu time of the nested stages of each currently running stage
+        self._nested: List[List[float]] = []
+
+    @contextmanager
+    def stage(self, name: str, items: int = 1) -> Iterator[None]:
+        """
+        Measures the code run within the context as the given stage, which processes the given number of items. An
+        exception raised within the context is counted as failure of the stage and re-raised.
+        """
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        self._nested.append([0.0, 0.0])
+        failures = 0
+        try:
+            yield
+        except Exception:
+            failures = 1
+            raise
+        finally:
+            nested_wall_time, nested_cpu_time = self._nested.pop()
+            wall_time = time.perf_counter() - wall_start
+            cpu_time = time.process_time() - cpu_start
+            self.add(name, wall_time - nested_wall_time, cpu_time - nested_cpu_time, items, failures)
+            if self._nested:
+                self._nested[-1][0] += wall_time
+                self._nested[-1][1] += cpu_time
+
+    def add(self, name: str, wall_time: float = 0.0, cpu_time: float = 0.0, items: int = 0, failures: int = 0) -> None:
+        stats = self.stages[name]
+        stats.wall_time += wall_time
+        stats.cpu_time += cpu_time
+        stats.items += items
+        stats.failures += failures
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self._start
+
+    def merge(self, other: "ImportProfile") -> None:
+        for name, stats in other.stages.items():
+            self.add(name, stats.wall_time, stats.cpu_time, stats.items, stats.failures)
+
+    def __str__(self) -> str:
+        lines = [f"{'stage':<10}{'wall [s]':>10}{'cpu [s]':>10}{'items':>8}{'failures':>10}"]
+        for name, stats in self.stages.items():
+            lines.append(
+                f"{name:<10}{stats.wall_time:>10.2f}{stats.cpu_time:>10.2f}{stats.items:>8}{stats.failures:>10}"
+            )
+        if self.duration is not None:
+            lines.append(f"{'total':<10}{self.duration:>10.2f}")
+        return "\n".join(lines)
@@ -1,22 +1,20 @@
 import datetime
 import logging
 import os
-from typing import List
-
-from sportgems import (
-    DistanceTooSmallException,
-    InconsistentLengthException,
-    NoSectionFoundException,
-    TooFewDataPointsException,
-)
+from typing import BinaryIO
 
 from wkz import configuration
+from wkz.best_sections.search import SectionSearch
+from wkz.gis.geo import get_simplified_polylines
 
 log = logging.getLogger(__name__)
 
 
 class Parser:
-    def __init__(self, path_to_file: str, md5sum: str):
+    def __init__(self, path_to_file: str, md5sum: str, stream: BinaryIO = None):
+        # optional file-like object to read the data from instead of opening `path_to_file`, e.g. a decompressing
+        # stream of a gzip file. It is only used while parsing and not kept afterwards.
+        self.stream = stream
         # basic activity info
         self.path_to_file = path_to_file
         self.file_name = None
@@ -81,10 +79,14 @@ class Parser:
         # best sections
         self.best_sections = []
 
+        # simplified polylines of the coordinates, mapping each tolerance to longitude and latitude values
+        self.simplified_polylines = {}
+
         # run parser
         self._parse_metadata()
         self._parse_records()
         self._post_process_data()
+        self.stream = None
 
     def _parse_metadata(self):
         raise NotImplementedError
@@ -102,26 +104,26 @@ class Parser:
         return os.path.basename(path)
 
     def get_best_sections(self):
-        log.debug("parsing best sections using sportgems...")
-        # helper func to be called for each available section kind parser
-
-        def _get_best_sections_for_section_kind(section_parser, section_distances: List[int]):
-            for distance in section_distances:
+        log.debug("searching best sections...")
+        # data shared by all section kinds and distances is only computed once
+        search = SectionSearch(
+            times=self.timestamps_list,
+            latitudes=self.latitude_list,
+            longitudes=self.longitude_list,
+            altitudes=self.altitude_list,
+        )
+        for bs in configuration.best_sections:
+            for distance in bs.distances:
                 if self.distance * 1000 > distance and self.latitude_list:
-                    try:
-                        result = section_parser(distance, self)
-                        if result:
-                            self.best_sections.append(result)
-                    except (
-                        DistanceTooSmallException,
-                        TooFewDataPointsException,
-                        NoSectionFoundException,
-                        InconsistentLengthException,
-                    ) as e:
-                        # catching some of the sportgems customs exceptions and logging it
-                        log.debug(f"Could not find requested section. Sportgems error: {e}")
-                        # however some are not caught and should actually be raised,
-                        # e.g NoSectionFoundException and InvalidDesiredDistanceException
+                    result = bs.search(distance, search)
+                    if result:
+                        self.best_sections.append(result)
+                    else:
+                        log.debug(f"Could not find {bs.kind} section of {distance}m.")
 
-        for bs in configuration.best_sections:
-            _get_best_sections_for_section_kind(bs.parser, bs.distances)
+    def get_simplified_polylines(self):
+        log.debug("simplifying coordinates...")
+        if self.latitude_list:
+            self.simplified_polylines = get_simplified_polylines(
+                self.longitude_list, self.latitude_list, configuration.polyline_tolerances
+            )
@@ -12,7 +12,7 @@ from django.core.files import File
 from django.utils.dateparse import parse_datetime
 from wkz.models import Activity, Sport, ActivityPhoto, Traces
 from wkz.utils.sport_mapping import SportMapper
-from wkz.io.file_importer import _parse_single_file, _save_single_parsed_file_to_db
+from wkz.io.file_importer import _parse_single_file, _save_single_parsed_file_to_db, schedule_adding_location_to_names
 from wkz.tools.utils import calc_md5
 from pathlib import Path
 from wkz import models
@@ -98,6 +98,10 @@ class Command(BaseCommand):
                         self.style.ERROR(f'Error importing activity {row.get("Activity ID", "Unknown")}: {str(e)}')
                     )
 
+        if not dry_run:
+            # the imported GPS files are named provisionally, their location is added in the background
+            schedule_adding_location_to_names(models)
+
         self.stdout.write(
             self.style.SUCCESS(
                 f'Import complete. Imported: {imported_count}, '
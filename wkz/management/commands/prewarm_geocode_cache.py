@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from wkz import configuration as cfg
+from wkz.gis.geocode_cache import evict, get_start_coordinates, prewarm
+from wkz.models import GeocodeCache, Traces
+
+
+class Command(BaseCommand):
+    help = "Resolve and cache the location names of the start coordinates of all activities"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--delay",
+            type=float,
+            default=cfg.geocoding_min_delay,
+            help="minimum seconds between two lookups",
+        )
+
+    def handle(self, *args, **options):
+        evict(GeocodeCache)
+        resolved = prewarm(GeocodeCache, get_start_coordinates(Traces), min_delay=options["delay"])
+        self.stdout.write(f"Resolved {resolved} location names, {GeocodeCache.objects.count()} are cached now.")
@@ -0,0 +1,26 @@
+# Generated by Django 4.0.10 on 2026-10-17 03:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wkz", "0015_metrictile_sporttileconfiguration_sporttileorder_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FileIndex",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("path", models.CharField(max_length=1000, unique=True)),
+                ("size", models.BigIntegerField()),
+                ("mtime_ns", models.BigIntegerField()),
+                ("inode", models.BigIntegerField()),
+                ("md5sum", models.CharField(max_length=32)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("updated", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
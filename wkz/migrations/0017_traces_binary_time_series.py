@@ -0,0 +1,141 @@
+import json
+import struct
+import zlib
+
+import numpy as np
+from django.db import migrations, models
+
+TIME_SERIES_ATTRIBUTES = [
+    "latitude_list",
+    "longitude_list",
+    "distance_list",
+    "altitude_list",
+    "heart_rate_list",
+    "cadence_list",
+    "speed_list",
+    "temperature_list",
+    "timestamps_list",
+]
+
+# frozen copy of the time series codec of wkz.tools.series as of this migration (version 1), such that later changes of
+# the codec do not change what this migration writes
+MAGIC = b"WKZS"
+VERSION = 1
+HEADER = struct.Struct("<4sBBBxI")
+FLAG_NULLS = 1
+FLAG_DELTA = 2
+FLAG_COMPRESSED = 4
+DTYPES = {
+    1: np.dtype("<i1"),
+    2: np.dtype("<i2"),
+    3: np.dtype("<i4"),
+    4: np.dtype("<i8"),
+    5: np.dtype("<f8"),
+}
+DTYPE_CODES = {dtype: code for code, dtype in DTYPES.items()}
+
+
+def _smallest_int_dtype(values):
+    low, high = (int(values.min()), int(values.max())) if values.size else (0, 0)
+    for code in (1, 2, 3, 4):
+        info = np.iinfo(DTYPES[code])
+        if info.min <= low and high <= info.max:
+            return DTYPES[code]
+    raise OverflowError("values exceed range of int64")
+
+
+def encode_series(values):
+    if len(values) == 0:
+        return b""
+    array = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    nulls = np.isnan(array)
+    valid = array[~nulls]
+    flags = FLAG_COMPRESSED
+    if valid.size and np.all(np.mod(valid, 1) == 0) and np.all(np.abs(valid) < 2**53):
+        integers = np.diff(valid.astype(np.int64), prepend=np.int64(0))
+        flags |= FLAG_DELTA
+        dtype = _smallest_int_dtype(integers)
+        data = integers.astype(dtype)
+    else:
+        dtype = DTYPES[5]
+        data = valid.astype(dtype)
+    payload = b""
+    if nulls.any():
+        flags |= FLAG_NULLS
+        payload += np.packbits(nulls, bitorder="little").tobytes()
+    payload = zlib.compress(payload + data.tobytes())
+    return HEADER.pack(MAGIC, VERSION, flags, DTYPE_CODES[dtype], len(array)) + payload
+
+
+def decode_series(blob):
+    if not blob:
+        return np.array([], dtype=np.float64)
+    blob = bytes(blob)
+    magic, version, flags, dtype_code, length = HEADER.unpack_from(blob)
+    if magic != MAGIC or version != VERSION or dtype_code not in DTYPES:
+        raise ValueError("data is not an encoded time series")
+    payload = blob[HEADER.size :]
+    if flags & FLAG_COMPRESSED:
+        payload = zlib.decompress(payload)
+    if flags & FLAG_NULLS:
+        bitmap_size = (length + 7) // 8
+        bitmap = np.frombuffer(payload[:bitmap_size], dtype=np.uint8)
+        nulls = np.unpackbits(bitmap, count=length, bitorder="little").astype(bool)
+        payload = payload[bitmap_size:]
+    else:
+        nulls = np.zeros(length, dtype=bool)
+    data = np.frombuffer(payload, dtype=DTYPES[dtype_code])
+    if flags & FLAG_DELTA:
+        data = np.cumsum(data, dtype=np.int64)
+    values = np.full(length, np.nan, dtype=np.float64)
+    values[~nulls] = data
+    return values
+
+
+def series_to_list(values):
+    return [None if np.isnan(value) else value for value in values.tolist()]
+
+
+def json_to_binary(apps, schema_editor):
+    Traces = apps.get_model("wkz", "Traces")
+    for pk, *values in Traces.objects.values_list("pk", *TIME_SERIES_ATTRIBUTES).iterator(chunk_size=100):
+        binary = {
+            f"{attribute}_binary": encode_series(json.loads(value or "[]"))
+            for attribute, value in zip(TIME_SERIES_ATTRIBUTES, values)
+        }
+        Traces.objects.filter(pk=pk).update(**binary)
+
+
+def binary_to_json(apps, schema_editor):
+    Traces = apps.get_model("wkz", "Traces")
+    binary_attributes = [f"{attribute}_binary" for attribute in TIME_SERIES_ATTRIBUTES]
+    for pk, *values in Traces.objects.values_list("pk", *binary_attributes).iterator(chunk_size=100):
+        json_values = {
+            attribute: json.dumps(series_to_list(decode_series(value)))
+            for attribute, value in zip(TIME_SERIES_ATTRIBUTES, values)
+        }
+        Traces.objects.filter(pk=pk).update(**json_values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wkz", "0016_fileindex"),
+    ]
+
+    operations = (
+        [
+            migrations.AddField(
+                model_name="traces",
+                name=f"{attribute}_binary",
+                field=models.BinaryField(default=b""),
+            )
+            for attribute in TIME_SERIES_ATTRIBUTES
+        ]
+        + [migrations.RunPython(json_to_binary, binary_to_json)]
+        + [migrations.RemoveField(model_name="traces", name=attribute) for attribute in TIME_SERIES_ATTRIBUTES]
+        + [
+            migrations.RenameField(model_name="traces", old_name=f"{attribute}_binary", new_name=attribute)
+            for attribute in TIME_SERIES_ATTRIBUTES
+        ]
+    )
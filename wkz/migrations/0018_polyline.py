@@ -0,0 +1,60 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+from wkz.gis.geo import get_simplified_polylines
+from wkz.tools.series import decode_series, encode_series
+
+# tolerances of configuration.polyline_tolerances at the time of this migration
+POLYLINE_TOLERANCES = [2, 10, 50]
+
+
+def create_polylines(apps, schema_editor):
+    Traces = apps.get_model("wkz", "Traces")
+    Polyline = apps.get_model("wkz", "Polyline")
+    traces = Traces.objects.exclude(latitude_list=b"").values_list("pk", "longitude_list", "latitude_list")
+    for pk, longitude_list, latitude_list in traces.iterator(chunk_size=100):
+        polylines = get_simplified_polylines(
+            decode_series(longitude_list), decode_series(latitude_list), POLYLINE_TOLERANCES
+        )
+        Polyline.objects.bulk_create(
+            [
+                Polyline(
+                    trace_id=pk,
+                    tolerance=tolerance,
+                    number_of_points=len(longitudes),
+                    longitude_list=encode_series(longitudes),
+                    latitude_list=encode_series(latitudes),
+                )
+                for tolerance, (longitudes, latitudes) in polylines.items()
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wkz", "0017_traces_binary_time_series"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Polyline",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("tolerance", models.FloatField()),
+                ("number_of_points", models.IntegerField()),
+                ("latitude_list", models.BinaryField(default=b"")),
+                ("longitude_list", models.BinaryField(default=b"")),
+                (
+                    "trace",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="polylines", to="wkz.traces"
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("trace", "tolerance")},
+            },
+        ),
+        migrations.RunPython(create_polylines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations, models
+
+from wkz.tools.series import decode_series
+
+
+def add_bounding_boxes(apps, schema_editor):
+    Polyline = apps.get_model("wkz", "Polyline")
+    for polyline in Polyline.objects.iterator(chunk_size=100):
+        latitudes = decode_series(polyline.latitude_list)
+        longitudes = decode_series(polyline.longitude_list)
+        if len(latitudes) == 0:
+            continue
+        Polyline.objects.filter(pk=polyline.pk).update(
+            min_latitude=latitudes.min(),
+            max_latitude=latitudes.max(),
+            min_longitude=longitudes.min(),
+            max_longitude=longitudes.max(),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wkz", "0018_polyline"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="polyline",
+            name=field,
+            field=models.FloatField(blank=True, null=True),
+        )
+        for field in ["min_latitude", "max_latitude", "min_longitude", "max_longitude"]
+    ] + [migrations.RunPython(add_bounding_boxes, migrations.RunPython.noop)]
@@ -0,0 +1,68 @@
+import datetime
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def create_daily_summaries(apps, schema_editor):
+    Activity = apps.get_model("wkz", "Activity")
+    DailySummary = apps.get_model("wkz", "DailySummary")
+    totals = (
+        Activity.objects.annotate(day=TruncDate("date"))
+        .values("user_id", "sport_id", "day")
+        .annotate(
+            count=models.Count("pk"),
+            duration=models.Sum("duration"),
+            distance=models.Sum("distance"),
+            calories=models.Sum(Coalesce("calories", "trace_file__calories")),
+            ascent=models.Sum("trace_file__total_ascent"),
+        )
+        .order_by()
+    )
+    DailySummary.objects.bulk_create([DailySummary(**row) for row in totals], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("wkz", "0019_polyline_bounding_box"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailySummary",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("day", models.DateField()),
+                ("count", models.IntegerField(default=0)),
+                ("duration", models.DurationField(default=datetime.timedelta(0))),
+                ("distance", models.FloatField(blank=True, null=True)),
+                ("calories", models.IntegerField(blank=True, null=True)),
+                ("ascent", models.IntegerField(blank=True, null=True)),
+                (
+                    "sport",
+                    models.ForeignKey(
+                        blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to="wkz.sport"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="dailysummary",
+            index=models.Index(fields=["user", "day"], name="wkz_dailysu_user_id_d2e305_idx"),
+        ),
+        migrations.AlterUniqueTogether(
+            name="dailysummary",
+            unique_together={("user", "sport", "day")},
+        ),
+        migrations.RunPython(create_daily_summaries, migrations.RunPython.noop),
+    ]
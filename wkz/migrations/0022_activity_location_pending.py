@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wkz", "0021_geocode_cache"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="activity",
+            name="location_pending",
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
@@ -0,0 +1,47 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wkz", "0022_activity_location_pending"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportRun",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("started", models.DateTimeField(default=django.utils.timezone.now)),
+                ("duration", models.FloatField()),
+                ("reimporting", models.BooleanField(default=False)),
+                ("workers", models.IntegerField(default=1)),
+                ("number_of_files", models.IntegerField(default=0)),
+                ("number_of_imported", models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ImportStage",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("position", models.IntegerField()),
+                ("name", models.CharField(max_length=20)),
+                ("wall_time", models.FloatField(default=0.0)),
+                ("cpu_time", models.FloatField(default=0.0)),
+                ("items", models.IntegerField(default=0)),
+                ("failures", models.IntegerField(default=0)),
+                (
+                    "run",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="stages", to="wkz.importrun"
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["position"],
+                "unique_together": {("run", "name")},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wkz", "0023_import_run"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="activity",
+            name="location_attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="activity",
+            name="location_retry",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,20 +1,32 @@
 import datetime
 import logging
 import os
+import threading
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Iterable, Iterator, Tuple
 
+import numpy as np
 from colorfield.fields import ColorField
 from django.contrib.auth.models import User
-from django.db import models
+from django.core.exceptions import FieldError, ValidationError
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, TruncDate
 from django.template.defaultfilters import slugify
 from django.utils import timezone
 
+from wkz import configuration
+from wkz.gis.heatmap import invalidate_tiles
 from wkz.io.file_importer import run_importer
 from wkz.tools import sse
+from wkz.tools.series import decode_series
 from workoutizer import settings as django_settings
 
 log = logging.getLogger(__name__)
 
+# traces whose heatmap tiles are invalidated once the current thread stops deferring, see deferred_heatmap_invalidation
+_deferred_heatmap_traces = threading.local()
+
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -111,6 +123,14 @@ class Sport(models.Model):
         self.slug = slugify(self.name)
         super(Sport, self).save(*args, **kwargs)
 
+    def delete(self, *args, **kwargs):
+        # activities of the sport are kept without sport, thus their daily summaries need to be moved too
+        days = list(DailySummary.objects.filter(sport=self).values_list("user_id", "day"))
+        super(Sport, self).delete(*args, **kwargs)
+        for user_id, day in days:
+            update_daily_summary(user_id, None, day)
+        invalidate_tile_metrics_on_commit()
+
 
 class Traces(models.Model):
     def __str__(self):
@@ -121,31 +141,31 @@ class Traces(models.Model):
     md5sum = models.CharField(max_length=32, unique=True)
     calories = models.IntegerField(null=True, blank=True)
     # coordinates
-    latitude_list = models.CharField(max_length=10000000000, default="[]")
-    longitude_list = models.CharField(max_length=10000000000, default="[]")
+    latitude_list = models.BinaryField(default=b"")
+    longitude_list = models.BinaryField(default=b"")
     # distance
-    distance_list = models.CharField(max_length=10000000000, default="[]")
+    distance_list = models.BinaryField(default=b"")
     # elevation
-    altitude_list = models.CharField(max_length=10000000000, default="[]")
+    altitude_list = models.BinaryField(default=b"")
     max_altitude = models.FloatField(blank=True, null=True)
     min_altitude = models.FloatField(blank=True, null=True)
     # heart rate
-    heart_rate_list = models.CharField(max_length=10000000000, default="[]")
+    heart_rate_list = models.BinaryField(default=b"")
     avg_heart_rate = models.IntegerField(null=True, blank=True)
     max_heart_rate = models.IntegerField(null=True, blank=True)
     min_heart_rate = models.IntegerField(null=True, blank=True)
     # cadence
-    cadence_list = models.CharField(max_length=10000000000, default="[]")
+    cadence_list = models.BinaryField(default=b"")
     avg_cadence = models.IntegerField(null=True, blank=True)
     max_cadence = models.IntegerField(null=True, blank=True)
     min_cadence = models.IntegerField(null=True, blank=True)
     # speed
-    speed_list = models.CharField(max_length=10000000000, default="[]")
+    speed_list = models.BinaryField(default=b"")
     avg_speed = models.FloatField(null=True, blank=True)
     max_speed = models.FloatField(null=True, blank=True)
     min_speed = models.FloatField(null=True, blank=True)
     # temperature
-    temperature_list = models.CharField(max_length=10000000000, default="[]")
+    temperature_list = models.BinaryField(default=b"")
     avg_temperature = models.FloatField(null=True, blank=True)
     max_temperature = models.FloatField(null=True, blank=True)
     min_temperature = models.FloatField(null=True, blank=True)
@@ -153,7 +173,7 @@ class Traces(models.Model):
     aerobic_training_effect = models.FloatField(blank=True, null=True)
     anaerobic_training_effect = models.FloatField(blank=True, null=True)
     # timestamps
-    timestamps_list = models.CharField(max_length=10000000000, default="[]")
+    timestamps_list = models.BinaryField(default=b"")
     # total ascent/descent
     total_ascent = models.IntegerField(null=True, blank=True)
     total_descent = models.IntegerField(null=True, blank=True)
@@ -165,6 +185,229 @@ class Traces(models.Model):
         self.file_name = os.path.basename(self.path_to_file)
         super(Traces, self).save()
 
+    def get_series(self, attribute: str) -> np.ndarray:
+        """
+        Returns the values of the given time series attribute, e.g. 'heart_rate_list', as numpy array. Time series are
+        stored in binary form, see wkz.tools.series. Missing values are NaN.
+        """
+        if attribute not in configuration.time_series_attributes:
+            raise ValueError(f"{attribute} is not a time series attribute")
+        return decode_series(getattr(self, attribute))
+
+    @property
+    def has_coordinates(self) -> bool:
+        return bool(self.latitude_list) and bool(self.longitude_list)
+
+
+class Polyline(models.Model):
+    """
+    Contains simplified versions of the coordinates of a trace, one per tolerance (the maximum deviation in meters from
+    the original trace) configured in `configuration.polyline_tolerances`. Polylines are computed at import time, such
+    that maps showing many activities neither need to decode nor to downsample the coordinates of each activity.
+    """
+
+    def __str__(self):
+        return f"{self.trace} ({self.tolerance}m)"
+
+    trace = models.ForeignKey(Traces, on_delete=models.CASCADE, related_name="polylines")
+    tolerance = models.FloatField()
+    number_of_points = models.IntegerField()
+    latitude_list = models.BinaryField(default=b"")
+    longitude_list = models.BinaryField(default=b"")
+    # bounding box, used to only fetch the traces visible on a map
+    min_latitude = models.FloatField(blank=True, null=True)
+    max_latitude = models.FloatField(blank=True, null=True)
+    min_longitude = models.FloatField(blank=True, null=True)
+    max_longitude = models.FloatField(blank=True, null=True)
+
+    class Meta:
+        unique_together = ["trace", "tolerance"]
+
+    def get_coordinates(self) -> Tuple[np.ndarray, np.ndarray]:
+        return decode_series(self.longitude_list), decode_series(self.latitude_list)
+
+
+class FileIndex(models.Model):
+    """
+    Contains the md5sum of every activity file found in the traces dir together with the stat values (size,
+    modification time and inode) of the file at the time it was hashed. This allows the file importer to only compute
+    the md5sum of files which actually changed.
+    """
+
+    def __str__(self):
+        return self.path
+
+    path = models.CharField(max_length=1000, unique=True)
+    size = models.BigIntegerField()
+    mtime_ns = models.BigIntegerField()
+    inode = models.BigIntegerField()
+    md5sum = models.CharField(max_length=32)
+
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+
+class GeocodeCache(models.Model):
+    """
+    Contains the location names activities are automatically named after, keyed by the cell of their start coordinate,
+    see wkz.gis.geocode_cache. This way activities starting at the same place only get geocoded once.
+    """
+
+    def __str__(self):
+        return f"{self.cell}: {self.name}"
+
+    cell = models.CharField(max_length=50, unique=True)
+    name = models.CharField(max_length=200, blank=True, null=True)
+    created = models.DateTimeField(default=timezone.now)
+    last_used = models.DateTimeField(default=timezone.now, db_index=True)
+
+
+class ImportRun(models.Model):
+    """
+    Contains the history of the runs of the file importer, which parsed at least one file. The time spent in each
+    stage of the importer is stored as ImportStage, to see which stage is worth to be scaled, see
+    wkz.io.import_profile. Only the latest `import_runs_to_keep` runs are kept.
+    """
+
+    def __str__(self):
+        return f"{self.started}: {self.number_of_imported}/{self.number_of_files} files"
+
+    started = models.DateTimeField(default=timezone.now)
+    duration = models.FloatField()
+    reimporting = models.BooleanField(default=False)
+    workers = models.IntegerField(default=1)
+    number_of_files = models.IntegerField(default=0)
+    number_of_imported = models.IntegerField(default=0)
+
+
+class ImportStage(models.Model):
+    def __str__(self):
+        return f"{self.run} - {self.name}"
+
+    run = models.ForeignKey(ImportRun, on_delete=models.CASCADE, related_name="stages")
+    position = models.IntegerField()
+    name = models.CharField(max_length=20)
+    wall_time = models.FloatField(default=0.0)
+    cpu_time = models.FloatField(default=0.0)
+    items = models.IntegerField(default=0)
+    failures = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ["position"]
+        unique_together = ["run", "name"]
+
+
+def invalidate_heatmap_tiles_of_trace(trace_id: int) -> None:
+    """
+    Deletes the cached heatmap tiles the given trace passes through, once the current transaction is committed. While
+    invalidation is deferred (see `deferred_heatmap_invalidation`), the trace is only collected.
+    """
+    if trace_id is None:
+        return
+    trace_ids = getattr(_deferred_heatmap_traces, "trace_ids", None)
+    if trace_ids is not None:
+        trace_ids.add(trace_id)
+        return
+    invalidate_heatmap_tiles_of_traces([trace_id])
+
+
+def invalidate_heatmap_tiles_of_traces(trace_ids: Iterable[int]) -> None:
+    """
+    Deletes the cached heatmap tiles the given traces pass through, once the current transaction is committed. The
+    bounding boxes of all traces are queried at once and the tile cache is only scanned once.
+    """
+    trace_ids = list(trace_ids)
+    if not trace_ids:
+        return
+    bounds = (
+        Polyline.objects.filter(trace_id__in=trace_ids)
+        .values("trace_id")
+        .annotate(
+            west=models.Min("min_longitude"),
+            south=models.Min("min_latitude"),
+            east=models.Max("max_longitude"),
+            north=models.Max("max_latitude"),
+        )
+    )
+    bounding_boxes = [(box["west"], box["south"], box["east"], box["north"]) for box in bounds]
+    if bounding_boxes:
+        transaction.on_commit(lambda: invalidate_tiles(django_settings.HEATMAP_TILES_DIR, *bounding_boxes))
+
+
+@contextmanager
+def deferred_heatmap_invalidation() -> Iterator[None]:
+    """
+    Collects the traces whose heatmap tiles are to be invalidated within the context and invalidates all of them at
+    once when the context is left, e.g. to scan the tile cache once per import run rather than once per activity.
+    Nested contexts are part of the outermost one.
+    """
+    if getattr(_deferred_heatmap_traces, "trace_ids", None) is not None:
+        yield
+        return
+    _deferred_heatmap_traces.trace_ids = set()
+    try:
+        yield
+    finally:
+        trace_ids = _deferred_heatmap_traces.trace_ids
+        _deferred_heatmap_traces.trace_ids = None
+        invalidate_heatmap_tiles_of_traces(trace_ids)
+
+
+def _get_day(date: datetime.datetime) -> datetime.date:
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return timezone.localdate(date)
+
+
+def update_daily_summary(user_id: int, sport_id: int, day: datetime.date) -> None:
+    """
+    Recomputes the daily summary of the given user, sport and day from the activities of that day, deleting the summary
+    in case there are no activities left. Only the activities of a single day are aggregated, such that keeping the
+    summaries up to date does not get more expensive with a growing history.
+    """
+    totals = Activity.objects.filter(user_id=user_id, sport_id=sport_id, date__date=day).aggregate(
+        count=models.Count("pk"),
+        duration=models.Sum("duration"),
+        distance=models.Sum("distance"),
+        calories=models.Sum(Coalesce("calories", "trace_file__calories")),
+        ascent=models.Sum("trace_file__total_ascent"),
+    )
+    if totals["count"]:
+        DailySummary.objects.update_or_create(user_id=user_id, sport_id=sport_id, day=day, defaults=totals)
+    else:
+        DailySummary.objects.filter(user_id=user_id, sport_id=sport_id, day=day).delete()
+
+
+def rebuild_daily_summaries() -> None:
+    """
+    Recomputes the daily summaries of all activities, required only after activities got modified without calling
+    their save or delete method, e.g. by `QuerySet.update`.
+    """
+    totals = (
+        Activity.objects.annotate(day=TruncDate("date"))
+        .values("user_id", "sport_id", "day")
+        .annotate(
+            count=models.Count("pk"),
+            duration=models.Sum("duration"),
+            distance=models.Sum("distance"),
+            calories=models.Sum(Coalesce("calories", "trace_file__calories")),
+            ascent=models.Sum("trace_file__total_ascent"),
+        )
+        .order_by()
+    )
+    with transaction.atomic():
+        DailySummary.objects.all().delete()
+        DailySummary.objects.bulk_create([DailySummary(**row) for row in totals])
+
+
+def invalidate_tile_metrics_on_commit() -> None:
+    """
+    Invalidates the cached metrics of all tiles, once the current transaction is committed.
+    """
+    from wkz.utils.tile_metrics import invalidate_tile_metrics
+
+    transaction.on_commit(invalidate_tile_metrics)
+
 
 def default_sport(return_pk: bool = True):
     # Return None to handle in model field default
@@ -185,6 +428,11 @@ class Activity(models.Model):
     trace_file = models.ForeignKey(Traces, on_delete=models.CASCADE, blank=True, null=True)
     is_demo_activity = models.BooleanField(verbose_name="Is this a Demo Activity", default=False)
     evaluates_for_awards = models.BooleanField(verbose_name="Consider Activity for Awards", default=True)
+    # the location is added to the automatic name in the background after the import, see wkz.io.auto_naming
+    location_pending = models.BooleanField(default=False, db_index=True)
+    # failed attempts to look up the location and when to try again, see geocoding_retry_delay
+    location_attempts = models.PositiveSmallIntegerField(default=0)
+    location_retry = models.DateTimeField(blank=True, null=True)
     
     # Enhanced fields for Strava import and richer data
     external_id = models.CharField(max_length=100, blank=True, null=True, verbose_name="External ID", 
@@ -208,7 +456,33 @@ class Activity(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    def save(self, *args, **kwargs):
+        previous = (
+            Activity.objects.filter(pk=self.pk).values("user_id", "sport_id", "date", "trace_file_id").first()
+            if self.pk
+            else None
+        )
+        super(Activity, self).save(*args, **kwargs)
+        # heatmap tiles show the traces per user and sport, thus e.g. renaming an activity does not affect them
+        heatmap_key = (self.user_id, self.sport_id, self.trace_file_id)
+        if previous is None or (previous["user_id"], previous["sport_id"], previous["trace_file_id"]) != heatmap_key:
+            invalidate_heatmap_tiles_of_trace(self.trace_file_id)
+            if previous and previous["trace_file_id"] != self.trace_file_id:
+                invalidate_heatmap_tiles_of_trace(previous["trace_file_id"])
+        # the activity might also have moved from one daily summary to another
+        key = (self.user_id, self.sport_id, _get_day(self.date))
+        update_daily_summary(*key)
+        if previous:
+            previous_key = (previous["user_id"], previous["sport_id"], _get_day(previous["date"]))
+            if previous_key != key:
+                update_daily_summary(*previous_key)
+        invalidate_tile_metrics_on_commit()
+
     def delete(self, *args, **kwargs):
+        # the polylines of the trace are deleted along with the activity, thus its tiles cannot be deferred
+        if self.trace_file_id is not None:
+            invalidate_heatmap_tiles_of_traces([self.trace_file_id])
+        summary = Activity.objects.filter(pk=self.pk).values("user_id", "sport_id", "date").first()
         if self.trace_file:
             self.trace_file.delete()
             log.debug(f"deleted trace object {self.trace_file}")
@@ -216,6 +490,9 @@ class Activity(models.Model):
                 os.remove(self.trace_file.path_to_file)
                 log.debug(f"deleted trace file also: {self.name}")
         super(Activity, self).delete(*args, **kwargs)
+        if summary:
+            update_daily_summary(summary["user_id"], summary["sport_id"], _get_day(summary["date"]))
+        invalidate_tile_metrics_on_commit()
         log.debug(f"deleted activity: {self.name}")
 
     @property
@@ -235,6 +512,30 @@ class Activity(models.Model):
         unique_together = ['external_id', 'external_source', 'user']  # Prevent duplicate imports
 
 
+class DailySummary(models.Model):
+    """
+    Totals of the activities of one user and sport per day in the configured time zone. The summaries are updated
+    whenever an activity is saved or deleted and are used by the plots and summaries of the dashboard, which thereby
+    only need to aggregate one row per day and sport instead of all activities.
+    """
+
+    def __str__(self):
+        return f"{self.day} {self.sport}: {self.count}"
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    sport = models.ForeignKey(Sport, on_delete=models.CASCADE, null=True, blank=True)
+    day = models.DateField()
+    count = models.IntegerField(default=0)
+    duration = models.DurationField(default=datetime.timedelta(0))
+    distance = models.FloatField(blank=True, null=True)
+    calories = models.IntegerField(blank=True, null=True)
+    ascent = models.IntegerField(blank=True, null=True)
+
+    class Meta:
+        unique_together = ["user", "sport", "day"]
+        indexes = [models.Index(fields=["user", "day"])]
+
+
 class ActivityPhoto(models.Model):
     """Model for storing activity photos"""
     activity = models.ForeignKey(Activity, on_delete=models.CASCADE, related_name='photos')
@@ -421,6 +722,14 @@ class MetricTile(models.Model):
     def __str__(self):
         return f"{self.name} ({self.key})"
 
+    def clean(self):
+        # the data field ends up in an aggregate over the activities, see wkz.utils.tile_metrics
+        if self.metric_type in ("total", "average", "max", "min", "trend"):
+            try:
+                Activity.objects.values(self.data_field)
+            except FieldError:
+                raise ValidationError({"data_field": f"'{self.data_field}' is not a field of activities."})
+
 
 class SportTileConfiguration(models.Model):
     """Configures which tiles are displayed for specific sports"""
@@ -2,7 +2,6 @@ import datetime
 import logging
 
 import pandas as pd
-import pytz
 from bokeh.embed import components
 from bokeh.models import HoverTool
 from bokeh.plotting import figure
@@ -14,24 +13,23 @@ from workoutizer import settings as django_settings
 log = logging.getLogger(__name__)
 
 
-def _plot_activities(activities, sport_model, number_of_days):
-    df = pd.DataFrame(list(activities.values("name", "sport", "date", "duration")))
+def _plot_activities(daily_summaries, sport_model, number_of_days):
+    df = pd.DataFrame(list(daily_summaries.values("sport", "day", "duration"))).rename(columns={"day": "date"})
     sports = sport_model.objects.filter(id__in=df["sport"].unique())
     colors = []
     for sport in sports:
         df[sport.name] = df.loc[df["sport"] == sport.id, "duration"]  # add duration of sports in new column each
         colors.append(sport.color)
 
-    df.drop(columns=["sport", "duration", "name"], inplace=True)
-    today = timezone.now().replace(tzinfo=pytz.timezone(django_settings.TIME_ZONE))
+    df.drop(columns=["sport", "duration"], inplace=True)
+    today = timezone.localdate()
     if number_of_days < 9999:
         start = today - datetime.timedelta(days=number_of_days)
     else:
-        start = df["date"].min().replace(tzinfo=pytz.timezone(django_settings.TIME_ZONE))
-    date_range = pd.DataFrame({"date": pd.date_range(start=start, end=today, tz=django_settings.TIME_ZONE)})
+        start = df["date"].min()
+    date_range = pd.DataFrame({"date": pd.date_range(start=start, end=today).date})
     df = pd.concat([df, date_range], sort=True)
 
-    df["date"] = pd.to_datetime(df["date"], utc=True).dt.date
     df = df.groupby("date", as_index=False).sum()  # group date duplicates to ensure actual stacking of vbars
     df["date_formatted"] = df["date"].astype(str)
     df.fillna(value=pd.Timedelta(seconds=0), inplace=True)
@@ -72,10 +70,10 @@ def _plot_activities(activities, sport_model, number_of_days):
     return p
 
 
-def plot_history(activities, sport_model, number_of_days):
+def plot_history(daily_summaries, sport_model, number_of_days):
     try:
         script, div = components(
-            _plot_activities(activities=activities, sport_model=sport_model, number_of_days=number_of_days)
+            _plot_activities(daily_summaries=daily_summaries, sport_model=sport_model, number_of_days=number_of_days)
         )
     except AttributeError and TypeError and ValueError as e:
         log.warning(f"Could not render plot. Check if activity data is correct: {e}", exc_info=True)
@@ -1,18 +1,20 @@
 import logging
 from typing import List, Tuple
 
-log = logging.getLogger(__name__)
+from django.db.models import Sum
 
+log = logging.getLogger(__name__)
 
-def plot_pie_chart(activities) -> Tuple[List[int], List[str], List[str]]:
-    sport_distribution = {}
-    color_list = []
-    for activity in activities:
-        sport_distribution[activity.sport.name] = 0
-        if activity.sport.color not in color_list:
-            color_list.append(activity.sport.color)
-    for activity in activities:
-        if activity.sport.name in sport_distribution:
-            sport_distribution[activity.sport.name] += 1
 
-    return list(sport_distribution.values()), list(sport_distribution.keys()), color_list
+def plot_pie_chart(daily_summaries) -> Tuple[List[int], List[str], List[str]]:
+    sport_distribution = (
+        daily_summaries.exclude(sport=None)
+        .values("sport__name", "sport__color")
+        .annotate(count=Sum("count"))
+        .order_by("sport__name")
+    )
+    return (
+        [sport["count"] for sport in sport_distribution],
+        [sport["sport__name"] for sport in sport_distribution],
+        [sport["sport__color"] for sport in sport_distribution],
+    )
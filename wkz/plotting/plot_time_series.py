@@ -1,6 +1,7 @@
-import json
+import threading
+from collections import OrderedDict
 from itertools import combinations
-from typing import List, Tuple
+from typing import Hashable, List, Tuple
 
 import pandas as pd
 from bokeh.embed import components
@@ -8,6 +9,7 @@ from bokeh.layouts import column, gridplot
 from bokeh.models import BoxZoomTool, CheckboxButtonGroup, ColumnDataSource, CrosshairTool, CustomJS, HoverTool
 from bokeh.models.formatters import DatetimeTickFormatter
 from bokeh.plotting import figure
+from django.db.models import Count, Max
 
 from wkz import configuration as cfg
 from wkz import models
@@ -44,7 +46,45 @@ plot_matrix = {
 }
 
 
+# rendered plots by trace and its version, ordered from least to most recently used
+_cached_plots: "OrderedDict[Hashable, Tuple[str, str, int]]" = OrderedDict()
+_cached_plots_lock = threading.Lock()
+
+
+def _get_cache_key(trace: models.Traces) -> Hashable:
+    """
+    Returns the key of the cached plots of the given trace. The key changes whenever the plots might change, i.e. the
+    trace got reimported (which saves the trace and recreates its laps) or the label of a lap got edited. Outdated
+    plots are thus never served, even if the trace was modified by another process, and get evicted eventually.
+    """
+    laps = models.Lap.objects.filter(trace=trace).aggregate(count=Count("pk"), updated=Max("updated"))
+    return trace.pk, trace.md5sum, trace.updated, laps["count"], laps["updated"]
+
+
 def plot_time_series(activity: models.Activity) -> Tuple[str, str, int]:
+    """
+    Returns the time series plots of the given activity, see `_plot_time_series`. Building the plots is costly and
+    their output only depends on the trace and its laps, so the most recently used plots are cached.
+    """
+    key = _get_cache_key(activity.trace_file)
+    with _cached_plots_lock:
+        if key in _cached_plots:
+            _cached_plots.move_to_end(key)
+            return _cached_plots[key]
+    plots = _plot_time_series(activity)
+    with _cached_plots_lock:
+        _cached_plots[key] = plots
+        while len(_cached_plots) > cfg.time_series_plot_cache_size:
+            _cached_plots.popitem(last=False)
+    return plots
+
+
+def clear_cached_time_series_plots() -> None:
+    with _cached_plots_lock:
+        _cached_plots.clear()
+
+
+def _plot_time_series(activity: models.Activity) -> Tuple[str, str, int]:
     """
     Plotting function to create the time series plots shown in tha activity page. Depending
     on what data is available this creates the following plots:
@@ -67,22 +107,21 @@ def plot_time_series(activity: models.Activity) -> Tuple[str, str, int]:
         and the third element in the tuple is the number of plots to be rendered
     """
 
-    attributes = activity.trace_file.__dict__
+    trace = activity.trace_file
     lap_data = models.Lap.objects.filter(trace=activity.trace_file)
     plots = []
     lap_lines = {}
 
-    timestamps = pd.to_datetime(
-        pd.Series(json.loads(attributes["timestamps_list"]), dtype=float).iloc[:: cfg.every_nth_value], unit="s"
-    )
+    timestamps = pd.to_datetime(pd.Series(trace.get_series("timestamps_list")).iloc[:: cfg.every_nth_value], unit="s")
     x_axis = pd.to_datetime(timestamps).dt.tz_localize("utc").dt.tz_convert(django_settings.TIME_ZONE)
     x_axis = x_axis - x_axis.min()
     source = ColumnDataSource(data={"x_axis": x_axis, "x_formatted": x_axis.dt.to_pytimedelta().astype(str)})
 
     box_zoom_tool = BoxZoomTool(dimensions="width")
-    for y_axis, values in attributes.items():
+    # iterate over the fields of the trace model to keep the order of plots in line with the model
+    for y_axis in [field.name for field in trace._meta.fields]:
         if y_axis in cfg.attributes_to_create_time_series_plot_for:
-            values = pd.Series(json.loads(values), dtype=float).iloc[:: cfg.every_nth_value]
+            values = pd.Series(trace.get_series(y_axis)).iloc[:: cfg.every_nth_value]
             y_axis = y_axis.replace("_list", "")
             if values.any():
                 if y_axis == "speed":
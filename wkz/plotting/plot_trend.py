@@ -7,10 +7,10 @@ from wkz import models
 from wkz.tools.style import font
 
 
-def plot_trend(activities, sport_model):
+def plot_trend(daily_summaries, sport_model):
     number_of_days = models.get_settings().number_of_days
 
-    df = pd.DataFrame.from_records(activities.values("sport_id", "duration", "date"))
+    df = pd.DataFrame.from_records(daily_summaries.values("sport_id", "duration", "day")).rename(columns={"day": "date"})
     df["date"] = pd.to_datetime(df["date"])
     df = df.set_index("date")
     days = int(number_of_days / 5)
@@ -1,52 +1,35 @@
-import datetime
 import logging
+from typing import Tuple
 
 import pandas as pd
 from bokeh.embed import components
 from bokeh.models import FuncTickFormatter, HoverTool, LinearAxis, Range1d
 from bokeh.plotting import figure
+from django.db.models import Min, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
 
-from wkz import models
 from wkz.tools.style import Style
 
 log = logging.getLogger(__name__)
 
 
-def plot_workload(activity_model: models.Activity):
-    df = pd.DataFrame(list(activity_model.objects.all().values("distance", "duration", "date")))
+def plot_workload(daily_summaries):
+    """
+    Plots duration and distance of the given daily summaries per week or month, depending on the time span they cover.
 
-    duration_df = df[["date", "duration"]]
-    distance_df = df[["date", "distance"]]
+    Parameters
+    ----------
+    daily_summaries : QuerySet
+        daily summaries to plot, e.g. the ones of a user within the selected time window
 
-    first_date = df["date"].dt.tz_localize(None).min()
-    time_diff_since_fist_date = pd.Timestamp(datetime.datetime.now()) - first_date
-    aggregated_by = _determine_grouping_invterval(time_diff_since_fist_date)
-
-    if aggregated_by == "Weeks":
-        df = duration_df.groupby(pd.Grouper(freq="W", key="date")).sum().reset_index().sort_values("date")
-        df["distance"] = (
-            distance_df.groupby(pd.Grouper(freq="W", key="date")).sum().reset_index().sort_values("date")["distance"]
-        )
-        del distance_df
-        del duration_df
-        g = df.groupby(pd.Grouper(freq="W", key="date"))["date"]
-        df["week_begin"] = g.transform("first").dt.date
-        df["week_end"] = df["week_begin"] + pd.Timedelta(days=7)
-        df["x_axis_formatted"] = df["week_begin"].astype(str) + " - " + df["week_end"].astype(str)
-    elif aggregated_by == "Months":
-        df = duration_df.groupby(pd.Grouper(freq="M", key="date")).sum().reset_index().sort_values("date")
-        df["distance"] = (
-            distance_df.groupby(pd.Grouper(freq="M", key="date")).sum().reset_index().sort_values("date")["distance"]
-        )
-        del distance_df
-        del duration_df
-        g = df.groupby(pd.Grouper(freq="M", key="date"))["date"]
-        df["x_axis_formatted"] = (
-            g.transform("first").dt.month_name().astype(str) + " " + g.transform("first").dt.year.astype(str)
-        )
-    df["x_axis"] = g.transform("first").dt.date
-
-    df.drop(columns="date", inplace=True)
+    Returns
+    -------
+    script, div, aggregated_by : tuple(str, str, str)
+        the html script and div elements used to render the plot and whether the data got aggregated by "Weeks" or
+        "Months"
+    """
+    df, aggregated_by = _get_workload(daily_summaries)
     df["duration_formatted"] = df["duration"].dt.to_pytimedelta().astype(str)
 
     p = figure(
@@ -126,6 +109,41 @@ def plot_workload(activity_model: models.Activity):
     return script, div, aggregated_by
 
 
+def _get_workload(daily_summaries) -> Tuple[pd.DataFrame, str]:
+    """
+    Sums up duration and distance of the given daily summaries per week or month. The summaries are truncated and
+    summed up by the database, such that only one row per week or month needs to be loaded.
+    """
+    first_date = daily_summaries.aggregate(first_day=Min("day"))["first_day"]
+    time_diff_since_fist_date = pd.Timestamp(timezone.localdate()) - pd.Timestamp(first_date)
+    aggregated_by = _determine_grouping_invterval(time_diff_since_fist_date)
+
+    truncate, frequency = (TruncWeek, "W-MON") if aggregated_by == "Weeks" else (TruncMonth, "MS")
+    rows = (
+        daily_summaries.annotate(period=truncate("day"))
+        .values("period")
+        .annotate(total_duration=Sum("duration"), total_distance=Sum("distance"))
+        .order_by("period")
+    )
+    df = pd.DataFrame.from_records(rows, columns=["period", "total_duration", "total_distance"])
+    df = df.rename(columns={"total_duration": "duration", "total_distance": "distance"})
+    # weeks or months without any activity are not returned by the database, but should be plotted as zero
+    df = df.set_index(pd.to_datetime(df["period"])).drop(columns="period")
+    df = df.reindex(pd.date_range(start=df.index.min(), end=df.index.max(), freq=frequency))
+    df["duration"] = pd.to_timedelta(df["duration"]).fillna(pd.Timedelta(seconds=0))
+    df["distance"] = df["distance"].fillna(0)
+    begin = df.index.to_series()
+
+    if aggregated_by == "Weeks":
+        df["x_axis_formatted"] = (
+            begin.dt.date.astype(str) + " - " + (begin + pd.Timedelta(days=6)).dt.date.astype(str)
+        ).values
+    else:
+        df["x_axis_formatted"] = (begin.dt.month_name() + " " + begin.dt.year.astype(str)).values
+    df["x_axis"] = begin.dt.date.values
+    return df.reset_index(drop=True), aggregated_by
+
+
 def _determine_grouping_invterval(time_diff: pd.Timedelta) -> str:
     if time_diff > pd.Timedelta(weeks=20):
         aggregated_by = "Months"
@@ -58,6 +58,7 @@ class SportsView(View):
 
 class SportView(MapView, PlotView):
     template_name = "sport/sport.html"
+    load_traces_lazily = True
 
     def get(self, request, sports_name_slug):
         log.debug(f"got sports name: {sports_name_slug}")
@@ -67,12 +68,13 @@ class SportView(MapView, PlotView):
             return HttpResponseRedirect(reverse("dashboard"))
         sport = models.Sport.objects.get(slug=sports_name_slug)
         activities = self.get_activity_data_for_plots(sport_id=sport.id)
+        daily_summaries = self.get_daily_summaries_for_plots(sport_id=sport.id)
         context = {}
         sports = models.Sport.objects.all().order_by("name")
         summary = get_summary_of_all_activities(sport_slug=sports_name_slug)
-        if activities:
+        if daily_summaries:
             script_history, div_history = plot_history(
-                activities=activities,
+                daily_summaries=daily_summaries,
                 sport_model=models.Sport,
                 number_of_days=settings.number_of_days,
             )
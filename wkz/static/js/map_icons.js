@@ -10,4 +10,30 @@ var redIcon = new L.Icon({
     iconSize: [18, 28],
     iconAnchor: [9, 28],
     popupAnchor: [1, -34],
-});
\ No newline at end of file
+});
+// decodes a polyline encoded by wkz.gis.geo.encode_polyline into a list of [lon, lat] coordinates (GeoJSON order)
+function decodePolyline(encoded, precision) {
+    const factor = Math.pow(10, precision);
+    const coordinates = [];
+    let index = 0;
+    let lat = 0;
+    let lon = 0;
+    while (index < encoded.length) {
+        const deltas = [0, 0];
+        for (let i = 0; i < 2; i++) {
+            let result = 0;
+            let shift = 0;
+            let chunk;
+            do {
+                chunk = encoded.charCodeAt(index++) - 63;
+                result += (chunk & 0x1f) * Math.pow(2, shift);
+                shift += 5;
+            } while (chunk >= 0x20);
+            deltas[i] = (result % 2) ? -(result + 1) / 2 : result / 2;
+        }
+        lat += deltas[0];
+        lon += deltas[1];
+        coordinates.push([lon / factor, lat / factor]);
+    }
+    return coordinates;
+}
@@ -1,9 +1,13 @@
+from typing import List
+
 from huey import crontab
-from huey.contrib.djhuey import periodic_task, task
+from huey.contrib.djhuey import on_startup, periodic_task, task
 
 from wkz import configuration as cfg
+from wkz import models
 from wkz.device.mount import mount_device_and_collect_files
-from wkz.watchdogs import trigger_device_watchdog, trigger_file_watchdog
+from wkz.io.auto_naming import add_location_to_names, get_next_location_retry
+from wkz.watchdogs import start_file_watcher, trigger_device_watchdog, trigger_file_watchdog
 
 
 @task()
@@ -11,6 +15,37 @@ def mount_device_and_collect_files_task():
     mount_device_and_collect_files()
 
 
+@task()
+def import_activity_files_task(paths: List[str] = None):
+    trigger_file_watchdog(paths)
+
+
+@task()
+def add_location_to_names_task():
+    # process one batch at a time, such that imports do not have to wait for all names to be completed
+    if add_location_to_names(models):
+        add_location_to_names_task()
+    else:
+        # activities whose lookup failed are tried again once their retry date is reached
+        retry = get_next_location_retry(models)
+        if retry is not None:
+            add_location_to_names_task.schedule(eta=retry)
+
+
+@on_startup()
+def start_file_watcher_next_to_consumer():
+    if cfg.watch_trace_dir and start_file_watcher(on_change=import_activity_files_task):
+        # import files which were added while workoutizer was not running
+        import_activity_files_task()
+
+
+@on_startup()
+def add_pending_locations_to_names():
+    # complete the names of activities imported while the consumer was not running, e.g. by 'wkz reimport'
+    if models.Activity.objects.filter(location_pending=True).exists():
+        add_location_to_names_task()
+
+
 @periodic_task(crontab(minute=f"*/{cfg.file_importer_interval}"))
 def check_for_mounted_device():
     trigger_device_watchdog()
@@ -18,4 +53,6 @@ def check_for_mounted_device():
 
 @periodic_task(crontab(minute=f"*/{cfg.file_collector_interval}"))
 def check_for_new_activity_files():
-    trigger_file_watchdog()
+    # scanning the whole trace dir is only required in case it is not watched for new files
+    if not cfg.watch_trace_dir:
+        trigger_file_watchdog()
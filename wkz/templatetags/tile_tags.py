@@ -1,12 +1,12 @@
 from django import template
-from wkz.utils.tile_metrics import calculate_tiles_for_sport
+from wkz.utils.tile_metrics import calculate_tiles_for_sport, get_tile_evaluator
 from wkz.models import Sport
 
 register = template.Library()
 
 
-@register.inclusion_tag('lib/configurable_tiles.html')
-def show_sport_tiles(sport, user=None, applies_to='all', days_limit=None):
+@register.inclusion_tag('lib/configurable_tiles.html', takes_context=True)
+def show_sport_tiles(context, sport, user=None, applies_to='all', days_limit=None):
     """Display configurable tiles for a sport"""
     if isinstance(sport, str):
         try:
@@ -22,7 +22,8 @@ def show_sport_tiles(sport, user=None, applies_to='all', days_limit=None):
         sport=sport,
         user=user,
         applies_to=applies_to,
-        days_limit=days_limit
+        days_limit=days_limit,
+        evaluator=get_tile_evaluator(context.get('request'))
     )
     
     return {
@@ -32,10 +33,9 @@ def show_sport_tiles(sport, user=None, applies_to='all', days_limit=None):
     }
 
 
-@register.inclusion_tag('lib/configurable_tiles.html')
-def show_default_tiles(user=None, days_limit=None):
+@register.inclusion_tag('lib/configurable_tiles.html', takes_context=True)
+def show_default_tiles(context, user=None, days_limit=None):
     """Display default tiles for all activities"""
-    from wkz.utils.tile_metrics import TileMetricCalculator
     from wkz.models import MetricTile
     
     # Get default tiles
@@ -44,12 +44,8 @@ def show_default_tiles(user=None, days_limit=None):
         is_active=True
     ).order_by('key')
     
-    calculator = TileMetricCalculator(user=user, days_limit=days_limit)
-    
-    tiles = []
-    for tile in default_tiles:
-        metric_result = calculator.calculate_tile_metric(tile)
-        tiles.append(metric_result)
+    evaluator = get_tile_evaluator(context.get('request'))
+    tiles = evaluator.evaluate(list(default_tiles), user=user, days_limit=days_limit)
     
     return {
         'tiles': tiles,
@@ -57,16 +53,15 @@ def show_default_tiles(user=None, days_limit=None):
     }
 
 
-@register.simple_tag
-def get_tile_metric_value(tile_key, sport=None, user=None, days_limit=None):
+@register.simple_tag(takes_context=True)
+def get_tile_metric_value(context, tile_key, sport=None, user=None, days_limit=None):
     """Get a single tile metric value"""
     try:
         from wkz.models import MetricTile
-        from wkz.utils.tile_metrics import TileMetricCalculator
         
         tile = MetricTile.objects.get(key=tile_key, is_active=True)
-        calculator = TileMetricCalculator(user=user, sport=sport, days_limit=days_limit)
-        result = calculator.calculate_tile_metric(tile)
+        evaluator = get_tile_evaluator(context.get('request'))
+        result = evaluator.evaluate([tile], user=user, sport=sport, days_limit=days_limit)[0]
         
         return result['formatted_value']
     except Exception:
@@ -0,0 +1,117 @@
+import struct
+import zlib
+from typing import Sequence, Union
+
+import numpy as np
+
+# binary layout of an encoded time series:
+#   header: magic (4 bytes), version (uint8), flags (uint8), dtype (uint8), padding (uint8), number of samples (uint32)
+#   payload: null bitmap (1 bit per sample, only if FLAG_NULLS is set) followed by the little-endian values of all
+#            non-null samples, optionally delta-encoded. The payload is zlib compressed if FLAG_COMPRESSED is set.
+MAGIC = b"WKZS"
+VERSION = 1
+HEADER = struct.Struct("<4sBBBxI")
+
+FLAG_NULLS = 1
+FLAG_DELTA = 2
+FLAG_COMPRESSED = 4
+
+# codes of the supported (little-endian) dtypes, integer dtypes are used for series containing only integral values
+DTYPES = {
+    1: np.dtype("<i1"),
+    2: np.dtype("<i2"),
+    3: np.dtype("<i4"),
+    4: np.dtype("<i8"),
+    5: np.dtype("<f8"),
+}
+DTYPE_CODES = {dtype: code for code, dtype in DTYPES.items()}
+
+
+class InvalidSeriesError(ValueError):
+    pass
+
+
+def _smallest_int_dtype(values: np.ndarray) -> np.dtype:
+    low, high = (int(values.min()), int(values.max())) if values.size else (0, 0)
+    for code in (1, 2, 3, 4):
+        info = np.iinfo(DTYPES[code])
+        if info.min <= low and high <= info.max:
+            return DTYPES[code]
+    raise OverflowError("values exceed range of int64")
+
+
+def encode_series(values: Sequence[Union[float, int, None]], delta: bool = True, compress: bool = True) -> bytes:
+    """
+    Encodes a time series, e.g. a list of heart rate values containing Nones for missing values, into a compact binary
+    representation. Series of only integral values are stored using the smallest sufficient integer type and, if
+    `delta` is set, as differences between consecutive values. An empty series is encoded as empty bytes.
+    """
+    if len(values) == 0:
+        return b""
+    array = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    nulls = np.isnan(array)
+    valid = array[~nulls]
+    flags = 0
+
+    if valid.size and np.all(np.mod(valid, 1) == 0) and np.all(np.abs(valid) < 2**53):
+        integers = valid.astype(np.int64)
+        if delta:
+            integers = np.diff(integers, prepend=np.int64(0))
+            flags |= FLAG_DELTA
+        dtype = _smallest_int_dtype(integers)
+        data = integers.astype(dtype)
+    else:
+        dtype = DTYPES[5]
+        data = valid.astype(dtype)
+
+    payload = b""
+    if nulls.any():
+        flags |= FLAG_NULLS
+        payload += np.packbits(nulls, bitorder="little").tobytes()
+    payload += data.tobytes()
+    if compress:
+        flags |= FLAG_COMPRESSED
+        payload = zlib.compress(payload)
+    return HEADER.pack(MAGIC, VERSION, flags, DTYPE_CODES[dtype], len(array)) + payload
+
+
+def decode_series(blob: Union[bytes, memoryview, None]) -> np.ndarray:
+    """
+    Decodes a time series encoded with `encode_series` into a float64 numpy array, missing values are set to NaN.
+    """
+    if not blob:
+        return np.array([], dtype=np.float64)
+    blob = bytes(blob)
+    if len(blob) < HEADER.size:
+        raise InvalidSeriesError("encoded time series is too short")
+    magic, version, flags, dtype_code, length = HEADER.unpack_from(blob)
+    if magic != MAGIC or version != VERSION or dtype_code not in DTYPES:
+        raise InvalidSeriesError("data is not an encoded time series")
+    payload = blob[HEADER.size :]
+    if flags & FLAG_COMPRESSED:
+        payload = zlib.decompress(payload)
+
+    if flags & FLAG_NULLS:
+        bitmap_size = (length + 7) // 8
+        bitmap = np.frombuffer(payload[:bitmap_size], dtype=np.uint8)
+        nulls = np.unpackbits(bitmap, count=length, bitorder="little").astype(bool)
+        payload = payload[bitmap_size:]
+    else:
+        nulls = np.zeros(length, dtype=bool)
+
+    data = np.frombuffer(payload, dtype=DTYPES[dtype_code])
+    if flags & FLAG_DELTA:
+        data = np.cumsum(data, dtype=np.int64)
+    if data.size != length - nulls.sum():
+        raise InvalidSeriesError("number of values does not match length of encoded time series")
+
+    values = np.full(length, np.nan, dtype=np.float64)
+    values[~nulls] = data
+    return values
+
+
+def series_to_list(values: np.ndarray) -> list:
+    """
+    Converts a decoded time series into a list of python floats with None for missing values, e.g. for serialization.
+    """
+    return [None if np.isnan(value) else value for value in values.tolist()]
@@ -1,19 +1,153 @@
 import logging
 import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Tuple, Union
 
 from django_eventstream import send_event
 
+from wkz import configuration as cfg
+
 log = logging.getLogger(__name__)
 
+HTML_TAGS = re.compile("<.*?>")
+
+# dispatcher of the current thread, see dispatching
+_local = threading.local()
+
 
 def clean_html(raw_html):
-    cleaner = re.compile("<.*?>")
-    cleantext = re.sub(cleaner, "", raw_html)
-    return cleantext
+    return HTML_TAGS.sub("", raw_html)
 
 
-def send(text: str, color: str, log_level: str = "DEBUG"):
-    """Server Sent Event"""
+def send(text: str, color: str, log_level: str = "DEBUG", key: str = None):
+    """
+    Server Sent Event, which is sent right away or, while a dispatcher is active in the current thread (see
+    `dispatching`), together with the other messages of the same time window. Messages with the same key (or the same
+    text, if no key is given) are collapsed into one within a time window, e.g. warnings about many duplicate files.
+    """
     log_level = getattr(logging, log_level)
-    log.log(log_level, clean_html(text))
-    send_event("event", "message", {"text": text, "color": color})
+    if log.isEnabledFor(log_level):
+        log.log(log_level, clean_html(text))
+    dispatcher = getattr(_local, "dispatcher", None)
+    if dispatcher is None:
+        send_event("event", "message", {"text": text, "color": color})
+    else:
+        dispatcher.add(text, color, key)
+
+
+def progress(text: str, done: int, total: int):
+    """
+    Server Sent Event reporting the progress of a long running job, e.g. the number of imported files. While a
+    dispatcher is active in the current thread, progress is sent at most every `sse_progress_interval` seconds.
+    """
+    dispatcher = getattr(_local, "dispatcher", None)
+    if dispatcher is None:
+        send_event("event", "progress", {"text": text, "done": done, "total": total, "rate": None, "eta": None})
+    else:
+        dispatcher.progress(text, done, total)
+
+
+class Dispatcher:
+    """
+    Collects server sent events and sends them in batches, at most one message event per color every `interval` seconds
+    and at most one progress event every `progress_interval` seconds. This keeps the number of events bounded, when
+    e.g. importing thousands of files.
+    """
+
+    def __init__(
+        self,
+        interval: float = None,
+        progress_interval: float = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.interval = cfg.sse_interval if interval is None else interval
+        self.progress_interval = cfg.sse_progress_interval if progress_interval is None else progress_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        # pending messages mapped to their key, values are lists of text, color and count
+        self._messages: Dict[Tuple[str, str], List[Union[str, int]]] = {}
+        self._last_flush = None
+        self._started = clock()
+        self._last_progress = None
+
+    def add(self, text: str, color: str, key: str = None) -> None:
+        with self._lock:
+            message = self._messages.setdefault((color, key or text), [text, color, 0])
+            message[2] += 1
+        self.flush(force=False)
+
+    def flush(self, force: bool = True) -> None:
+        """
+        Sends the pending messages as one event per color, if `interval` seconds passed since the last events were sent
+        or `force` is set.
+        """
+        with self._lock:
+            now = self._clock()
+            if not self._messages:
+                return
+            if not force and self._last_flush is not None and now - self._last_flush < self.interval:
+                return
+            messages, self._messages = list(self._messages.values()), {}
+            self._last_flush = now
+        texts_by_color = {}
+        for text, color, count in messages:
+            if count > 1:
+                text = f"{text}<br>... and {count - 1} more like this."
+            texts_by_color.setdefault(color, []).append(text)
+        for color, texts in texts_by_color.items():
+            omitted = len(texts) - cfg.sse_max_messages_per_event
+            if omitted > 0:
+                texts = texts[: cfg.sse_max_messages_per_event] + [f"... and {omitted} more messages."]
+            send_event("event", "message", {"text": "<br>".join(texts), "color": color})
+
+    def progress(self, text: str, done: int, total: int) -> None:
+        now = self._clock()
+        finished = done >= total
+        if not finished and self._last_progress is not None and now - self._last_progress < self.progress_interval:
+            return
+        self._last_progress = now
+        # messages sent before the progress should also arrive before it
+        self.flush()
+        elapsed = now - self._started
+        rate = done / elapsed if elapsed > 0 else None
+        eta = (total - done) / rate if rate else None
+        send_event(
+            "event",
+            "progress",
+            {
+                "text": text,
+                "done": done,
+                "total": total,
+                "rate": round(rate, 2) if rate is not None else None,
+                "eta": round(eta) if eta is not None else None,
+            },
+        )
+
+
+@contextmanager
+def dispatching(**kwargs) -> Iterator[Dispatcher]:
+    """
+    Activates a dispatcher for the current thread, which batches all server sent events until the context is left, see
+    `Dispatcher`. Nested contexts share the dispatcher of the outermost context.
+    """
+    dispatcher = getattr(_local, "dispatcher", None)
+    if dispatcher is not None:
+        yield dispatcher
+        return
+    dispatcher = Dispatcher(**kwargs)
+    _local.dispatcher = dispatcher
+    try:
+        yield dispatcher
+    finally:
+        _local.dispatcher = None
+        dispatcher.flush()
+
+
+def discard_dispatcher() -> None:
+    """
+    Drops the dispatcher of the current thread without flushing it. Meant for forked processes, which inherit a copy of
+    the dispatcher of their parent that would never be flushed.
+    """
+    _local.dispatcher = None
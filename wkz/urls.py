@@ -39,6 +39,10 @@ urlpatterns = [
     re_path(r"^sport/(?P<slug>[a-zA-Z0-9-]+)/delete/$", sport_views.SportDeleteView.as_view(), name="delete-sport"),
     # Best Sections
     path("awards/", awards_views.AwardsViews.as_view(), name="awards"),
+    # Trace geometries
+    path("traces/activity/<int:activity_id>", views.activity_traces, name="activity-traces"),
+    path("traces/sport/<slug:sports_name_slug>", views.sport_traces, name="sport-traces"),
+    path("heatmap/<slug:scope>/<int:zoom>/<int:x>/<int:y>.png", views.heatmap_tile, name="heatmap-tile"),
     # Rest API endpoints
     path("mount-device/", api.mount_device_endpoint),
     path("stop/", api.stop_django_server),
@@ -0,0 +1,111 @@
+import hashlib
+import logging
+from typing import List, Set, Union
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+from django.db.models import Count, F, Max, Q, QuerySet, Window
+from django.db.models.functions import RowNumber
+
+from wkz import configuration as cfg
+from wkz import models
+
+log = logging.getLogger(__name__)
+
+
+def _get_pks_of_top_ranked_activities(
+    queryset: QuerySet, activity_pk: str, partition_by: list, order_by: list, rank_limit: int
+) -> Set[int]:
+    """
+    Ranks the rows of the given queryset within their partition using ROW_NUMBER() and returns the pks of the
+    activities of all rows ranked within the top `rank_limit`. Since Django does not support filtering on window
+    functions, the ranking query is wrapped into an outer query filtering on the rank, i.e. it is a single query.
+    """
+    ranked = queryset.annotate(
+        award_activity=F(activity_pk),
+        award_rank=Window(expression=RowNumber(), partition_by=partition_by, order_by=order_by),
+    ).values("award_activity", "award_rank")
+    try:
+        sql, params = ranked.query.sql_with_params()
+    except EmptyResultSet:
+        # the queryset is known to be empty without querying, e.g. when filtering on an empty list of sports
+        return set()
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT award_activity FROM ({sql}) ranked WHERE award_rank <= %s", (*params, rank_limit))
+        return {row[0] for row in cursor.fetchall()}
+
+
+def get_pks_of_activities_in_top_awards(user, sport_slugs: List[str], rank_limit: int = cfg.rank_limit) -> List[int]:
+    """
+    Returns the pks of all activities of the given user and sports ranking within the top `rank_limit` of any award,
+    i.e. of the best sections of any kind and distance configured in `best_sections` or of the total ascent. This
+    takes two queries, regardless of the number of sports, kinds and distances.
+    """
+    kinds_and_distances = Q()
+    for bs in cfg.best_sections:
+        kinds_and_distances |= Q(kind=bs.kind, distance__in=bs.distances)
+    best_sections = models.BestSection.objects.filter(
+        kinds_and_distances,
+        activity__sport__slug__in=sport_slugs,
+        activity__user=user,
+        activity__evaluates_for_awards=True,
+    )
+    pks = _get_pks_of_top_ranked_activities(
+        best_sections,
+        activity_pk="activity_id",
+        partition_by=[F("activity__sport__slug"), F("kind"), F("distance")],
+        order_by=[F("max_value").desc(), F("pk").asc()],
+        rank_limit=rank_limit,
+    )
+    # also add pks of best total ascent activities
+    activities = models.Activity.objects.filter(
+        sport__slug__in=sport_slugs, user=user, evaluates_for_awards=True
+    ).exclude(trace_file__total_ascent=None)
+    pks |= _get_pks_of_top_ranked_activities(
+        activities,
+        activity_pk="pk",
+        partition_by=[F("sport__slug")],
+        order_by=[F("trace_file__total_ascent").desc(), F("pk").asc()],
+        rank_limit=rank_limit,
+    )
+    return sorted(pks)
+
+
+def _get_cache_key(user, filter_on_sport: Union[None, str]) -> str:
+    """
+    Returns the key of the cached award rankings of the given user. Besides the user and sport, the key contains a
+    fingerprint of the activities of the user and their sports, which changes with every import, edit or deletion of an
+    activity and with every edit of a sport. This keeps the cache valid even if activities are imported by another
+    process, e.g. the huey consumer.
+    """
+    fingerprint = models.Activity.objects.filter(user=user).aggregate(
+        count=Count("pk"),
+        count_with_sport=Count("sport"),
+        updated=Max("updated"),
+        sport_updated=Max("sport__updated"),
+    )
+    key = f"{user.pk if user else None}:{filter_on_sport}:{sorted(fingerprint.items())}"
+    return f"award_ranking:{hashlib.md5(key.encode()).hexdigest()}"
+
+
+def get_cached_pks_of_activities_in_top_awards(user, filter_on_sport: Union[None, str] = None) -> List[int]:
+    """
+    Returns the pks of all activities of the given user ranking within the top awards of the given sport or of all
+    sports evaluating for awards, see `get_pks_of_activities_in_top_awards`. Rankings are cached until the activities
+    of the user change.
+    """
+    key = _get_cache_key(user, filter_on_sport)
+    pks = cache.get(key)
+    if pks is None:
+        if filter_on_sport:
+            sport_slugs = [filter_on_sport]
+        else:
+            sport_slugs = list(
+                models.Sport.objects.filter(is_system_sport=True, evaluates_for_awards=True)
+                .exclude(name="unknown")
+                .values_list("slug", flat=True)
+            )
+        pks = get_pks_of_activities_in_top_awards(user, sport_slugs)
+        cache.set(key, pks, None)
+    return pks
@@ -1,13 +1,24 @@
-from django.db.models import Sum, Avg, Count, Max, Min
+import logging
+
+from django.core.cache import cache
+from django.core.exceptions import FieldError
+from django.db.models import Aggregate, Sum, Avg, Count, Max, Min, Q
 from django.utils import timezone
 from datetime import timedelta
 from decimal import Decimal
-from typing import Dict, Any, Optional, Union
+from typing import Dict, Any, List, Optional, Union
+from wkz import configuration
 from wkz.models import Activity, Sport, MetricTile, SportTileConfiguration, SportTileOrder
 
+log = logging.getLogger(__name__)
+
+TILE_METRICS_VERSION_KEY = 'tile_metrics_version'
+
 
 class TileMetricCalculator:
     """Calculates metrics for configurable tiles"""
+
+    metric_types = ['total', 'average', 'count', 'max', 'min', 'trend', 'custom']
     
     def __init__(self, user=None, sport=None, days_limit=None):
         self.user = user
@@ -32,174 +43,92 @@ class TileMetricCalculator:
     
     def calculate_tile_metric(self, tile: MetricTile) -> Dict[str, Any]:
         """Calculate the metric value for a given tile"""
-        queryset = self.get_activity_queryset()
-        
-        # Handle different metric types
-        if tile.metric_type == 'total':
-            return self._calculate_total(queryset, tile)
-        elif tile.metric_type == 'average':
-            return self._calculate_average(queryset, tile)
-        elif tile.metric_type == 'count':
-            return self._calculate_count(queryset, tile)
-        elif tile.metric_type == 'max':
-            return self._calculate_max(queryset, tile)
-        elif tile.metric_type == 'min':
-            return self._calculate_min(queryset, tile)
-        elif tile.metric_type == 'trend':
-            return self._calculate_trend(queryset, tile)
-        elif tile.metric_type == 'custom':
-            return self._calculate_custom(queryset, tile)
-        else:
+        return self.calculate_tile_metrics([tile])[0]
+
+    def calculate_tile_metrics(self, tiles: List[MetricTile]) -> List[Dict[str, Any]]:
+        """Calculate the metric values of several tiles using a single aggregate query"""
+        return [self.get_result(tile, value) for tile, value in zip(tiles, self.calculate_tile_values(tiles))]
+
+    def calculate_tile_values(self, tiles: List[MetricTile]) -> List[Union[int, float]]:
+        """Calculate the raw metric values of several tiles using a single aggregate query"""
+        aggregates = {}
+        for i, tile in enumerate(tiles):
+            for name, aggregate in self._get_aggregates(tile).items():
+                aggregates[f'tile_{i}_{name}'] = aggregate
+        try:
+            values = self.get_activity_queryset().aggregate(**aggregates) if aggregates else {}
+        except FieldError as e:
+            if len(tiles) > 1:
+                # evaluate the tiles one by one, such that an invalid data field only breaks its own tile
+                return [value for tile in tiles for value in self.calculate_tile_values([tile])]
+            log.warning(f"could not calculate metric of tile '{tiles[0].key}': {e}")
+            return [0]
+
+        tile_values = []
+        for i, tile in enumerate(tiles):
+            prefix = f'tile_{i}_'
+            tile_values.append(self._get_value(
+                tile, {name[len(prefix):]: v for name, v in values.items() if name.startswith(prefix)}
+            ))
+        return tile_values
+
+    def get_result(self, tile: MetricTile, value: Union[int, float]) -> Dict[str, Any]:
+        """Get the result of a tile, as rendered by the tile templates, for its metric value"""
+        if tile.metric_type not in self.metric_types:
             return self._default_result(tile)
-    
-    def _calculate_total(self, queryset, tile: MetricTile) -> Dict[str, Any]:
-        """Calculate total (sum) metric"""
-        field_name = tile.data_field
-        
-        # Handle special cases
-        if field_name == 'duration':
-            total_seconds = sum(
-                (activity.duration.total_seconds() if activity.duration else 0)
-                for activity in queryset
-            )
-            value = total_seconds / 3600  # Convert to hours
-        elif field_name == 'distance':
-            result = queryset.aggregate(total=Sum(field_name))
-            value = result['total'] or 0
-        else:
-            # Generic sum
-            result = queryset.aggregate(total=Sum(field_name))
-            value = result['total'] or 0
-        
         return {
             'value': value,
             'formatted_value': self._format_value(value, tile),
             'raw_value': value,
             'tile': tile
         }
-    
-    def _calculate_average(self, queryset, tile: MetricTile) -> Dict[str, Any]:
-        """Calculate average metric"""
-        field_name = tile.data_field
-        
-        if field_name == 'duration':
-            # Calculate average duration manually
-            durations = [
-                activity.duration.total_seconds() if activity.duration else 0
-                for activity in queryset
-            ]
-            if durations:
-                value = sum(durations) / len(durations) / 60  # Convert to minutes
-            else:
-                value = 0
-        else:
-            # Generic average
-            result = queryset.aggregate(avg=Avg(field_name))
-            value = result['avg'] or 0
-        
-        return {
-            'value': value,
-            'formatted_value': self._format_value(value, tile),
-            'raw_value': value,
-            'tile': tile
-        }
-    
-    def _calculate_count(self, queryset, tile: MetricTile) -> Dict[str, Any]:
-        """Calculate count metric"""
-        value = queryset.count()
-        
-        return {
-            'value': value,
-            'formatted_value': self._format_value(value, tile),
-            'raw_value': value,
-            'tile': tile
-        }
-    
-    def _calculate_max(self, queryset, tile: MetricTile) -> Dict[str, Any]:
-        """Calculate maximum metric"""
-        field_name = tile.data_field
-        
-        if field_name == 'duration':
-            # Handle duration specially
-            max_duration = max(
-                (activity.duration.total_seconds() if activity.duration else 0
-                 for activity in queryset),
-                default=0
-            )
-            value = max_duration / 3600  # Convert to hours
-        else:
-            result = queryset.aggregate(max_val=Max(field_name))
-            value = result['max_val'] or 0
-        
-        return {
-            'value': value,
-            'formatted_value': self._format_value(value, tile),
-            'raw_value': value,
-            'tile': tile
-        }
-    
-    def _calculate_min(self, queryset, tile: MetricTile) -> Dict[str, Any]:
-        """Calculate minimum metric"""
+
+    def _get_aggregates(self, tile: MetricTile) -> Dict[str, Aggregate]:
+        """Get the database aggregates required to calculate the metric of a tile"""
         field_name = tile.data_field
-        
-        result = queryset.aggregate(min_val=Min(field_name))
-        value = result['min_val'] or 0
-        
-        return {
-            'value': value,
-            'formatted_value': self._format_value(value, tile),
-            'raw_value': value,
-            'tile': tile
-        }
-    
-    def _calculate_trend(self, queryset, tile: MetricTile) -> Dict[str, Any]:
-        """Calculate 7-day trend metric"""
-        # Get last 7 days
-        week_ago = timezone.now() - timedelta(days=7)
-        recent_activities = queryset.filter(date__gte=week_ago)
-        
-        if tile.data_field == 'duration':
-            value = sum(
-                (activity.duration.total_seconds() if activity.duration else 0)
-                for activity in recent_activities
-            ) / 3600  # Convert to hours
-        else:
-            result = recent_activities.aggregate(total=Sum(tile.data_field))
-            value = result['total'] or 0
-        
-        return {
-            'value': value,
-            'formatted_value': self._format_value(value, tile),
-            'raw_value': value,
-            'tile': tile
-        }
-    
-    def _calculate_custom(self, queryset, tile: MetricTile) -> Dict[str, Any]:
-        """Calculate custom metrics"""
-        if tile.key == 'avg_pace':
-            # Calculate average pace (min/km)
-            total_distance = queryset.aggregate(dist=Sum('distance'))['dist'] or 0
-            total_duration = sum(
-                (activity.duration.total_seconds() if activity.duration else 0)
-                for activity in queryset
-            )
-            
-            if total_distance > 0 and total_duration > 0:
-                # Pace in minutes per km
-                value = (total_duration / 60) / total_distance
-            else:
-                value = 0
+
+        if tile.metric_type == 'total':
+            return {'value': Sum(field_name)}
+        elif tile.metric_type == 'average':
+            return {'value': Avg(field_name)}
+        elif tile.metric_type == 'count':
+            return {'value': Count('pk')}
+        elif tile.metric_type == 'max':
+            return {'value': Max(field_name)}
+        elif tile.metric_type == 'min':
+            return {'value': Min(field_name)}
+        elif tile.metric_type == 'trend':
+            # Sum of the last 7 days
+            week_ago = timezone.now() - timedelta(days=7)
+            return {'value': Sum(field_name, filter=Q(date__gte=week_ago))}
+        elif tile.metric_type == 'custom' and tile.key == 'avg_pace':
+            return {'distance': Sum('distance'), 'duration': Sum('duration')}
         else:
+            return {}
+
+    def _get_value(self, tile: MetricTile, values: Dict[str, Any]) -> Union[int, float]:
+        """Convert the aggregated values of a tile into its metric value"""
+        if tile.metric_type == 'custom':
+            if tile.key == 'avg_pace':
+                # Calculate average pace (min/km)
+                total_distance = values['distance'] or 0
+                total_duration = values['duration'].total_seconds() if values['duration'] else 0
+                if total_distance > 0 and total_duration > 0:
+                    # Pace in minutes per km
+                    return (total_duration / 60) / total_distance
             # Default to 0 for unimplemented custom metrics
-            value = 0
-        
-        return {
-            'value': value,
-            'formatted_value': self._format_value(value, tile),
-            'raw_value': value,
-            'tile': tile
-        }
-    
+            return 0
+
+        if 'value' not in values:
+            return 0
+        value = values['value'] or 0
+        if isinstance(value, timedelta):
+            # Durations are given in minutes for averages and in hours otherwise
+            if tile.metric_type == 'average':
+                return value.total_seconds() / 60
+            return value.total_seconds() / 3600
+        return value
+
     def _format_value(self, value: Union[int, float], tile: MetricTile) -> str:
         """Format the value according to the tile's format type"""
         if value is None:
@@ -239,6 +168,62 @@ class TileMetricCalculator:
         }
 
 
+def invalidate_tile_metrics():
+    """Invalidate all cached tile metrics, e.g. after activities changed"""
+    try:
+        cache.incr(TILE_METRICS_VERSION_KEY)
+    except ValueError:
+        cache.set(TILE_METRICS_VERSION_KEY, 1, None)
+
+
+class TileEvaluator:
+    """
+    Evaluates tiles of any number of scopes, i.e. combinations of user, sport and days limit. The requested tiles of a
+    scope which are not known yet are computed with a single aggregate query, such that tiles requested again are
+    served from memory. An evaluator is meant to live for one request, while the metrics
+    of each scope are additionally cached for `tile_metrics_cache_timeout` seconds or until activities change.
+    """
+
+    def __init__(self):
+        self._values = {}
+
+    def evaluate(self, tiles: List[MetricTile], user=None, sport=None, days_limit=None) -> List[Dict[str, Any]]:
+        """Get the results of the given tiles for the given scope"""
+        calculator = TileMetricCalculator(user=user, sport=sport, days_limit=days_limit)
+        values = self._get_values(calculator, tiles)
+        return [calculator.get_result(tile, values[tile.key]) for tile in tiles]
+
+    def _get_values(self, calculator: TileMetricCalculator, tiles: List[MetricTile]) -> Dict[str, Union[int, float]]:
+        user_id = calculator.user.pk if calculator.user else None
+        sport_id = calculator.sport.pk if calculator.sport else None
+        scope = (user_id, sport_id, calculator.days_limit)
+        if scope not in self._values:
+            version = cache.get(TILE_METRICS_VERSION_KEY, 0)
+            self._values[scope] = cache.get(self._get_cache_key(scope, version)) or {}
+        values = self._values[scope]
+
+        missing = {tile.key: tile for tile in tiles if tile.key not in values}
+        if missing:
+            values.update(zip(missing, calculator.calculate_tile_values(list(missing.values()))))
+            version = cache.get(TILE_METRICS_VERSION_KEY, 0)
+            cache.set(self._get_cache_key(scope, version), values, configuration.tile_metrics_cache_timeout)
+        return values
+
+    @staticmethod
+    def _get_cache_key(scope: tuple, version: int) -> str:
+        user_id, sport_id, days_limit = scope
+        return f'tile_metrics:{version}:{user_id}:{sport_id}:{days_limit}'
+
+
+def get_tile_evaluator(request=None) -> TileEvaluator:
+    """Get the tile evaluator of the given request, creating it on first use"""
+    if request is None:
+        return TileEvaluator()
+    if not hasattr(request, '_tile_evaluator'):
+        request._tile_evaluator = TileEvaluator()
+    return request._tile_evaluator
+
+
 def get_tiles_for_sport(sport: Sport, user=None, applies_to='all') -> list:
     """Get configured tiles for a specific sport"""
     try:
@@ -302,16 +287,16 @@ def _get_default_tiles() -> list:
     return tiles
 
 
-def calculate_tiles_for_sport(sport: Sport, user=None, applies_to='all', days_limit=None) -> list:
+def calculate_tiles_for_sport(sport: Sport, user=None, applies_to='all', days_limit=None, evaluator=None) -> list:
     """Calculate metrics for all tiles configured for a sport"""
     tile_configs = get_tiles_for_sport(sport, user, applies_to)
-    calculator = TileMetricCalculator(user=user, sport=sport, days_limit=days_limit)
+    evaluator = evaluator or TileEvaluator()
+    metric_results = evaluator.evaluate(
+        [config['tile'] for config in tile_configs], user=user, sport=sport, days_limit=days_limit
+    )
     
     results = []
-    for config in tile_configs:
-        tile = config['tile']
-        metric_result = calculator.calculate_tile_metric(tile)
-        
+    for config, metric_result in zip(tile_configs, metric_results):
         # Apply custom overrides
         if config['custom_title']:
             metric_result['custom_title'] = config['custom_title']
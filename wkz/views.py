@@ -1,28 +1,41 @@
+import dataclasses
 import datetime
-import json
+import hashlib
 import logging
-from typing import List, Union
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
 
-import pytz
+import numpy as np
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Sum
-from django.http import HttpResponseRedirect
+from django.db.models import Count, Max, Min, Q, Sum
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseNotFound,
+    HttpResponseRedirect,
+    JsonResponse,
+)
 from django.shortcuts import redirect, render
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django.views.generic import View
 
 from wkz import configuration as cfg
 from wkz import forms, models
-from wkz.gis.geo import GeoTrace, get_list_of_coordinates
+from wkz.gis import heatmap
+from wkz.gis.geo import GeoTrace, encode_polyline, get_list_of_coordinates
+from wkz.io.import_profile import STAGES
 from wkz.plotting.plot_history import plot_history
 from wkz.plotting.plot_pie_chart import plot_pie_chart
 from wkz.plotting.plot_trend import plot_trend
 from wkz.plotting.plot_workload import plot_workload
 from wkz.tools.style import Style, sport_trace_colors
+from wkz.utils.award_ranking import get_cached_pks_of_activities_in_top_awards
 from workoutizer import __version__
 from workoutizer import settings as django_settings
 
@@ -59,24 +72,34 @@ class MapView(View):
     number_of_days = None
     days_choices = None
     settings = None
+    # maps showing many activities fetch their traces lazily from the trace geometry endpoint, see sport_traces
+    load_traces_lazily = False
 
     def get(self, request, list_of_activities: list):
         self.settings = models.get_settings()
         setattr(self.settings, "trace_width", django_settings.trace_line_width)
         setattr(self.settings, "trace_opacity", django_settings.trace_line_opacity)
+        setattr(self.settings, "polyline_precision", cfg.polyline_precision)
         self.number_of_days = self.settings.number_of_days
         self.days_choices = models.Settings.days_choices
-        traces = []
-        for activity in list_of_activities:
-            if activity.trace_file:
-                coordinates = json.dumps(
-                    get_list_of_coordinates(
-                        json.loads(activity.trace_file.longitude_list), json.loads(activity.trace_file.latitude_list)
-                    )
-                )
-                sport = activity.sport.name
-                if coordinates != "[]":
-                    traces.append(GeoTrace(pk=activity.pk, name=activity.name, sport=sport, coordinates=coordinates))
+        if self.load_traces_lazily:
+            trace_ids = [activity.trace_file_id for activity in list_of_activities if activity.trace_file_id]
+            number_of_traces = models.Traces.objects.filter(pk__in=trace_ids).exclude(latitude_list=b"").count()
+            all_days = max(days for days, _ in self.days_choices)
+            bounds = get_bounding_box_of_traces(trace_ids)
+            return {
+                "traces": [],
+                "traces_bounds": bounds,
+                # too many traces to draw individually, render a heatmap of all activities instead
+                "heatmap": bounds is not None
+                and self.number_of_days >= all_days
+                and number_of_traces > cfg.max_number_of_map_traces,
+                "settings": self.settings,
+                "days": self.number_of_days,
+                "choices": self.days_choices,
+                "has_traces": number_of_traces > 0,
+            }
+        traces = get_geo_traces(list_of_activities)
         has_traces = True if traces else False
 
         if traces:
@@ -92,6 +115,230 @@ class MapView(View):
         }
 
 
+def get_geo_traces(activities, use_simplified_polylines: bool = False) -> List[GeoTrace]:
+    """
+    Returns the traces of the given activities, with their coordinates encoded as polylines. Either the simplified
+    polylines of the traces are used, which suits maps showing many activities, or every nth point of the full traces.
+    Activities without coordinates are skipped.
+    """
+    polylines = {}
+    if use_simplified_polylines:
+        polylines = get_simplified_coordinates_of_traces(
+            [activity.trace_file_id for activity in activities if activity.trace_file_id]
+        )
+    traces = []
+    for activity in activities:
+        if activity.trace_file_id in polylines:
+            # avoids fetching the trace including all of its time series
+            longitudes, latitudes = polylines[activity.trace_file_id]
+        elif activity.trace_file:
+            coordinates = get_list_of_coordinates(
+                activity.trace_file.get_series("longitude_list"),
+                activity.trace_file.get_series("latitude_list"),
+            )
+            longitudes, latitudes = zip(*coordinates) if coordinates else ([], [])
+        else:
+            continue
+        if len(longitudes) and not np.isnan(longitudes).any() and not np.isnan(latitudes).any():
+            coordinates = encode_polyline(longitudes, latitudes, cfg.polyline_precision)
+            sport = activity.sport.name
+            traces.append(GeoTrace(pk=activity.pk, name=activity.name, sport=sport, coordinates=coordinates))
+    return traces
+
+
+def get_simplified_coordinates_of_traces(trace_ids: List[int]) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Returns longitudes and latitudes of the simplified polylines of the given traces, using the smallest tolerance for
+    which the number of points of all polylines does not exceed `max_number_of_map_points`, or the largest tolerance
+    otherwise. Traces without polylines are not contained in the returned dict.
+    """
+    if not trace_ids:
+        return {}
+    number_of_points = dict(
+        models.Polyline.objects.filter(trace_id__in=trace_ids)
+        .values_list("tolerance")
+        .annotate(Sum("number_of_points"))
+        .order_by("tolerance")
+    )
+    if not number_of_points:
+        return {}
+    suitable = [tolerance for tolerance, points in number_of_points.items() if points <= cfg.max_number_of_map_points]
+    tolerance = min(suitable) if suitable else max(number_of_points)
+    log.debug(f"using polylines with tolerance of {tolerance}m for {len(trace_ids)} traces")
+    return {
+        polyline.trace_id: polyline.get_coordinates()
+        for polyline in models.Polyline.objects.filter(trace_id__in=trace_ids, tolerance=tolerance)
+    }
+
+
+def get_bounding_box_of_traces(trace_ids: List[int]) -> Union[List[List[float]], None]:
+    """
+    Returns the bounding box of all polylines of the given traces as [[south, west], [north, east]], as expected by
+    leaflet, or None if none of the traces has polylines.
+    """
+    bounds = models.Polyline.objects.filter(trace_id__in=trace_ids).aggregate(
+        Min("min_latitude"), Min("min_longitude"), Max("max_latitude"), Max("max_longitude")
+    )
+    if bounds["min_latitude__min"] is None:
+        return None
+    return [
+        [bounds["min_latitude__min"], bounds["min_longitude__min"]],
+        [bounds["max_latitude__max"], bounds["max_longitude__max"]],
+    ]
+
+
+def filter_traces_by_bounding_box(trace_ids: List[int], bounding_box: List[float]) -> List[int]:
+    """
+    Returns the traces whose polylines intersect the given bounding box (west, south, east, north). Traces without
+    polylines are always kept, since their extent is unknown.
+    """
+    west, south, east, north = bounding_box
+    polylines = models.Polyline.objects.filter(trace_id__in=trace_ids)
+    with_polylines = set(polylines.values_list("trace_id", flat=True))
+    visible = set(
+        polylines.filter(
+            max_longitude__gte=west, min_longitude__lte=east, max_latitude__gte=south, min_latitude__lte=north
+        ).values_list("trace_id", flat=True)
+    )
+    return [trace_id for trace_id in trace_ids if trace_id in visible or trace_id not in with_polylines]
+
+
+def _get_activities_of_sport_in_window(request, sports_name_slug: str):
+    days = request.GET.get("days")
+    number_of_days = int(days) if days and days.isdigit() else models.get_settings(request.user).number_of_days
+    now = timezone.now()
+    return models.Activity.objects.filter(
+        user=request.user,
+        sport__slug=sports_name_slug,
+        trace_file__isnull=False,
+        date__range=[now - datetime.timedelta(days=number_of_days), now],
+    )
+
+
+def _get_last_modified(activities) -> Union[datetime.datetime, None]:
+    updated = activities.aggregate(Max("updated"), Max("trace_file__updated"))
+    timestamps = [timestamp for timestamp in updated.values() if timestamp is not None]
+    return max(timestamps) if timestamps else None
+
+
+def _get_etag(activities) -> str:
+    # activities might be deleted without changing the last modified timestamp, hence count and pks are considered too
+    summary = activities.aggregate(Count("pk"), Sum("pk"), Max("updated"), Max("trace_file__updated"))
+    config = (cfg.polyline_precision, cfg.polyline_tolerances, cfg.max_number_of_map_points)
+    return hashlib.md5(f"{sorted(summary.items())}{config}".encode()).hexdigest()
+
+
+def _trace_geometries_response(traces: List[GeoTrace]) -> JsonResponse:
+    for trace in traces:
+        # colors depend on the activity only, such that traces keep their color when being fetched again
+        trace.color = sport_trace_colors[trace.pk % len(sport_trace_colors)]
+    return JsonResponse({"precision": cfg.polyline_precision, "traces": [dataclasses.asdict(trace) for trace in traces]})
+
+
+def _sport_traces_etag(request, sports_name_slug: str) -> str:
+    return _get_etag(_get_activities_of_sport_in_window(request, sports_name_slug))
+
+
+def _sport_traces_last_modified(request, sports_name_slug: str) -> Union[datetime.datetime, None]:
+    return _get_last_modified(_get_activities_of_sport_in_window(request, sports_name_slug))
+
+
+@login_required
+@condition(etag_func=_sport_traces_etag, last_modified_func=_sport_traces_last_modified)
+def sport_traces(request, sports_name_slug: str):
+    """
+    Returns the simplified traces of all activities of a sport within a date window as JSON. The date window defaults to
+    the number of days of the settings and can be set with the `days` parameter. Using the `bbox` parameter
+    (west,south,east,north) only the traces intersecting the given bounding box are returned.
+    """
+    activities = _get_activities_of_sport_in_window(request, sports_name_slug).order_by("-date")
+    bounding_box = request.GET.get("bbox")
+    if bounding_box:
+        try:
+            bounding_box = [float(value) for value in bounding_box.split(",")]
+        except ValueError:
+            return HttpResponseBadRequest("bbox needs to consist of west,south,east,north")
+        if len(bounding_box) != 4:
+            return HttpResponseBadRequest("bbox needs to consist of west,south,east,north")
+        trace_ids = filter_traces_by_bounding_box([activity.trace_file_id for activity in activities], bounding_box)
+        activities = activities.filter(trace_file_id__in=trace_ids)
+    return _trace_geometries_response(get_geo_traces(activities.select_related("sport"), use_simplified_polylines=True))
+
+
+def _activity_traces_etag(request, activity_id: int) -> str:
+    return _get_etag(models.Activity.objects.filter(pk=activity_id, user=request.user))
+
+
+def _activity_traces_last_modified(request, activity_id: int) -> Union[datetime.datetime, None]:
+    return _get_last_modified(models.Activity.objects.filter(pk=activity_id, user=request.user))
+
+
+@login_required
+@condition(etag_func=_activity_traces_etag, last_modified_func=_activity_traces_last_modified)
+def activity_traces(request, activity_id: int):
+    """
+    Returns the trace of a single activity as JSON, with the same level of detail as rendered on the activity page.
+    """
+    activities = models.Activity.objects.filter(pk=activity_id, user=request.user).select_related("sport")
+    if not activities:
+        raise Http404("Activity not found")
+    return _trace_geometries_response(get_geo_traces(activities))
+
+
+def _get_heatmap_tile(request, scope: str, zoom: int, x: int, y: int) -> Union[Path, None]:
+    """
+    Returns the path of the cached heatmap tile, rendering it first if it is not cached yet. Scope is either "all" for
+    all activities of the user or the slug of a sport. None is returned for tiles outside of the map.
+    """
+    if zoom > heatmap.MAX_ZOOM or x >= 2**zoom or y >= 2**zoom:
+        return None
+    path = heatmap.get_path_of_tile(django_settings.HEATMAP_TILES_DIR, request.user.pk, scope, zoom, x, y)
+    if path.is_file():
+        return path
+    west, south, east, north = heatmap.get_bounding_box_of_tile(zoom, x, y)
+    # consider traces just outside of the tile as well, since their lines might reach into the tile
+    margin_x = (east - west) * cfg.heatmap_line_width / heatmap.TILE_SIZE
+    margin_y = (north - south) * cfg.heatmap_line_width / heatmap.TILE_SIZE
+    polylines = models.Polyline.objects.filter(
+        trace__activity__user=request.user,
+        tolerance=heatmap.get_tolerance_for_zoom(zoom, cfg.polyline_tolerances),
+        max_longitude__gte=west - margin_x,
+        min_longitude__lte=east + margin_x,
+        max_latitude__gte=south - margin_y,
+        min_latitude__lte=north + margin_y,
+    )
+    if scope != "all":
+        polylines = polylines.filter(trace__activity__sport__slug=scope)
+    log.debug(f"rendering heatmap tile {scope}/{zoom}/{x}/{y}")
+    traces = (polyline.get_coordinates() for polyline in polylines.iterator())
+    heatmap.save_tile(path, heatmap.render_tile(traces, zoom, x, y))
+    return path
+
+
+def _heatmap_tile_last_modified(request, scope: str, zoom: int, x: int, y: int) -> Union[datetime.datetime, None]:
+    path = _get_heatmap_tile(request, scope, zoom, x, y)
+    if path is None:
+        return None
+    return datetime.datetime.fromtimestamp(path.stat().st_mtime, tz=datetime.timezone.utc)
+
+
+@login_required
+@condition(last_modified_func=_heatmap_tile_last_modified)
+def heatmap_tile(request, scope: str, zoom: int, x: int, y: int):
+    """
+    Returns a heatmap tile of all traces of the user (scope "all") or of a sport (scope is the slug of the sport) as
+    PNG. Tiles are cached on disk and only rendered again after activities passing through them changed, such that
+    the costs of a map of all activities do not depend on the number of activities.
+    """
+    path = _get_heatmap_tile(request, scope, zoom, x, y)
+    if path is None:
+        return HttpResponseNotFound("tile is outside of the map")
+    response = HttpResponse(path.read_bytes(), content_type="image/png")
+    # tiles need to be revalidated, since they change when activities get imported
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
 class PlotView:
     number_of_days = None
     days_choices = None
@@ -121,6 +368,16 @@ class PlotView:
         activities = models.Activity.objects.filter(**base_filter).order_by("-date")
         return activities
 
+    def get_daily_summaries_for_plots(self, sport_id=None):
+        self.get_days_config()
+        start = timezone.localdate() - datetime.timedelta(days=self.number_of_days)
+        daily_summaries = models.DailySummary.objects.filter(day__gte=start)
+        if hasattr(self.request, "user") and self.request.user.is_authenticated:
+            daily_summaries = daily_summaries.filter(user=self.request.user)
+        if sport_id:
+            daily_summaries = daily_summaries.filter(sport=sport_id)
+        return daily_summaries.order_by("day")
+
 
 class DashboardView(LoginRequiredMixin, View, PlotView):
     template_name = "dashboard.html"
@@ -129,7 +386,7 @@ class DashboardView(LoginRequiredMixin, View, PlotView):
         page = 0
         settings = models.get_settings(request.user)
         self.sports = models.Sport.objects.filter(user=request.user).order_by("name")
-        activities = self.get_activity_data_for_plots()
+        daily_summaries = self.get_daily_summaries_for_plots()
         summary = get_summary_of_all_activities(request.user)
         context = {
             "sports": self.sports,
@@ -142,13 +399,13 @@ class DashboardView(LoginRequiredMixin, View, PlotView):
             "form_field_ids": get_all_form_field_ids(),
             "style": Style,
         }
-        if activities:
+        if daily_summaries:
             script_history, div_history = plot_history(
-                activities=activities, sport_model=models.Sport, number_of_days=settings.number_of_days
+                daily_summaries=daily_summaries, sport_model=models.Sport, number_of_days=settings.number_of_days
             )
-            pie_chart_data, pie_chart_labels, pie_chart_colors = plot_pie_chart(activities=activities)
-            script_trend, div_trend = plot_trend(activities=activities, sport_model=models.Sport)
-            script_workload, div_workload, aggregated_by = plot_workload(models.Activity)
+            pie_chart_data, pie_chart_labels, pie_chart_colors = plot_pie_chart(daily_summaries=daily_summaries)
+            script_trend, div_trend = plot_trend(daily_summaries=daily_summaries, sport_model=models.Sport)
+            script_workload, div_workload, aggregated_by = plot_workload(daily_summaries)
             plotting_context = {
                 "script_workload": script_workload,
                 "div_workload": div_workload,
@@ -177,6 +434,7 @@ def settings_view(request):
     settings = models.get_settings(request.user)
     activities = models.Activity.objects.filter(user=request.user, is_demo_activity=True).count()
     form = forms.EditSettingsForm(request.POST or None, instance=settings)
+    import_runs = models.ImportRun.objects.prefetch_related("stages").order_by("-started")[:5]
     return render(
         request,
         "settings/settings.html",
@@ -187,6 +445,8 @@ def settings_view(request):
             "settings": settings,
             "form_field_ids": get_all_form_field_ids(),
             "delete_demos": True if activities else False,
+            "import_runs": import_runs,
+            "import_stages": STAGES,
             "style": Style,
         },
     )
@@ -236,36 +496,29 @@ def set_number_of_days(request, number_of_days):
 
 
 def get_summary_of_all_activities(user=None, sport_slug=None):
-    base_filter = {}
+    """
+    Returns count, total duration and total distance of all activities, optionally of one user and/or sport, along
+    with the duration of the activities of the last seven days. The totals are aggregated from the daily summaries
+    using a single query.
+    """
+    daily_summaries = models.DailySummary.objects.all()
     if user:
-        base_filter['user'] = user
-        
-    all_activities = models.Activity.objects.filter(**base_filter)
-    seven_days_back = (datetime.datetime.now() - datetime.timedelta(days=7)).replace(
-        tzinfo=pytz.timezone(django_settings.TIME_ZONE)
-    )
+        daily_summaries = daily_summaries.filter(user=user)
     if sport_slug:
-        sport_filter = {**base_filter, 'sport__slug': sport_slug}
-        count = models.Activity.objects.filter(**sport_filter).count()
-        duration = models.Activity.objects.filter(**sport_filter)
-        total_duration = duration.aggregate(Sum("duration"))
-        total_distance = models.Activity.objects.filter(**sport_filter).aggregate(Sum("distance"))
-        seven_days_trend = (
-            models.Activity.objects.filter(**sport_filter)
-            .filter(date__gt=seven_days_back)
-            .aggregate(Sum("duration"))
-        )
-    else:
-        count = all_activities.count()
-        total_duration = all_activities.aggregate(Sum("duration"))
-        total_distance = all_activities.aggregate(Sum("distance"))
-        seven_days_trend = all_activities.filter(date__gt=seven_days_back).aggregate(Sum("duration"))
-    duration = total_duration["duration__sum"] if total_duration["duration__sum"] else datetime.timedelta(minutes=0)
-    distance = round(total_distance["distance__sum"], 2) if total_distance["distance__sum"] else 0
-    seven_days_trend = (
-        seven_days_trend["duration__sum"] if seven_days_trend["duration__sum"] else datetime.timedelta(minutes=0)
+        daily_summaries = daily_summaries.filter(sport__slug=sport_slug)
+    seven_days_back = timezone.localdate() - datetime.timedelta(days=7)
+    totals = daily_summaries.aggregate(
+        total_count=Sum("count"),
+        total_duration=Sum("duration"),
+        total_distance=Sum("distance"),
+        seven_days_trend=Sum("duration", filter=Q(day__gt=seven_days_back)),
     )
-    return {"count": count, "duration": duration, "distance": distance, "seven_days_trend": seven_days_trend}
+    return {
+        "count": totals["total_count"] or 0,
+        "duration": totals["total_duration"] or datetime.timedelta(minutes=0),
+        "distance": round(totals["total_distance"], 2) if totals["total_distance"] else 0,
+        "seven_days_trend": totals["seven_days_trend"] or datetime.timedelta(minutes=0),
+    }
 
 
 def custom_400_view(request, exception=None):
@@ -287,36 +540,7 @@ def custom_500_view(request, exception=None):
 
 
 def get_flat_list_of_pks_of_activities_in_top_awards(user, filter_on_sport: Union[None, str] = None) -> List[int]:
-    top_award_pks = []
-    if filter_on_sport:
-        sport_slugs = [filter_on_sport]
-    else:
-        sport_slugs = [
-            sport.slug for sport in models.Sport.objects.filter(is_system_sport=True, evaluates_for_awards=True).exclude(name="unknown")
-        ]
-    for sport in sport_slugs:
-        for bs in cfg.best_sections:
-            for distance in bs.distances:
-                top_awards = models.BestSection.objects.filter(
-                    activity__sport__slug=sport,
-                    activity__user=user,
-                    activity__evaluates_for_awards=True,
-                    kind=bs.kind,
-                    distance=distance,
-                ).order_by("-max_value")[: cfg.rank_limit]
-                top_award_pks += [award.activity.pk for award in top_awards]
-        # also add pks of best total ascent activities
-        top_ascent_awards = (
-            models.Activity.objects.filter(
-                sport__slug=sport,
-                user=user,
-                evaluates_for_awards=True,
-            )
-            .exclude(trace_file__total_ascent=None)
-            .order_by("-trace_file__total_ascent")[: cfg.rank_limit]
-        )
-        top_award_pks += [activity.pk for activity in top_ascent_awards]
-    return list(set(top_award_pks))
+    return get_cached_pks_of_activities_in_top_awards(user, filter_on_sport)
 
 
 @login_required
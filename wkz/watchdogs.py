@@ -1,22 +1,30 @@
 import logging
 import os
 from pathlib import Path
+from typing import List
 
+from wkz import configuration as cfg
 from wkz import models
 from wkz.io.file_importer import run_importer
+from wkz.io.file_watcher import start_trace_dir_watcher
 from wkz.io.fit_collector import collect_fit_files_from_device
 
 log = logging.getLogger(__name__)
 
 
-def trigger_file_watchdog():
+def trigger_file_watchdog(paths: List[str] = None):
     settings = models.get_settings()
     if Path(settings.path_to_trace_dir).is_dir():
-        run_importer(models)
+        trace_files = [Path(path) for path in paths] if paths is not None else None
+        run_importer(models, workers=cfg.file_importer_workers, trace_files=trace_files)
     else:
         log.warning(f"File Watchdog: {settings.path_to_trace_dir} is not a valid directory.")
 
 
+def start_file_watcher(on_change) -> bool:
+    return start_trace_dir_watcher(get_path=lambda: models.get_settings().path_to_trace_dir, on_change=on_change)
+
+
 def trigger_device_watchdog():
     settings = models.get_settings()
     # only check for device if path is not blank
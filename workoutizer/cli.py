@@ -82,9 +82,11 @@ def check():
     _check()
 
 
+@click.option("-p", "--profile", help="print the time spent in each stage of the import", is_flag=True)
+@click.option("-w", "--workers", help="number of processes used for parsing activity files", default=1, type=int)
 @click.command(help="Reimport all activities to update the given data.")
-def reimport():
-    _reimport()
+def reimport(workers: int, profile: bool):
+    _reimport(workers=workers, profile=profile)
 
 
 wkz.add_command(upgrade)
@@ -217,13 +219,15 @@ def _check():
         raise NotInitializedError("ERROR: Make sure to execute 'wkz init' first")
 
 
-def _reimport():
+def _reimport(workers: int = 1, profile: bool = False):
     _check()
 
     from wkz import models
     from wkz.io.file_importer import run_importer
 
-    run_importer(models, reimporting=True)
+    import_profile = run_importer(models, reimporting=True, workers=workers)
+    if profile:
+        click.echo(import_profile)
 
 
 class HueyManager:
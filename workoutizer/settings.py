@@ -17,6 +17,10 @@ else:
 SQLITE_FILE = "db.sqlite3"
 WORKOUTIZER_DB_PATH = os.path.join(WORKOUTIZER_DIR, SQLITE_FILE)
 TRACKS_DIR = os.path.join(WORKOUTIZER_DIR, "tracks")
+HEATMAP_TILES_DIR = os.path.join(WORKOUTIZER_DIR, "heatmap_tiles")
+# GeoNames dump of places (e.g. cities1000.txt from https://download.geonames.org/export/dump/) used to name activities
+# after the place they started at without querying Nominatim
+GEONAMES_FILE = os.getenv("WKZ_GEONAMES_FILE", os.path.join(WORKOUTIZER_DIR, "geonames.txt"))
 
 STATIC_ROOT = os.path.join(BASE_DIR, "static")
 STATIC_URL = "/static/"